@@ -0,0 +1,525 @@
+"""
+aggregates.py is the toolbox used by tweet_analyzer.py to keep per-day statistics of the sentiment of tweets, updated incrementally when new tweets are read and persisted between different runs.
+
+Statistics computed by tweet_analyzer.py (standard and weighted averages, standard deviations, covariance and correlation between sentiment and sharing) only need few sufficient statistics of each day, so they can be computed in constant time per day, without rebuilding the whole set of tweets.
+Medians and percentiles, which have no sufficient statistics, are read from a histogram of sentiment of each day (see Histogram), mergeable as well.
+"""
+
+import os
+import math
+import array
+import sqlite3
+import datetime as dt
+from collections import Counter
+
+AGGREGATES_FILE = "Cache/aggregates.sqlite"
+# Version of the layout of the database (kept as its user_version): a database of another version is emptied, so its aggregates are built again
+AGGREGATES_VERSION = 2
+
+# Format of the hour of a tweet in the aggregates
+HOUR_FORMAT = "%Y-%m-%d %H:00"
+# Start of the buckets of hours
+EPOCH = dt.datetime(1970, 1, 1)
+
+# Number of tweets looked up (and updated) in the database with a single query
+BATCH_SIZE = 500
+
+# Populations of tweets of each day: every tweet ('all') or only tweets with non null sentiment ('considered', used when neutral tweets are excluded)
+POPULATIONS = ('all', 'considered')
+
+# Bins of the histograms of sentiment, of equal width over [-1, 1] (0.01 each), and percentiles reported from them
+HISTOGRAM_BINS = 200
+PERCENTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+"""
+    Sufficient statistics of a set of tweets, updated online (Welford's algorithm), which allows adding and removing a tweet, or merging two sets, in constant time and with numerical stability
+
+        'n' is the number of tweets
+        'mean_sa', 'm2_sa' are mean and sum of squared deviations from the mean of sentiment ('sa')
+        'mean_sh', 'm2_sh' are mean and sum of squared deviations from the mean of sharing (retweet_count + favorite_count + 1)
+        'mean_p', 'm2_p' are mean and sum of squared deviations from the mean of the product sa * sharing (used by weighted average)
+        'c' is the co-moment of sentiment and sharing, sum of (sa - mean_sa) * (sharing - mean_sh)
+"""
+class Moments:
+    FIELDS = ('n', 'mean_sa', 'm2_sa', 'mean_sh', 'm2_sh', 'mean_p', 'm2_p', 'c')
+
+    def __init__(self, *values):
+        for field, value in zip(self.FIELDS, values or (0,) * len(self.FIELDS)):
+            setattr(self, field, value)
+
+    def to_tuple(self):
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def add(self, sa, sharing):
+        p = sa * sharing
+        self.n += 1
+        dsa = sa - self.mean_sa
+        dsh = sharing - self.mean_sh
+        dp = p - self.mean_p
+        self.mean_sa += dsa / self.n
+        self.mean_sh += dsh / self.n
+        self.mean_p += dp / self.n
+        self.m2_sa += dsa * (sa - self.mean_sa)
+        self.m2_sh += dsh * (sharing - self.mean_sh)
+        self.m2_p += dp * (p - self.mean_p)
+        self.c += dsa * (sharing - self.mean_sh)
+
+    # Inverse of 'add': the tweet is removed restoring means and moments before its addition
+    def remove(self, sa, sharing):
+        if self.n <= 1:
+            self.__init__()
+            return
+
+        p = sa * sharing
+        self.n -= 1
+        mean_sa = self.mean_sa - (sa - self.mean_sa) / self.n
+        mean_sh = self.mean_sh - (sharing - self.mean_sh) / self.n
+        mean_p = self.mean_p - (p - self.mean_p) / self.n
+        self.m2_sa -= (sa - mean_sa) * (sa - self.mean_sa)
+        self.m2_sh -= (sharing - mean_sh) * (sharing - self.mean_sh)
+        self.m2_p -= (p - mean_p) * (p - self.mean_p)
+        self.c -= (sa - mean_sa) * (sharing - self.mean_sh)
+        self.mean_sa, self.mean_sh, self.mean_p = mean_sa, mean_sh, mean_p
+
+    # Merges another set of tweets (Chan's parallel algorithm)
+    def merge(self, other):
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.__init__(*other.to_tuple())
+            return
+
+        n = self.n + other.n
+        dsa = other.mean_sa - self.mean_sa
+        dsh = other.mean_sh - self.mean_sh
+        dp = other.mean_p - self.mean_p
+        weight = self.n * other.n / n
+        self.m2_sa += other.m2_sa + dsa * dsa * weight
+        self.m2_sh += other.m2_sh + dsh * dsh * weight
+        self.m2_p += other.m2_p + dp * dp * weight
+        self.c += other.c + dsa * dsh * weight
+        self.mean_sa += dsa * other.n / n
+        self.mean_sh += dsh * other.n / n
+        self.mean_p += dp * other.n / n
+        self.n = n
+
+"""
+    Histogram of the sentiment of a set of tweets, with HISTOGRAM_BINS bins of equal width over [-1, 1]
+
+        'counts' is the number of tweets of each bin, 'weights' the sum of their sharing (retweet_count + favorite_count + 1), for the weighted variant.
+        Both are integers, so adding, removing a tweet and merging two histograms (of different days, files, shards or runs) are exact, unlike sketches built by compression (i.e. t-digest), and the result doesn't depend on the order of the tweets.
+        Quantiles are interpolated linearly inside the bin they fall in, so they're approximate, within the width of a bin (0.01)
+"""
+class Histogram:
+    def __init__(self, counts=None, weights=None):
+        self.counts = list(counts) if counts is not None else [0] * HISTOGRAM_BINS
+        self.weights = list(weights) if weights is not None else [0] * HISTOGRAM_BINS
+
+    @staticmethod
+    def bin(sa):
+        return min(max(int((sa + 1) * HISTOGRAM_BINS / 2), 0), HISTOGRAM_BINS - 1)
+
+    def add(self, sa, sharing):
+        i = self.bin(sa)
+        self.counts[i] += 1
+        self.weights[i] += sharing
+
+    def remove(self, sa, sharing):
+        i = self.bin(sa)
+        self.counts[i] -= 1
+        self.weights[i] -= sharing
+
+    def merge(self, other):
+        for i in range(HISTOGRAM_BINS):
+            self.counts[i] += other.counts[i]
+            self.weights[i] += other.weights[i]
+
+    def n(self):
+        return sum(self.counts)
+
+    """
+        Returns the quantiles 'qs' (in ascending order, between 0 and 1) of sentiment, of tweets or, if 'weighted', of their sharing (the value below which a fraction q of the total sharing falls), in a single scan of the bins
+    """
+    def quantiles(self, qs, weighted=False):
+        values = self.weights if weighted else self.counts
+        total = sum(values)
+        width = 2 / HISTOGRAM_BINS
+        result = []
+        cumulative = 0
+        i = 0
+        for q in qs:
+            target = q * total
+            while i < HISTOGRAM_BINS - 1 and (values[i] == 0 or cumulative + values[i] < target):
+                cumulative += values[i]
+                i += 1
+            fraction = (target - cumulative) / values[i] if values[i] else 0.0
+            result.append(min(max(-1 + (i + fraction) * width, -1.0), 1.0))
+        return result
+
+    def to_blobs(self):
+        return array.array('q', self.counts).tobytes(), array.array('q', self.weights).tobytes()
+
+    @classmethod
+    def from_blobs(cls, counts, weights):
+        return cls(array.array('q', counts), array.array('q', weights))
+
+"""
+    Persistent store of per-day aggregates
+
+        Aggregates are stored in a SQLite database, with six tables:
+            'days' contains the Moments of each day, for both populations (every tweet, or only tweets with non null sentiment)
+            'hours' contains the Moments of each hour (yyyy-mm-dd hh:00, UTC), for both populations: with days, it's a two level index of time buckets, from which any coarser granularity or rolling window is merged (see buckets and rolling)
+            'histograms' contains the Histogram of sentiment of each day, for both populations (counts and weights as arrays of 64 bit integers), for medians and percentiles
+            'hashtags' contains the frequency of each hashtag in each day (a Counter per day, mergeable across days, files and runs)
+            'tweets' contains the contribution (day, sa, sharing, hashtags, hour) of every tweet already aggregated, by id_str, with the modification time of the file it was read from
+            'sources' contains the path of every file aggregated, so that the aggregates are those of the files selected (see tweet_analyzer.tweets_retrieving)
+
+        When a tweet already aggregated is read again (i.e. fetched again with updated retweet_count and favorite_count), its old contribution is removed and the new one added, so every tweet is counted once, with its most updated information: a tweet read from a file older than the one it was aggregated from is ignored.
+        A tweet whose files are no longer selected is discarded, removing its contribution: deleting the database starts it from scratch.
+"""
+class AggregateStore:
+    def __init__(self, path=AGGREGATES_FILE):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.connection = sqlite3.connect(path)
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != AGGREGATES_VERSION:
+            with self.connection:
+                for (table,) in self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                    self.connection.execute("DROP TABLE " + table)
+                self.connection.execute("PRAGMA user_version = " + str(AGGREGATES_VERSION))
+        self.connection.execute("CREATE TABLE IF NOT EXISTS tweets (id_str TEXT PRIMARY KEY, day TEXT NOT NULL, sa REAL NOT NULL, sharing INTEGER NOT NULL, hashtags TEXT NOT NULL, hour TEXT NOT NULL, mtime REAL NOT NULL) WITHOUT ROWID")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS hashtags (day TEXT NOT NULL, hashtag TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (day, hashtag)) WITHOUT ROWID")
+        for table in ('days', 'hours'):
+            self.connection.execute("CREATE TABLE IF NOT EXISTS " + table + " (day TEXT NOT NULL, population TEXT NOT NULL, " + ", ".join(field + " REAL NOT NULL" for field in Moments.FIELDS) + ", PRIMARY KEY (day, population))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS histograms (day TEXT NOT NULL, population TEXT NOT NULL, counts BLOB NOT NULL, weights BLOB NOT NULL, PRIMARY KEY (day, population))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY) WITHOUT ROWID")
+
+        # Moments of every day and hour are few (24 per day), so they are kept in memory and written back when the store is closed
+        self.moments = {}
+        for table in ('days', 'hours'):
+            self.moments[table] = {population : {} for population in POPULATIONS}
+            for row in self.connection.execute("SELECT * FROM " + table):
+                self.moments[table][row[1]][row[0]] = Moments(int(row[2]), *row[3:])
+
+        # Hashtag counters and histograms are loaded only for the days updated, and written back when the store is closed
+        self.hashtags = {}
+        self.histograms = {}
+        # (table, day or hour) of the Moments modified, written back by flush: a store only read leaves the database untouched
+        self.modified = set()
+
+    def bucket_moments(self, table, population, bucket):
+        self.modified.add((table, bucket))
+        if bucket not in self.moments[table][population]:
+            self.moments[table][population][bucket] = Moments()
+        return self.moments[table][population][bucket]
+
+    def day_hashtags(self, day):
+        if day not in self.hashtags:
+            self.hashtags[day] = Counter(dict(self.connection.execute("SELECT hashtag, count FROM hashtags WHERE day = ?", (day,))))
+        return self.hashtags[day]
+
+    def day_histograms(self, day):
+        if day not in self.histograms:
+            rows = {row[0] : Histogram.from_blobs(*row[1:]) for row in self.connection.execute("SELECT population, counts, weights FROM histograms WHERE day = ?", (day,))}
+            self.histograms[day] = {population : rows.get(population, Histogram()) for population in POPULATIONS}
+        return self.histograms[day]
+
+    def add_histograms(self, day, sa, sharing):
+        histograms = self.day_histograms(day)
+        histograms['all'].add(sa, sharing)
+        if sa != 0.0:
+            histograms['considered'].add(sa, sharing)
+
+    # Buckets of a tweet: its day and its hour
+    def buckets_of(self, day, hour):
+        return [('days', day), ('hours', hour)]
+
+    def add(self, day, sa, sharing, hashtags, hour):
+        for table, bucket in self.buckets_of(day, hour):
+            self.bucket_moments(table, 'all', bucket).add(sa, sharing)
+            if sa != 0.0:
+                self.bucket_moments(table, 'considered', bucket).add(sa, sharing)
+        self.add_histograms(day, sa, sharing)
+        if hashtags:
+            self.day_hashtags(day).update(hashtags.split(' '))
+
+    def remove(self, day, sa, sharing, hashtags, hour):
+        for table, bucket in self.buckets_of(day, hour):
+            self.bucket_moments(table, 'all', bucket).remove(sa, sharing)
+            if sa != 0.0:
+                self.bucket_moments(table, 'considered', bucket).remove(sa, sharing)
+        histograms = self.day_histograms(day)
+        histograms['all'].remove(sa, sharing)
+        if sa != 0.0:
+            histograms['considered'].remove(sa, sharing)
+        if hashtags:
+            counter = self.day_hashtags(day)
+            counter.subtract(hashtags.split(' '))
+            for hashtag in [hashtag for hashtag, count in counter.items() if count <= 0]:
+                del counter[hashtag]
+
+    """
+        Aggregates tweets, given as (id_str, day, sa, sharing, hashtags, hour, mtime) tuples, 'day' being a datetime.date, 'hashtags' a sequence of hashtag texts (without '#'), 'hour' the start of the hour of the tweet (datetime.datetime, UTC) and 'mtime' the modification time of the file it was read from
+
+            Tweets already aggregated from a newer file are left untouched (as by tweet_store.TweetStore), unless 'replace' is given (i.e. for the versions of the selected files, which are older than the aggregated ones when a newer file is deselected).
+            Returns the list of id_str of the tweets not left untouched
+    """
+    def update(self, tweets, replace=False):
+        tweets = list(tweets)
+        applied = []
+
+        for i in range(0, len(tweets), BATCH_SIZE):
+            batch = tweets[i:i+BATCH_SIZE]
+            ids = [tweet[0] for tweet in batch]
+            known = {}
+            mtimes = {}
+            for row in self.connection.execute("SELECT id_str, day, sa, sharing, hashtags, hour, mtime FROM tweets WHERE id_str IN (" + ",".join("?" * len(ids)) + ")", ids):
+                known[row[0]] = row[1:6]
+                mtimes[row[0]] = row[6]
+            rows = []
+
+            for id, day, sa, sharing, hashtags, hour, mtime in batch:
+                if not replace and id in known and mtimes[id] > mtime:
+                    continue
+                applied.append(id)
+
+                contribution = (str(day), sa, sharing, ' '.join(hashtags), hour.strftime(HOUR_FORMAT))
+                if id in known:
+                    if known[id] == contribution and mtimes[id] == mtime:
+                        continue
+                    if known[id] != contribution:
+                        self.remove(*known[id])
+                        self.add(*contribution)
+                else:
+                    self.add(*contribution)
+
+                known[id] = contribution
+                mtimes[id] = mtime
+                rows.append((id,) + contribution + (mtime,))
+
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO tweets (id_str, day, sa, sharing, hashtags, hour, mtime) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+        return applied
+
+    """
+        Removes the contribution of the given id_str (i.e. of tweets whose files are no longer selected), ignoring tweets never aggregated
+    """
+    def discard(self, ids):
+        known = self.contributions(ids)
+        for contribution in known.values():
+            self.remove(*contribution)
+
+        ids = list(known)
+        with self.connection:
+            for i in range(0, len(ids), BATCH_SIZE):
+                batch = ids[i:i+BATCH_SIZE]
+                self.connection.execute("DELETE FROM tweets WHERE id_str IN (" + ",".join("?" * len(batch)) + ")", batch)
+
+    """
+        Removes every tweet and aggregate, as a new database
+    """
+    def clear(self):
+        with self.connection:
+            for table in ('tweets', 'hashtags', 'days', 'hours', 'histograms', 'sources'):
+                self.connection.execute("DELETE FROM " + table)
+        self.moments = {table : {population : {} for population in POPULATIONS} for table in ('days', 'hours')}
+        self.hashtags = {}
+        self.histograms = {}
+        self.modified = set()
+
+    # Paths of the files aggregated
+    def sources(self):
+        return [path for (path,) in self.connection.execute("SELECT path FROM sources ORDER BY path")]
+
+    def set_sources(self, paths):
+        with self.connection:
+            self.connection.execute("DELETE FROM sources")
+            self.connection.executemany("INSERT OR IGNORE INTO sources VALUES (?)", [(path,) for path in paths])
+
+    """
+        Returns the contribution (day, sa, sharing, hashtags, hour) stored for each of the given id_str (tweets never aggregated are missing), with the day as a string (yyyy-mm-dd), hashtags separated by spaces and the hour as a string (see HOUR_FORMAT)
+    """
+    def contributions(self, ids):
+        ids = list(ids)
+        known = {}
+        for i in range(0, len(ids), BATCH_SIZE):
+            batch = ids[i:i+BATCH_SIZE]
+            for row in self.connection.execute("SELECT id_str, day, sa, sharing, hashtags, hour FROM tweets WHERE id_str IN (" + ",".join("?" * len(batch)) + ")", batch):
+                known[row[0]] = row[1:]
+        return known
+
+    # Number of tweets aggregated
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM tweets").fetchone()[0]
+
+    """
+        Returns the Moments of each day (as datetime.date), in chronological order, considering every tweet or only tweets with non null sentiment
+    """
+    def days(self, excludeNeutralTweets):
+        population = self.moments['days']['considered' if excludeNeutralTweets else 'all']
+        return {dt.date.fromisoformat(day) : population[day] for day in sorted(population) if population[day].n > 0}
+
+    """
+        Returns the Moments of each hour (as datetime.datetime), in chronological order, considering every tweet or only tweets with non null sentiment
+    """
+    def hours(self, excludeNeutralTweets):
+        population = self.moments['hours']['considered' if excludeNeutralTweets else 'all']
+        return {dt.datetime.strptime(hour, HOUR_FORMAT) : population[hour] for hour in sorted(population) if population[hour].n > 0}
+
+    """
+        Returns the Moments of consecutive buckets of 'hours' hours (aligned to midnight UTC, so a bucket never spans two days if 'hours' divides 24), keyed by their start, in chronological order.
+        Buckets of whole days are merged from days (datetime.date keys, 24 hours are the days themselves), any other bucket from hours (datetime.datetime keys)
+    """
+    def buckets(self, excludeNeutralTweets, hours=24):
+        if hours % 24 == 0:
+            base = self.days(excludeNeutralTweets)
+            start = lambda day: dt.date.fromordinal(day.toordinal() - (day.toordinal() - EPOCH.toordinal()) % (hours // 24))
+        else:
+            base = self.hours(excludeNeutralTweets)
+            start = lambda hour: hour - dt.timedelta(hours=((hour - EPOCH) // dt.timedelta(hours=1)) % hours)
+
+        buckets = {}
+        for key, moments in base.items():
+            buckets.setdefault(start(key), Moments()).merge(moments)
+        return buckets
+
+    """
+        Returns the Moments of a rolling window of 'window' hours, every 'step' hours, keyed by the last hour of the window (datetime.datetime), from the first hour with tweets to the last one (windows without tweets are skipped).
+        Each window merges at most 'window' hourly Moments, so the cost depends on the number of hours, not of tweets
+    """
+    def rolling(self, excludeNeutralTweets, window, step=1):
+        hours = self.hours(excludeNeutralTweets)
+        if not hours:
+            return {}
+
+        last = max(hours)
+        windows = {}
+        end = min(hours)
+        while end <= last:
+            moments = Moments()
+            for offset in range(window):
+                moments.merge(hours.get(end - dt.timedelta(hours=offset), Moments()))
+            if moments.n > 0:
+                windows[end] = moments
+            end += dt.timedelta(hours=step)
+        return windows
+
+    """
+        Returns the Histogram of each day (as datetime.date), in chronological order, considering every tweet or only tweets with non null sentiment
+    """
+    def sentiment_histograms(self, excludeNeutralTweets):
+        self.flush_histograms()
+
+        histograms = {}
+        for day, counts, weights in self.connection.execute("SELECT day, counts, weights FROM histograms WHERE population = ? ORDER BY day", ('considered' if excludeNeutralTweets else 'all',)):
+            histogram = Histogram.from_blobs(counts, weights)
+            if histogram.n() > 0:
+                histograms[dt.date.fromisoformat(day)] = histogram
+        return histograms
+
+    """
+        Returns the frequency of each hashtag in the days between 'start' and 'end' (datetime.date, both included, None for no limit), merging the counters of each day
+    """
+    def hashtag_frequencies(self, start=None, end=None):
+        self.flush_hashtags()
+
+        frequencies = Counter()
+        for hashtag, count in self.connection.execute("SELECT hashtag, SUM(count) FROM hashtags WHERE day >= ? AND day <= ? GROUP BY hashtag", (str(start or dt.date.min), str(end or dt.date.max))):
+            frequencies[hashtag] = count
+        return frequencies
+
+    def flush_hashtags(self):
+        with self.connection:
+            for day, counter in self.hashtags.items():
+                self.connection.execute("DELETE FROM hashtags WHERE day = ?", (day,))
+                self.connection.executemany("INSERT INTO hashtags VALUES (?, ?, ?)", [(day, hashtag, count) for hashtag, count in counter.items()])
+        self.hashtags = {}
+
+    def flush_histograms(self):
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO histograms VALUES (?, ?, ?, ?)", [(day, population) + histogram.to_blobs() for day, histograms in self.histograms.items() for population, histogram in histograms.items()])
+        self.histograms = {}
+
+    """
+        Writes moments, hashtag counters and histograms back, releasing counters and histograms (reloaded if their days are updated again): called by close, and after each batch in chunked mode (see tweet_analyzer.tweets_chunked)
+    """
+    def flush(self):
+        if self.modified:
+            with self.connection:
+                for table in ('days', 'hours'):
+                    self.connection.executemany("INSERT OR REPLACE INTO " + table + " VALUES (?, ?, " + ", ".join("?" * len(Moments.FIELDS)) + ")", [(bucket, population) + self.moments[table][population][bucket].to_tuple() for population in POPULATIONS for modifiedTable, bucket in self.modified if modifiedTable == table and bucket in self.moments[table][population]])
+            self.modified = set()
+        self.flush_hashtags()
+        self.flush_histograms()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+"""
+    STATISTICS FROM AGGREGATES
+
+        Same statistics of utils.averages, utils.std_devs and utils.compute_cov_corr, computed from Moments of each day:
+            Standard average and deviation are mean_sa and sqrt(m2_sa / n)
+            Weighted average is sum(sa * sharing) / sum(sharing) = mean_p / mean_sh
+            Weighted deviation is sqrt(sum((sa * sharing - weighted average)^2) / sum(sharing^2)), where sum((p - w)^2) = m2_p + n * (mean_p - w)^2 and sum(sharing^2) = m2_sh + n * mean_sh^2
+"""
+def daily_statistics(days):
+    stdAvgs = {}
+    stdDevs = {}
+    wgtAvgs = {}
+    wgtDevs = {}
+
+    for day, m in days.items():
+        stdAvgs[day] = m.mean_sa
+        stdDevs[day] = math.sqrt(max(m.m2_sa, 0.0) / m.n)
+        wgtAvgs[day] = m.mean_p / m.mean_sh
+        wgtDevs[day] = math.sqrt(max(m.m2_p + m.n * pow(m.mean_p - wgtAvgs[day], 2), 0.0) / (m.m2_sh + m.n * pow(m.mean_sh, 2)))
+
+    return stdAvgs, stdDevs, wgtAvgs, wgtDevs
+
+"""
+    Percentiles (PERCENTILES) of sentiment of each day, from its Histogram, of tweets or weighted by their sharing
+"""
+def daily_percentiles(histograms, weighted=False):
+    return {day : histogram.quantiles(PERCENTILES, weighted) for day, histogram in histograms.items()}
+
+"""
+    Total number of tweets considered, and their average sharing
+"""
+def sharing_statistics(days):
+    totalTweetsProcessed = sum(m.n for m in days.values())
+    avgSharing = sum(m.n * m.mean_sh for m in days.values()) / totalTweetsProcessed
+
+    return totalTweetsProcessed, avgSharing
+
+"""
+    Covariance and correlation between sentiment and sharing (retweets + likes), with x = retweet_count + favorite_count - avgSharing and y = sa - stdAvgSum, summing moments of each day around the global centers:
+        sum(x * y) = c + n * (mean_sh - 1 - avgSharing) * (mean_sa - stdAvgSum)
+        sum(x^2) = m2_sh + n * (mean_sh - 1 - avgSharing)^2
+        sum(y^2) = m2_sa + n * (mean_sa - stdAvgSum)^2
+"""
+def compute_cov_corr(days, avgSharing, stdAvgSum, totalTweetsProcessed):
+    E = 0
+    Dx = 0
+    Dy = 0
+
+    for m in days.values():
+        dx = m.mean_sh - 1 - avgSharing
+        dy = m.mean_sa - stdAvgSum
+        E += m.c + m.n * dx * dy
+        Dx += m.m2_sh + m.n * pow(dx, 2)
+        Dy += m.m2_sa + m.n * pow(dy, 2)
+
+    covariance = E / totalTweetsProcessed
+    correlation = E / math.sqrt(Dx * Dy)
+
+    return covariance, correlation
@@ -0,0 +1,395 @@
+"""
+benchmark.py is a python script used to measure the performance of tweet_analyzer.py on synthetic corpora of any size (from 10k to 10M tweets), so that regressions are caught before they reach real data
+
+For each size, a corpus of RAW files is generated in the same format written by tweet_fetcher.py (one file per day, see CORPUS GENERATION), then every stage of the analysis is run on it, one at a time,
+measuring its elapsed time and memory (see STAGES). Results are printed in a table, and saved as JSON to be compared with the ones of a previous run (--baseline): a stage slower (or using more memory)
+than the baseline beyond a tolerance is reported as a regression, and the script exits with an error.
+
+    python benchmark.py --sizes 10k 100k 1M
+    python benchmark.py --sizes 10k 100k --baseline Benchmarks/results.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import datetime as dt
+
+from prettytable import PrettyTable
+import tweet_io
+import instrumentation
+
+# Color ASCII used to change color of prints
+HEADER = '\033[95m'
+OKBLUE = '\033[94m'
+OKCYAN = '\033[96m'
+OKGREEN = '\033[92m'
+WARNING = '\033[93m'
+FAIL = '\033[91m' # Red
+ENDC = '\033[0m' # De-select the current color
+BOLD = '\033[1m'
+UNDERLINE = '\033[4m'
+
+BENCHMARKS_FOLDER = "Benchmarks"
+RESULTS_FILE = os.path.join(BENCHMARKS_FOLDER, "results.json")
+# Files used by tweet_analyzer.py, copied in the folder of each corpus
+ANALYZER_FILES = ["Dates.txt", "Flag_of_Italy.png"]
+
+# Differences below these thresholds are never regressions (noise of very short stages)
+MIN_SECONDS = 0.05
+MIN_MEGABYTES = 10
+
+"""
+CORPUS GENERATION
+
+    Tweets are generated by a seeded random generator, so the same parameters always produce the same corpus, and they're written by tweet_io.TweetWriter, as tweet_fetcher.py does: each tweet is a full status
+    (with its 'user' object, as returned by search endpoint, about 4KB in RAW format), in descending chronological order, one file per day ("(RAW) Tweets (...) by <day> ... #<tweets>.json").
+
+    Distributions follow the sample downloaded by tweet_fetcher.py:
+        - 'quoteRatio' of the tweets are quotes: half of them quote a collected tweet, chosen among few popular ones (so some tweets are quoted many times, even in the following days), the other half a tweet not collected
+        - about a quarter of the tweets have hashtags (from 1 to 15), chosen by a Zipf law over a vocabulary growing with the corpus, so few hashtags are very frequent
+        - retweets and likes follow a Pareto (heavy tailed) distribution, most of the tweets having none
+        - authors follow a skewed distribution as well (some users tweet far more than others), texts are from 40 to 250 characters (plus hashtags), some with sentiment words and links
+"""
+WORDS = ["governo", "presidente", "ministro", "italia", "europa", "crisi", "vaccini", "draghi", "conte", "parlamento", "fiducia", "lavoro", "economia", "oggi", "domani", "sempre", "mai",
+         "piano", "recovery", "fondi", "scuola", "salute", "regioni", "dpcm", "partito", "lega", "voto", "senato", "camera", "discorso", "riforme", "debito", "tasse", "giovani", "futuro",
+         "nuovo", "vecchio", "politica", "cittadini", "paese", "the", "and", "with", "prime", "minister", "government", "europe", "vaccine", "plan", "today"]
+SENTIMENT_WORDS = ["good", "great", "love", "hope", "best", "excellent", "happy", "win", "bad", "terrible", "hate", "worst", "sad", "crisis", "fail", "angry", "disaster", "wrong"]
+HASHTAGS = ["Draghi", "MarioDraghi", "dpcm", "Conte", "Curcio", "propagandalive", "vaccini", "GovernoDraghi", "Borrelli", "26febbraio", "Recovery", "Italia", "covid", "lockdown", "scuola"]
+
+# Number of hashtags of a tweet, with its probability
+HASHTAGS_PER_TWEET = [(0, 0.74), (1, 0.10), (2, 0.06), (3, 0.045), (4, 0.016), (5, 0.02), (6, 0.005), (7, 0.009), (8, 0.002), (12, 0.002), (15, 0.001)]
+QUOTE_RATIO = 0.05
+DAYS = 7
+START_DATE = dt.date(2021, 2, 20)
+# Popular tweets (the ones quoted by collected tweets), replaced over time
+POPULAR_TWEETS = 1000
+# Twitter epoch (milliseconds), used to build ids ordered by time as real ones
+TWITTER_EPOCH = 1288834974657
+
+"""
+    Returns the number of tweets of a size like "10k", "2.5M" or "10000"
+"""
+def parse_size(size):
+    multipliers = {'k' : 1000, 'm' : 1000000}
+    size = size.strip().lower()
+    if size[-1] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+    return int(size)
+
+def format_size(n):
+    if n >= 1000000 and n % 1000000 == 0:
+        return str(n // 1000000) + "M"
+    if n >= 1000 and n % 1000 == 0:
+        return str(n // 1000) + "k"
+    return str(n)
+
+def user(rng, n):
+    # Skewed choice: low indices are far more frequent
+    index = int(n * rng.random() ** 2)
+    return {
+        "contributors_enabled": False, "created_at": "Wed Aug 22 21:17:22 +0000 2012", "default_profile": False, "default_profile_image": False,
+        "description": "Profilo numero " + str(index), "entities": {"description": {"urls": []}}, "favourites_count": index % 90000, "follow_request_sent": False,
+        "followers_count": index % 5000, "following": False, "friends_count": index % 2000, "geo_enabled": True, "has_extended_profile": True, "id": 100000 + index, "id_str": str(100000 + index),
+        "is_translation_enabled": False, "is_translator": False, "lang": None, "listed_count": 0, "location": "", "name": "Utente " + str(index), "notifications": False,
+        "profile_background_color": "282429", "profile_background_image_url": "http://abs.twimg.com/images/themes/theme12/bg.gif",
+        "profile_background_image_url_https": "https://abs.twimg.com/images/themes/theme12/bg.gif", "profile_background_tile": True,
+        "profile_banner_url": "https://pbs.twimg.com/profile_banners/" + str(100000 + index) + "/1604949821",
+        "profile_image_url": "http://pbs.twimg.com/profile_images/" + str(index) + "/rSdLBhia_normal.jpg", "profile_image_url_https": "https://pbs.twimg.com/profile_images/" + str(index) + "/rSdLBhia_normal.jpg",
+        "profile_link_color": "3D3939", "profile_sidebar_border_color": "000000", "profile_sidebar_fill_color": "FFF7CC", "profile_text_color": "0C3E53", "profile_use_background_image": True,
+        "protected": False, "screen_name": "utente_" + str(index), "statuses_count": index % 30000, "time_zone": None, "translator_type": "none", "url": None, "utc_offset": None, "verified": False,
+        "withheld_in_countries": []
+    }
+
+def text(rng, hashtags):
+    words = []
+    length = rng.randint(40, 250)
+    while sum(len(word) + 1 for word in words) < length:
+        words.append(rng.choice(SENTIMENT_WORDS) if rng.random() < 0.08 else rng.choice(WORDS))
+    words += ["#" + hashtag for hashtag in hashtags]
+    if rng.random() < 0.3:
+        words.append("https://t.co/" + "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(10)))
+    return " ".join(words)
+
+def hashtags(rng, vocabulary):
+    count = rng.choices([count for count, _ in HASHTAGS_PER_TWEET], weights=[p for _, p in HASHTAGS_PER_TWEET])[0]
+    chosen = []
+    for _ in range(count):
+        # Zipf law: rank r has probability proportional to 1/r
+        rank = int(vocabulary ** rng.random()) - 1
+        chosen.append(HASHTAGS[rank] if rank < len(HASHTAGS) else "tag" + str(rank))
+    return chosen
+
+def engagement(rng, zeros):
+    if rng.random() < zeros:
+        return 0
+    return min(int(rng.paretovariate(1.2)) - 1, 100000)
+
+def status(rng, id, created, users, vocabulary):
+    tags = hashtags(rng, vocabulary)
+    full_text = text(rng, tags)
+    position = 0
+    entities = []
+    for tag in tags:
+        position = full_text.find("#" + tag, position)
+        entities.append({"indices": [position, position + len(tag) + 1], "text": tag})
+
+    return {
+        "contributors": None, "coordinates": None, "created_at": created.strftime('%a %b %d %H:%M:%S +0000 %Y'), "display_text_range": [0, len(full_text)],
+        "entities": {"hashtags": entities, "symbols": [], "urls": [], "user_mentions": []}, "favorite_count": engagement(rng, 0.4), "favorited": False, "full_text": full_text, "geo": None,
+        "id": id, "id_str": str(id), "in_reply_to_screen_name": None, "in_reply_to_status_id": None, "in_reply_to_status_id_str": None, "in_reply_to_user_id": None, "in_reply_to_user_id_str": None,
+        "is_quote_status": False, "lang": "it", "metadata": {"iso_language_code": "it", "result_type": "recent"}, "place": None, "retweet_count": engagement(rng, 0.6), "retweeted": False,
+        "source": "<a href=\"http://twitter.com/download/android\" rel=\"nofollow\">Twitter for Android</a>", "truncated": False, "user": user(rng, users)
+    }
+
+"""
+    Generates a corpus of 'n' tweets over 'days' days in 'folder' (in the given tweet_io format), returning the list of its files.
+    A corpus already generated with the same parameters is reused: 'folder' is marked as complete only at the end of the generation
+"""
+def generate_corpus(folder, n, days=DAYS, quoteRatio=QUOTE_RATIO, seed=0, fmt='raw'):
+    marker = os.path.join(folder, "corpus.json")
+    if os.path.exists(marker):
+        with open(marker, "r") as f:
+            return json.load(f)['files']
+
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    rng = random.Random(seed)
+    users = max(n // 2, 10)
+    vocabulary = len(HASHTAGS) + n // 50
+    popular = []
+    # Tweets quoted but never collected (older than the corpus)
+    external = max(n // 20, 10)
+    files = []
+
+    print(WARNING + "Generating corpus of " + str(n) + " tweets in \"" + folder + "\"..." + ENDC)
+    start = time.perf_counter()
+    for day in range(days):
+        date = START_DATE + dt.timedelta(days=day)
+        count = n // days + (1 if day < n % days else 0)
+        filename = "(RAW) Tweets (benchmark) by " + str(date) + " (" + str(date + dt.timedelta(days=1)) + " 00:00:00.000000) #" + str(count) + tweet_io.FORMATS[fmt]
+        files.append(filename)
+        # Descending chronological order, as returned by search endpoint
+        seconds = sorted((rng.randrange(86400) for _ in range(count)), reverse=True)
+
+        with tweet_io.TweetWriter(os.path.join(folder, filename)) as writer:
+            for i, second in enumerate(seconds):
+                created = dt.datetime.combine(date, dt.time()) + dt.timedelta(seconds=second)
+                id = ((int(created.replace(tzinfo=dt.timezone.utc).timestamp() * 1000) - TWITTER_EPOCH) << 22) + (i % 4096)
+                tweet = status(rng, id, created, users, vocabulary)
+
+                if rng.random() < quoteRatio:
+                    if popular and rng.random() < 0.5:
+                        # Few tweets receive most of the quotes
+                        quoted = popular[int(len(popular) * rng.random() ** 3)]
+                    else:
+                        externalId = (1 << 60) + rng.randrange(external)
+                        quoted = status(random.Random(externalId), externalId, dt.datetime.combine(START_DATE, dt.time()) - dt.timedelta(days=1), users, vocabulary)
+                    tweet["is_quote_status"] = True
+                    tweet["quoted_status"] = {key : value for key, value in quoted.items() if key != "quoted_status"}
+                    tweet["quoted_status_id"] = quoted["id"]
+                    tweet["quoted_status_id_str"] = quoted["id_str"]
+
+                if len(popular) < POPULAR_TWEETS:
+                    popular.append(tweet)
+                elif rng.random() < 0.01:
+                    popular[rng.randrange(POPULAR_TWEETS)] = tweet
+
+                writer.write(tweet)
+
+    with open(marker, "w") as f:
+        json.dump({'tweets' : n, 'days' : days, 'quote_ratio' : quoteRatio, 'seed' : seed, 'format' : fmt, 'files' : files}, f, indent=4)
+    print(OKGREEN + "Corpus generated in " + str(round(time.perf_counter() - start, 1)) + " seconds" + ENDC)
+    return files
+
+"""
+STAGES
+
+    Stages are run in the order of tweet_analyzer.py, each one on the results of the previous ones, in the folder of the corpus (paths used by tweet_analyzer.py are relative):
+        tweets_retrieving           reading every file and scoring every tweet, with an empty Cache folder
+        tweets_retrieving_cached    the same, with the sentiment cache filled by the previous stage (ingest snapshot and aggregates are deleted, so every file is read again)
+        statistics                  statistics from per-day aggregates, including their two plots
+        to_dataframe                conversion of the store to a Pandas dataframe, used by the following stages of utils module
+        utils.averages, utils.std_devs, utils.compute_cov_corr
+                                    statistics computed from the dataframe
+        utils.plot                  a single temporal plot
+        graph_creation              daily gexf files, quote graph index and dynamic gexf file
+        wordCloud                   word cloud of hashtags of every day
+
+    'excludeNeutralTweets' is True (the default answer of tweet_analyzer.py), while 'workers' is the number of processes used by parallel reading, sentiment scoring and gexf files (every core, if None).
+    Time and memory of each stage are measured by instrumentation.Metrics: memory of worker processes isn't included, use "--workers 1" to run every stage in this process.
+    With 'profiles', cProfile stats of each stage are dumped in that folder
+"""
+STAGES = ['tweets_retrieving', 'tweets_retrieving_cached', 'statistics', 'to_dataframe', 'utils.averages', 'utils.std_devs', 'utils.compute_cov_corr', 'utils.plot', 'graph_creation', 'wordCloud']
+
+def prepare_folder(folder):
+    for subfolder in ["Cache", "Plots", "GEXF"]:
+        shutil.rmtree(os.path.join(folder, subfolder), ignore_errors=True)
+        os.makedirs(os.path.join(folder, subfolder))
+    for filename in ANALYZER_FILES:
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), filename), os.path.join(folder, filename))
+
+def run_stages(folder, files, n, stages=STAGES, workers=None, profiles=None):
+    import tweet_analyzer
+    import aggregates
+    import manifest
+    import utils
+
+    tweet_analyzer.files = list(files)
+    tweet_analyzer.ingestWorkers = workers
+    tweet_analyzer.sentimentWorkers = workers
+    tweet_analyzer.graphWorkers = workers
+    context = {}
+
+    def retrieving_cached():
+        # Sentiment cache is kept, while files have to be read again
+        os.remove(manifest.SNAPSHOT_FILE)
+        os.remove(aggregates.AGGREGATES_FILE)
+        tweet_analyzer.tweets_retrieving(excludeNeutral=True)
+
+    def statistics():
+        tweet_analyzer.statistics()
+        with aggregates.AggregateStore() as store:
+            days = store.days(tweet_analyzer.excludeNeutralTweets)
+        stdAvgs, _, _, _ = aggregates.daily_statistics(days)
+        context['totalTweetsProcessed'], context['avgSharing'] = aggregates.sharing_statistics(days)
+        context['stdAvgSum'] = sum(stdAvgs.values()) / len(days)
+
+    def averages():
+        context['stdAvgs'], context['wgtAvgs'] = utils.averages(context['df'], tweet_analyzer.excludeNeutralTweets)
+
+    def std_devs():
+        context['stdDevs'], context['wgtDevs'] = utils.std_devs(context['df'], context['stdAvgs'], context['wgtAvgs'], tweet_analyzer.excludeNeutralTweets)
+
+    functions = {
+        'tweets_retrieving' : lambda: tweet_analyzer.tweets_retrieving(excludeNeutral=True),
+        'tweets_retrieving_cached' : retrieving_cached,
+        'statistics' : statistics,
+        'to_dataframe' : lambda: context.update(df=tweet_analyzer.tweets.to_dataframe()),
+        'utils.averages' : averages,
+        'utils.std_devs' : std_devs,
+        'utils.compute_cov_corr' : lambda: utils.compute_cov_corr(context['df'], context['avgSharing'], context['stdAvgSum'], context['totalTweetsProcessed'], tweet_analyzer.excludeNeutralTweets),
+        'utils.plot' : lambda: utils.plot(context['stdAvgs'], context['stdDevs'], -0.8, "", "Plots/Benchmark.png"),
+        'graph_creation' : tweet_analyzer.graph_creation,
+        'wordCloud' : tweet_analyzer.wordCloud
+    }
+
+    results = []
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        for stage in STAGES:
+            # Stages not requested are run anyway (without being measured) if a following stage needs their results
+            measured = stage in stages
+            if not measured and STAGES.index(stage) > max(STAGES.index(s) for s in stages):
+                break
+
+            print(HEADER + BOLD + "Stage " + stage + ENDC)
+            metrics = instrumentation.Metrics(enabled=measured, profiles=profiles and os.path.join(cwd, profiles, format_size(n)))
+            with metrics.stage(stage):
+                functions[stage]()
+
+            if measured:
+                result = metrics.stages[-1]
+                results.append(dict(size=n, tweets_per_second=round(n / result['seconds'], 1) if result['seconds'] > 0 else None, **result))
+    finally:
+        os.chdir(cwd)
+
+    return results
+
+"""
+REGRESSIONS
+
+    Each result is compared with the one of the baseline with the same size and stage: it's a regression if its time (or its memory increase) exceeds the baseline by more than 'tolerance' (a fraction),
+    and by more than MIN_SECONDS (MIN_MEGABYTES)
+"""
+def regressions(results, baseline, tolerance):
+    previous = {(result['size'], result['stage']) : result for result in baseline['results']}
+    found = []
+
+    for result in results:
+        base = previous.get((result['size'], result['stage']))
+        if base is None:
+            continue
+        if result['seconds'] > base['seconds'] * (1 + tolerance) and result['seconds'] - base['seconds'] > MIN_SECONDS:
+            found.append((result, base, 'seconds'))
+        if result['rss_increase_mb'] is not None and base.get('rss_increase_mb') is not None:
+            if result['rss_increase_mb'] > base['rss_increase_mb'] * (1 + tolerance) and result['rss_increase_mb'] - base['rss_increase_mb'] > MIN_MEGABYTES:
+                found.append((result, base, 'rss_increase_mb'))
+
+    return found
+
+def print_results(results, baseline=None):
+    pt = PrettyTable()
+    pt.field_names = ["Tweets", "Stage", "Seconds", "Tweets/s", "Peak RSS (MB)", "RSS increase (MB)"] + (["Baseline seconds"] if baseline else [])
+    pt.align["Stage"] = "l"
+    previous = {(result['size'], result['stage']) : result for result in baseline['results']} if baseline else {}
+
+    for result in results:
+        row = [format_size(result['size']), result['stage'], result['seconds'], result['tweets_per_second'], result['rss_peak_mb'], result['rss_increase_mb']]
+        if baseline:
+            base = previous.get((result['size'], result['stage']))
+            row.append(base['seconds'] if base else "")
+        pt.add_row(row)
+    print(pt)
+
+def environment():
+    return {
+        'date' : str(dt.datetime.now()),
+        'python' : platform.python_version(),
+        'platform' : platform.platform(),
+        'processor' : platform.processor(),
+        'cpu_count' : os.cpu_count()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures time and memory of each stage of tweet_analyzer.py on synthetic corpora")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k"], help="number of tweets of each corpus, i.e. 10k 100k 1M 10M (10k 100k by default)")
+    parser.add_argument("--days", type=int, default=DAYS, help="days of each corpus, one RAW file per day (" + str(DAYS) + " by default)")
+    parser.add_argument("--quote-ratio", type=float, default=QUOTE_RATIO, help="fraction of tweets quoting another tweet (" + str(QUOTE_RATIO) + " by default)")
+    parser.add_argument("--format", choices=list(tweet_io.FORMATS), default='raw', help="format of the generated files (raw by default, as tweet_fetcher.py)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated corpora")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="stages to measure (every one by default)")
+    parser.add_argument("--workers", type=int, help="processes used for parallel reading, sentiment scoring and gexf files (every core by default)")
+    parser.add_argument("--folder", default=BENCHMARKS_FOLDER, help="folder of generated corpora (reused by following runs)")
+    parser.add_argument("--output", default=RESULTS_FILE, help="JSON file of results (" + RESULTS_FILE + " by default)")
+    parser.add_argument("--baseline", metavar="FILE", help="JSON file of previous results: exits with an error if a stage regressed")
+    parser.add_argument("--cprofile", metavar="FOLDER", help="dump cProfile stats of each stage in FOLDER (a subfolder for each size)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="fraction a stage can exceed the baseline before being a regression (0.25 by default)")
+    args = parser.parse_args()
+
+    # Baseline is read before running, so it can be the same file of the output
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+    results = []
+    for n in [parse_size(size) for size in args.sizes]:
+        folder = os.path.join(args.folder, "Corpus of " + format_size(n) + " tweets (" + str(args.days) + " days, quote ratio " + str(args.quote_ratio) + ", seed " + str(args.seed) + ", " + args.format + ")")
+        files = generate_corpus(folder, n, args.days, args.quote_ratio, args.seed, args.format)
+        prepare_folder(folder)
+        results += run_stages(folder, files, n, args.stages, args.workers, args.cprofile)
+
+    print_results(results, baseline)
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({'environment' : environment(), 'arguments' : vars(args), 'results' : results}, f, indent=4)
+    print(OKGREEN + "Results saved in \"" + args.output + "\"" + ENDC)
+
+    if baseline:
+        found = regressions(results, baseline, args.tolerance)
+        for result, base, metric in found:
+            print(FAIL + "Regression of " + result['stage'] + " (" + format_size(result['size']) + " tweets): " + metric + " " + str(base[metric]) + " -> " + str(result[metric]) + ENDC)
+        if found:
+            sys.exit(1)
+        print(OKGREEN + "No regressions over the baseline" + ENDC)
+
+if __name__ == "__main__":
+    main()
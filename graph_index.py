@@ -0,0 +1,148 @@
+"""
+graph_index.py contains the index of the quote graph built over every tweet loaded by tweet_analyzer.py
+
+Each tweet (collected, or only quoted by a collected one) is a single node, identified by an integer, and links ("quotes") are stored in CSR format (Compressed Sparse Row): the neighbours of node i are indices[indptr[i]:indptr[i+1]].
+Both directions are indexed (who is quoted by a tweet, who quotes a tweet), so degrees, neighbours and connected components are computed with NumPy operations over the whole corpus, instead of building a separate XML tree for each day.
+"""
+
+import datetime as dt
+import numpy as np
+
+"""
+    Builds CSR adjacency (indptr, indices) of 'n' nodes, from arrays of sources and targets of links
+"""
+def csr(sources, targets, n):
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+    return indptr, targets[order]
+
+"""
+    Quote graph of a tweet_store.TweetStore
+
+        Parameters:
+            'ids' is the id_str of each node: first the tweets of the store (node i is row i of the store), then tweets only quoted
+            'index' maps id_str to node
+            'quoted_info' maps a node of a tweet only quoted to (username, full_text), as known by the last tweet quoting it
+            'sources', 'targets' and 'days' describe each link (quoting tweet, quoted tweet, day ordinal of the quoting tweet)
+            'out_indptr', 'out_indices' is the CSR adjacency of quoted tweets, 'in_indptr', 'in_indices' the one of quoting tweets
+            'in_degree' and 'out_degree' are the number of quotes received and made by each node
+"""
+class QuoteGraph:
+    def __init__(self, tweets):
+        self.tweets = tweets
+        self.ids = list(tweets.ids)
+        self.index = dict(tweets.index)
+        self.quoted_info = {}
+        sources = []
+        targets = []
+
+        for row in sorted(tweets.quoted):
+            quoted_id, quoted_username, quoted_full_text = tweets.quoted[row]
+            node = self.index.get(quoted_id)
+            if node is None:
+                node = len(self.ids)
+                self.index[quoted_id] = node
+                self.ids.append(quoted_id)
+            if node >= len(tweets):
+                self.quoted_info[node] = (quoted_username, quoted_full_text)
+            sources.append(row)
+            targets.append(node)
+
+        self.n = len(self.ids)
+        self.sources = np.array(sources, dtype=np.int64)
+        self.targets = np.array(targets, dtype=np.int64)
+        self.days = tweets.day[self.sources] if len(sources) else np.zeros(0, dtype=np.int32)
+        self.out_indptr, self.out_indices = csr(self.sources, self.targets, self.n)
+        self.in_indptr, self.in_indices = csr(self.targets, self.sources, self.n)
+        self.in_degree = np.diff(self.in_indptr)
+        self.out_degree = np.diff(self.out_indptr)
+        self.labels = None
+
+    def __len__(self):
+        return self.n
+
+    def is_collected(self, node):
+        return node < len(self.tweets)
+
+    # Tweets quoting the given node
+    def quoters(self, node):
+        return self.in_indices[self.in_indptr[node]:self.in_indptr[node+1]]
+
+    # Tweets quoted by the given node
+    def quoted(self, node):
+        return self.out_indices[self.out_indptr[node]:self.out_indptr[node+1]]
+
+    """
+        Label of the (weakly) connected component of each node, the smallest node of the component
+
+            Labels are computed by hooking and pointer jumping: each link hooks the root of the greater label to the smaller one, then every node jumps to its root, until no label changes. Each round is a vectorized pass over all links, and few rounds are needed
+    """
+    def components(self):
+        if self.labels is not None:
+            return self.labels
+
+        labels = np.arange(self.n, dtype=np.int64)
+        while len(self.sources):
+            sourceLabels = labels[self.sources]
+            targetLabels = labels[self.targets]
+            smallest = np.minimum(sourceLabels, targetLabels)
+            hooked = labels.copy()
+            np.minimum.at(hooked, sourceLabels, smallest)
+            np.minimum.at(hooked, targetLabels, smallest)
+
+            jumped = hooked[hooked]
+            while not np.array_equal(jumped, hooked):
+                hooked = jumped
+                jumped = hooked[hooked]
+
+            if np.array_equal(hooked, labels):
+                break
+            labels = hooked
+
+        self.labels = labels
+        return labels
+
+    """
+        Sizes of connected components, in descending order
+    """
+    def component_sizes(self):
+        sizes = np.bincount(self.components())
+        return np.sort(sizes[sizes > 0])[::-1]
+
+    """
+        Nodes of the 'k' most quoted tweets, in descending order of quotes received
+    """
+    def top_quoted(self, k=10):
+        nodes = np.argsort(-self.in_degree, kind='stable')[:k]
+        return [node for node in nodes if self.in_degree[node] > 0]
+
+    def username(self, node):
+        if self.is_collected(node):
+            return self.tweets.usernames[self.tweets.username_codes[node]]
+        return self.quoted_info[node][0]
+
+    def full_text(self, node):
+        if self.is_collected(node):
+            return self.tweets.full_texts[node]
+        return self.quoted_info[node][1]
+
+    """
+        Days (as datetime.date) in which each node appears, merged in ranges of consecutive days: a collected tweet appears in the day it was created, and every tweet appears in the days it has been quoted. Returns a list of (start, end) ranges for each node
+    """
+    def spells(self):
+        nodes = np.concatenate((np.arange(len(self.tweets), dtype=np.int64), self.targets))
+        days = np.concatenate((self.tweets.day.astype(np.int64), self.days.astype(np.int64)))
+        pairs = np.unique(nodes * (1 << 32) + days)
+        nodes = pairs >> 32
+        days = pairs & ((1 << 32) - 1)
+
+        spells = [[] for _ in range(self.n)]
+        for node, day in zip(nodes.tolist(), days.tolist()):
+            nodeSpells = spells[node]
+            if nodeSpells and nodeSpells[-1][1] == day - 1:
+                nodeSpells[-1][1] = day
+            else:
+                nodeSpells.append([day, day])
+
+        return [[(dt.date.fromordinal(start), dt.date.fromordinal(end)) for start, end in nodeSpells] for nodeSpells in spells]
@@ -0,0 +1,123 @@
+"""
+ingest.py contains the parallel reading of tweets used by tweet_analyzer.py for large RAW (and plain JSON Lines) files
+
+Each file is split in shards (byte ranges holding whole tweets, see tweet_io.shards), which are parsed, cleaned and scored by a pool of processes:
+reading a dump of several GB scales with the number of cores, instead of being bound to a single process.
+"""
+
+import os
+import sqlite3
+import urllib.request
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import tweet_io
+import tweet_store
+import sentiment
+
+# Size (in bytes) of each shard
+SHARD_SIZE = 16 << 20
+# Files are read in parallel only if the bytes to read in shards exceed this size (otherwise starting the pool costs more than it saves)
+PARALLEL_MIN_SIZE = 2 * SHARD_SIZE
+
+# Connection to the sentiment cache (read only) and analyzer of each worker process, built once by 'init_worker'
+worker_cache = None
+worker_analyzer = None
+
+"""
+    Returns (id_str, created, username, full_text, retweet_count, favorite_count, hashtags, quote) of a tweet, as stored by tweet_store.TweetStore.add:
+    texts are cleaned from urls, the date is converted in its timestamp (see tweet_store.timestamp), hashtags are a tuple of their texts (without '#') and 'quote' is None or (quoted_tweet_id, quoted_tweet_username, quoted_tweet_full_text)
+"""
+def clean_tweet(tweet):
+    full_text = ' '.join(word for word in tweet['full_text'].split() if not word.startswith('https:'))
+
+    # entities.hashtags.text (without'#')
+    hashtags = tuple(hashtag['text'] for hashtag in tweet['entities']['hashtags'])
+
+    # if this tweet is a quote, store additional fields
+    quote = None
+    if tweet['is_quote_status']:
+        quote = (tweet['quoted_status']['id_str'], tweet['quoted_status']['user']['name'], ' '.join(word for word in tweet['quoted_status']['full_text'].split() if not word.startswith('https:')))
+
+    return tweet['id_str'], tweet_store.timestamp(tweet['created_at']), tweet['user']['name'], full_text, tweet['retweet_count'], tweet['favorite_count'], hashtags, quote
+
+def init_worker(cachePath):
+    global worker_cache
+    global worker_analyzer
+    worker_cache = sqlite3.connect("file:" + urllib.request.pathname2url(os.path.abspath(cachePath)) + "?mode=ro", uri=True)
+    worker_analyzer = sentiment.analyzer()
+
+"""
+    Parses, cleans and scores the tweets of a shard (in a worker process)
+
+        The sentiment of each tweet is looked up in the cache (read only: new scores are written by the main process), and computed only if missing.
+        Returns (records, hits, scored):
+            'records' is the list of the cleaned tweets (see clean_tweet) with their sentiment appended, in the order of the file
+            'hits' is the list of cache keys found (see sentiment.SentimentCache.key), 'scored' the list of (key, compound) of the tweets scored
+"""
+def parse_shard(filename, start, end):
+    records = []
+    hits = []
+    scored = []
+
+    for tweet in tweet_io.read_shard(filename, start, end):
+        key = sentiment.SentimentCache.key(tweet['id_str'], tweet['full_text'])
+        row = worker_cache.execute("SELECT compound FROM scores WHERE id_str = ? AND text_hash = ?", key).fetchone()
+        if row is None:
+            sa = worker_analyzer.polarity_scores(tweet['full_text'])['compound']
+            scored.append((key, sa))
+        else:
+            sa = row[0]
+            hits.append(key)
+        records.append(clean_tweet(tweet) + (sa,))
+
+    return records, hits, scored
+
+"""
+    Generator of the results of parse_shard for every shard in 'tasks' ((filename, start, end) tuples), in the same order of 'tasks'
+
+        Shards are parsed by a pool of 'workers' processes, while at most two shards per worker are pending (parsed, or waiting to be consumed), so memory is bounded whatever the size of the files.
+        The pool is shut down before the last result is yielded, so no worker is left alive once every shard has been consumed (i.e. while sentiment.score_texts starts its own pool), even if the generator is never resumed again
+"""
+def parse_shards(tasks, workers, cachePath):
+    tasks = iter(tasks)
+    last = None
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cachePath,)) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(parse_shard, *task))
+            if len(pending) >= 2 * workers:
+                break
+
+        while pending:
+            result = pending.popleft().result()
+            task = next(tasks, None)
+            if task is not None:
+                pending.append(executor.submit(parse_shard, *task))
+            if not pending:
+                last = result
+                break
+            yield result
+
+    if last is not None:
+        yield last
+
+"""
+    Returns the shards of each file to be read in parallel by 'workers' processes (a dictionary of lists of (start, end), in the order of 'files'),
+    empty if there are too few bytes to read to be worth a pool (or a single worker). Compressed and parquet files are never split (see tweet_io.shards)
+"""
+def plan(files, workers=None, shard_size=SHARD_SIZE):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return {}
+
+    planned = {}
+    for file in files:
+        fileShards = tweet_io.shards(file, shard_size)
+        if fileShards is not None:
+            planned[file] = fileShards
+
+    if sum(end - start for fileShards in planned.values() for start, end in fileShards) < PARALLEL_MIN_SIZE:
+        return {}
+    return planned
@@ -0,0 +1,153 @@
+"""
+instrumentation.py contains the lightweight instrumentation of tweet_analyzer.py, tweet_fetcher.py (enabled by their "--profile" flag) and benchmark.py
+
+Each stage of a run is wrapped by Metrics.stage, measuring its elapsed time and memory (and optionally profiling it with cProfile), while counters (requests made, tweets read, ...) are added by the code of the stage itself.
+When disabled, stages and counters cost nothing but a function call, so the instrumentation is left in place.
+"""
+
+import os
+import csv
+import json
+import time
+import cProfile
+import threading
+import datetime as dt
+from contextlib import contextmanager
+
+# Seconds between two samples of the memory used by the process
+SAMPLE_INTERVAL = 0.01
+# Folder of cProfile dumps (by default)
+PROFILES_FOLDER = "Logs/Profiles"
+
+"""
+MEMORY
+
+    Memory is measured as resident set size (RSS) of the process, read from /proc/self/statm (Linux), sampled every SAMPLE_INTERVAL seconds by a thread while a stage runs: the peak during the stage,
+    and its increase over the memory used before the stage. Where /proc is not available, memory is not measured (None).
+    Memory of worker processes (sentiment scoring, gexf files) isn't included.
+"""
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def rss():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+class MemorySampler:
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stop = threading.Event()
+        self.start = None
+        self.peak = None
+
+    def sample(self):
+        current = rss()
+        if current is not None:
+            self.peak = max(self.peak or 0, current)
+
+    def run(self):
+        while not self.stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.start = rss()
+        self.peak = self.start
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+        self.sample()
+
+def megabytes(size):
+    return None if size is None else round(size / (1 << 20), 1)
+
+"""
+    Metrics of a run
+
+        'stages' is the list of stages measured, each one a dictionary with its 'stage' name, 'seconds', 'rss_start_mb', 'rss_peak_mb', 'rss_increase_mb' (and 'profile', the file of its cProfile stats)
+        'counters' maps the name of each counter to its value (counters can be added by many threads)
+        'profiles' is the folder where cProfile stats of each stage are dumped (as "<stage>.prof", readable by pstats or snakeviz), None to not profile stages.
+        Stages can't be nested while profiling, because only one profiler can be active at a time
+"""
+class Metrics:
+    def __init__(self, enabled=False, profiles=None):
+        self.enabled = enabled
+        self.profiles = profiles
+        self.started = str(dt.datetime.now())
+        self.stages = []
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        profiler = cProfile.Profile() if self.profiles is not None else None
+        with MemorySampler() as memory:
+            start = time.perf_counter()
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                seconds = time.perf_counter() - start
+
+        result = {
+            'stage' : name,
+            'seconds' : round(seconds, 4),
+            'rss_start_mb' : megabytes(memory.start),
+            'rss_peak_mb' : megabytes(memory.peak),
+            'rss_increase_mb' : megabytes(memory.peak - memory.start) if memory.start is not None else None
+        }
+        if profiler is not None:
+            os.makedirs(self.profiles, exist_ok=True)
+            result['profile'] = os.path.join(self.profiles, name + ".prof")
+            profiler.dump_stats(result['profile'])
+        self.stages.append(result)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = value
+
+    # Seconds of the last stage with the given name (None if never measured)
+    def seconds(self, name):
+        for result in reversed(self.stages):
+            if result['stage'] == name:
+                return result['seconds']
+        return None
+
+    """
+        Saves the metrics in 'filename': as JSON, or as CSV if it ends with ".csv" (a row for each measure, with columns 'stage', 'metric' and 'value', where counters have an empty stage)
+    """
+    def save(self, filename):
+        if os.path.dirname(filename):
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        if filename.endswith(".csv"):
+            with open(filename, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(['stage', 'metric', 'value'])
+                for result in self.stages:
+                    for metric, value in result.items():
+                        if metric != 'stage':
+                            writer.writerow([result['stage'], metric, value])
+                for name, value in self.counters.items():
+                    writer.writerow(['', name, value])
+        else:
+            with open(filename, "w") as f:
+                json.dump({'started' : self.started, 'finished' : str(dt.datetime.now()), 'stages' : self.stages, 'counters' : self.counters}, f, indent=4)
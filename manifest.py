@@ -0,0 +1,185 @@
+"""
+manifest.py contains the ingest manifest used by tweet_analyzer.py to read only files (and tweets) never read before
+
+The manifest records every file already read, with its size, modification time and hash of its content, and it's saved together with the snapshot of their tweets (see Snapshot), kept on disk in a segment for each file with a sorted index of their id_str.
+In the next run only new (or modified) files are read and saved, and the tweets of the selected files are rebuilt from their segments: adding a file to a corpus of hundreds costs only the reading (and writing) of that file.
+"""
+
+import os
+import pickle
+import hashlib
+import numpy as np
+
+import tweet_store
+
+SNAPSHOT_FOLDER = "Cache/Snapshot"
+# Manifest and list of segments of the snapshot (see Snapshot)
+SNAPSHOT_FILE = os.path.join(SNAPSHOT_FOLDER, "manifest.pickle")
+# Version of the layout of the snapshot: snapshots of an older version (i.e. saved before each file had its own segment) are discarded, so every file is read again (sentiment scores are still cached)
+SNAPSHOT_VERSION = 3
+
+# Size of each read when hashing a file
+HASH_CHUNK = 1 << 20
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+"""
+    Manifest of files already read
+
+        'entries' maps the path of a file to a dictionary with its 'size', 'mtime_ns', 'sha1' (hash of the content) and number of 'tweets' read.
+        A file is unchanged if size and modification time are the same of the recorded ones. Otherwise its content is hashed: a file with the same hash (i.e. copied, or touched) is unchanged as well, and only its modification time is updated
+"""
+class Manifest:
+    def __init__(self):
+        self.entries = {}
+
+    """
+        Returns 'new' (file never read), 'changed' (file read, then modified, i.e. appended by a resumed download) or 'unchanged'
+    """
+    def status(self, path):
+        entry = self.entries.get(path)
+        if entry is None:
+            return 'new'
+
+        stat = os.stat(path)
+        if stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime_ns']:
+            return 'unchanged'
+
+        if stat.st_size == entry['size'] and file_hash(path) == entry['sha1']:
+            entry['mtime_ns'] = stat.st_mtime_ns
+            return 'unchanged'
+
+        return 'changed'
+
+    def record(self, path, tweets):
+        stat = os.stat(path)
+        self.entries[path] = {'size' : stat.st_size, 'mtime_ns' : stat.st_mtime_ns, 'sha1' : file_hash(path), 'tweets' : tweets}
+
+"""
+    Snapshot of the tweets read, saved in SNAPSHOT_FOLDER together with the manifest
+
+        Each file read has its own segment: the tweets read from it (a pickled tweet_store.TweetStore, with the modification time of the file), or the engagement counts of a DELTA file ((id_str, retweet_count, favorite_count) tuples, with its modification time), with the sorted array of their id_str (and their rows in the segment) as its index.
+        A file read again (i.e. appended by a resumed download) replaces its segment, so adding a file costs the reading and writing of that file only, and the tweets of a file are never pickled together with the others.
+        The tweets of the selected files are rebuilt from their segments only (see tweets): files read by previous runs but not selected don't count, and the version of a tweet read from several files is the one of the newest file, refreshed by newer DELTA files, as if the selected files were read by a single run.
+        A tweet is looked up in the indexes of the segments (a binary search each), and only the segments holding it are loaded, so updating the tweets read by a run doesn't load the whole snapshot.
+        The manifest, the segment of each file and the files selected by the last run are saved in SNAPSHOT_FILE, replaced atomically after the segments have been written, so it always lists complete segments.
+
+        Parameters:
+            'manifest' is the Manifest of files read
+            'segments' maps the path of each file read to the name of its segment
+            'selected' is the list of files selected by the last run, in the order they were read
+            'indexes' and 'stores' hold the indexes and the segments already loaded
+"""
+class Snapshot:
+    def __init__(self, folder=SNAPSHOT_FOLDER):
+        self.folder = folder
+        self.manifest = Manifest()
+        self.segments = {}
+        self.selected = []
+        self.next = 0
+        self.indexes = {}
+        self.stores = {}
+
+        try:
+            with open(os.path.join(folder, os.path.basename(SNAPSHOT_FILE)), "rb") as f:
+                saved = pickle.load(f)
+            if saved.get('version') == SNAPSHOT_VERSION:
+                self.manifest, self.segments, self.selected, self.next = saved['manifest'], saved['segments'], saved['selected'], saved['next']
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError, AttributeError):
+            pass
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def index(self, name):
+        if name not in self.indexes:
+            with np.load(self.path(name + ".npz")) as index:
+                self.indexes[name] = (index['ids'], index['rows'])
+        return self.indexes[name]
+
+    def segment(self, name):
+        if name not in self.stores:
+            with open(self.path(name + ".pickle"), "rb") as f:
+                self.stores[name] = pickle.load(f)
+        return self.stores[name]
+
+    """
+        Writes the segment of 'file': a TweetStore of the tweets read from it, or the 'deltas' list of (id_str, retweet_count, favorite_count) tuples of a DELTA file modified at 'mtime'. Its previous segment is removed by save
+    """
+    def put(self, file, store=None, deltas=None, mtime=0.0):
+        os.makedirs(self.folder, exist_ok=True)
+        name = "segment-" + str(self.next)
+        self.next += 1
+
+        segment = store if store is not None else {'mtime' : mtime, 'deltas' : deltas}
+        with open(self.path(name + ".pickle"), "wb") as f:
+            pickle.dump(segment, f, protocol=pickle.HIGHEST_PROTOCOL)
+        ids = np.array(store.ids if store is not None else [delta[0] for delta in deltas], dtype=str)
+        rows = np.argsort(ids, kind='stable').astype(np.int64)
+        with open(self.path(name + ".npz"), "wb") as f:
+            np.savez(f, ids=ids[rows], rows=rows)
+
+        self.segments[file] = name
+        self.stores[name] = segment
+        self.indexes[name] = (ids[rows], rows)
+
+    """
+        Returns the rows of the segment 'name' holding the tweets 'ids' (a sorted array of id_str), in the order they were read, without loading the segment
+    """
+    def rows(self, name, ids):
+        index, rows = self.index(name)
+        if not len(index):
+            return rows
+        positions = np.minimum(np.searchsorted(index, ids), len(index) - 1)
+        return np.sort(rows[positions[index[positions] == ids]])
+
+    """
+        Returns the sorted array of the id_str of every tweet read from 'files'
+    """
+    def ids(self, files):
+        return np.unique(np.concatenate([self.index(self.segments[file])[0] for file in files if file in self.segments] + [np.array([], dtype=str)]))
+
+    """
+        Returns a store with the tweets of 'files' (in the order they were read), or only the ones of 'ids' (a sorted array of id_str), as if 'files' were read by a single run: a tweet read from a file replaces the one read from an older file, and a DELTA file refreshes the counts of the tweets read from older files.
+        Only the segments holding the tweets are loaded
+    """
+    def tweets(self, files, ids=None):
+        store = tweet_store.TweetStore()
+        for file in files:
+            name = self.segments.get(file)
+            if name is None:
+                continue
+            rows = self.rows(name, ids) if ids is not None else None
+            if rows is not None and not len(rows):
+                continue
+
+            segment = self.segment(name)
+            if isinstance(segment, tweet_store.TweetStore):
+                store.extend(segment, rows)
+            else:
+                for row in (range(len(segment['deltas'])) if rows is None else rows):
+                    store.set_engagement(*segment['deltas'][row], segment['mtime'])
+        return store
+
+    """
+        Saves the manifest, the segments and the files selected by the run ('selected'), removing the segments no longer listed
+    """
+    def save(self, selected):
+        os.makedirs(self.folder, exist_ok=True)
+        self.selected = list(selected)
+
+        path = self.path(os.path.basename(SNAPSHOT_FILE))
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump({'version' : SNAPSHOT_VERSION, 'manifest' : self.manifest, 'segments' : self.segments, 'selected' : self.selected, 'next' : self.next}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+        # Segments replaced (or left by a snapshot discarded, or by an interrupted run) are removed only now, when no longer listed
+        listed = set(name + extension for name in self.segments.values() for extension in (".pickle", ".npz"))
+        for filename in os.listdir(self.folder):
+            if filename.startswith("segment-") and filename not in listed:
+                os.remove(self.path(filename))
@@ -0,0 +1,130 @@
+"""
+partitions.py contains the per-day partitions of tweets spilled to disk by the chunked (out-of-core) mode of tweet_analyzer.py
+
+In chunked mode tweets are read in batches of bounded size: each batch is scored, added to the per-day aggregates (aggregates.AggregateStore, already on disk) and appended to the partition of the day of each tweet, then released.
+Daily graphs are written at the end from the partitions, one day at a time, so memory depends on the size of a batch and of the largest day, not on the size of the corpus.
+"""
+
+import os
+import re
+import pickle
+import datetime as dt
+
+import manifest
+import tweet_store
+import utils
+
+PARTITIONS_FOLDER = "Cache/Partitions"
+# Manifest of the files already spilled (see manifest.Manifest)
+MANIFEST_FILE = os.path.join(PARTITIONS_FOLDER, "manifest.pickle")
+PARTITION_PATTERN = r"^(\d{4}-\d{2}-\d{2})\.pickle$"
+# Tweets of each batch (by default)
+CHUNK_SIZE = 100000
+
+"""
+    Writer of the partitions
+
+        Items of a batch are collected by day and appended to the partition of their day (a file of pickled lists) by flush. Each item is either:
+            a tweet, (id_str, created, username, full_text, retweet_count, favorite_count, hashtags, quote, sa, mtime), as returned by ingest.clean_tweet with its sentiment and the modification time of its file
+            a refresh of engagement counts, (id_str, retweet_count, favorite_count, mtime), read from a DELTA file
+"""
+class PartitionWriter:
+    def __init__(self, folder=PARTITIONS_FOLDER):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.pending = {}
+
+    def add(self, day, item):
+        self.pending.setdefault(day, []).append(item)
+
+    def flush(self):
+        for day, items in self.pending.items():
+            with open(os.path.join(self.folder, str(dt.date.fromordinal(day)) + ".pickle"), "ab") as f:
+                pickle.dump(items, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.pending = {}
+
+"""
+    Returns (date, path) of every partition, in chronological order
+"""
+def days(folder=PARTITIONS_FOLDER):
+    if not os.path.isdir(folder):
+        return []
+    partitions = [(dt.date.fromisoformat(match.group(1)), os.path.join(folder, file)) for file, match in ((file, re.match(PARTITION_PATTERN, file)) for file in os.listdir(folder)) if match]
+    return sorted(partitions)
+
+"""
+    Merges the items of a partition, returning the records of its tweets (same fields of tweet_store.TweetStore.record), in the order they were first read
+
+        As in tweet_store.TweetStore, a tweet read again replaces the previous one (keeping its position), and engagement counts are refreshed, unless read from an older file
+"""
+def read_day(path):
+    tweets = {}
+    with open(path, "rb") as f:
+        while True:
+            try:
+                items = pickle.load(f)
+            except EOFError:
+                break
+
+            for item in items:
+                previous = tweets.get(item[0])
+                if len(item) == 4:
+                    if previous is not None and previous[9] <= item[3]:
+                        tweets[item[0]] = previous[:4] + item[1:3] + previous[6:9] + (item[3],)
+                elif previous is None or previous[9] <= item[9]:
+                    tweets[item[0]] = item
+
+    return [record(tweet) for tweet in tweets.values()]
+
+def record(tweet):
+    id, created, username, full_text, retweet_count, favorite_count, hashtags, quote, sa, mtime = tweet
+    record = {
+        'id_str' : id,
+        'full_text' : full_text,
+        'created_at' : dt.date.fromordinal(tweet_store.day_of(created)),
+        'username' : username,
+        'retweet_count' : retweet_count,
+        'favorite_count' : favorite_count,
+        'sharing' : retweet_count + favorite_count + 1,
+        'sa' : float(sa),
+        'is_quote_status' : quote is not None
+    }
+
+    if quote is not None:
+        record['quoted_tweet_id'], record['quoted_tweet_username'], record['quoted_tweet_full_text'] = quote
+
+    return record
+
+# Writes the gexf file of a partition (in a worker process, reading the partition itself)
+def gexf_parser(path, date):
+    return utils.gexf_parser(read_day(path), date)
+
+"""
+    Loads the manifest of the files spilled: partitions of an older version (see manifest.SNAPSHOT_VERSION) are removed, so every file is spilled again
+"""
+def load_manifest(path=MANIFEST_FILE):
+    try:
+        with open(path, "rb") as f:
+            saved = pickle.load(f)
+        if isinstance(saved, dict) and saved.get('version') == manifest.SNAPSHOT_VERSION:
+            return saved['manifest']
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+        return manifest.Manifest()
+
+    return clear(path)
+
+"""
+    Removes every partition and the manifest of the files spilled (i.e. when a file spilled is no longer selected), returning an empty manifest
+"""
+def clear(path=MANIFEST_FILE):
+    for _, partition in days(os.path.dirname(path)):
+        os.remove(partition)
+    if os.path.exists(path):
+        os.remove(path)
+    return manifest.Manifest()
+
+def save_manifest(ingested, path=MANIFEST_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump({'version' : manifest.SNAPSHOT_VERSION, 'manifest' : ingested}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
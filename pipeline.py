@@ -0,0 +1,172 @@
+"""
+pipeline.py contains the runner of the stages of tweet_analyzer.py, which executes a stage only if its inputs changed since its last run
+
+Each stage declares its inputs (files selected, flags, Dates.txt, mask image, state of the cache it reads...), hashed in the 'key' of the run, and its outputs (files written, i.e. plots and gexf files).
+Outputs of each run are stored as artifacts in Cache/Artifacts (unless too large to be copied, see Pipeline.run), content addressed (by the hash of their content, so identical outputs are stored once), and recorded in Cache/pipeline.json under the key of the run.
+Running a stage again with a key already recorded restores its outputs (only if missing or modified) instead of executing it: i.e. toggling the exclusion of neutral tweets executes statistics and plots only, and toggling it back restores the plots of the first run.
+"""
+
+import io
+import os
+import sys
+import glob
+import json
+import shutil
+import hashlib
+from contextlib import redirect_stdout
+
+import manifest
+
+ARTIFACTS_FOLDER = "Cache/Artifacts"
+INDEX_FILE = "Cache/pipeline.json"
+# Runs remembered for each stage (artifacts of older runs are removed)
+KEEP_RUNS = 4
+
+def run_key(inputs):
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+"""
+    Fingerprint of a file used as input of a stage (None if missing): the hash of its content, or only its size and modification time if 'content' is False (large files, like the ones of tweets)
+"""
+def file_input(path, content=True):
+    if not os.path.isfile(path):
+        return None
+    if content:
+        return manifest.file_hash(path)
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def file_state(path):
+    stat = os.stat(path)
+    return {'size' : stat.st_size, 'mtime_ns' : stat.st_mtime_ns}
+
+# Stream writing on both 'streams' (to print the output of a stage while recording it)
+class Tee:
+    def __init__(self, *streams):
+        self.streams = streams
+
+    def write(self, text):
+        for stream in self.streams:
+            stream.write(text)
+        return len(text)
+
+    def flush(self):
+        for stream in self.streams:
+            stream.flush()
+
+"""
+    Pipeline of stages
+
+        'runs' maps the name of each stage to the list of its last runs (most recent first), each one a dictionary with its 'key', its 'outputs' (mapping the path of each file written to its 'sha1', 'size' and 'mtime_ns') and the 'log' printed (if replayed).
+        'force' executes every stage, even if up to date. 'executed' and 'skipped' list the stages run by this pipeline, 'log' is the output recorded by the last stage skipped (see replayed), 'restored' the outputs it copied back from the artifacts.
+"""
+class Pipeline:
+    def __init__(self, folder=ARTIFACTS_FOLDER, index=INDEX_FILE, force=False):
+        self.folder = folder
+        self.index = index
+        self.force = force
+        self.executed = []
+        self.skipped = []
+        self.log = ""
+        self.restored = []
+        try:
+            with open(index, "r") as f:
+                self.runs = json.load(f)
+        except (OSError, ValueError):
+            self.runs = {}
+
+    """
+        Runs the stage 'name', calling 'function' only if no run with the same 'inputs' is recorded (or its outputs can't be restored). Returns True if the stage has been executed.
+
+            'outputs' are the glob patterns of the files written by the stage, stored as artifacts after it runs.
+            If 'store' is False, outputs are too large (or changing too often) to be copied, i.e. the snapshot of tweets and the GEXF files: they're only checked, and the stage is executed if they're missing or modified.
+            If 'replay' is True, the output printed by the stage is recorded, to be printed again when the stage is skipped (i.e. tables of statistics): it's left in 'log'
+    """
+    def run(self, name, inputs, function, outputs=(), store=True, replay=False):
+        key = run_key(inputs)
+        recorded = next((run for run in self.runs.get(name, []) if run['key'] == key), None)
+        self.restored = []
+        if not self.force and recorded is not None and self.restore(recorded, store):
+            self.log = self.replayed(recorded)
+            self.skipped.append(name)
+            self.save()
+            return False
+
+        log = io.StringIO()
+        if replay:
+            with redirect_stdout(Tee(sys.stdout, log)):
+                function()
+        else:
+            function()
+
+        run = {'key' : key, 'outputs' : {}, 'log' : log.getvalue()}
+        for pattern in outputs:
+            for path in sorted(glob.glob(glob.escape(pattern) if os.path.isfile(pattern) else pattern)):
+                run['outputs'][path] = self.store(path) if store else file_state(path)
+        self.runs[name] = [run] + [other for other in self.runs.get(name, []) if other['key'] != key][:KEEP_RUNS - 1]
+        self.executed.append(name)
+        self.collect()
+        self.save()
+        return True
+
+    # Copies the file in the artifacts (if not stored yet), returning its 'sha1', 'size' and 'mtime_ns'
+    def store(self, path):
+        sha1 = manifest.file_hash(path)
+        artifact = os.path.join(self.folder, sha1)
+        if not os.path.exists(artifact):
+            os.makedirs(self.folder, exist_ok=True)
+            shutil.copyfile(path, artifact + ".tmp")
+            os.replace(artifact + ".tmp", artifact)
+        return dict(file_state(path), sha1=sha1)
+
+    """
+        Restores the outputs of a run missing or modified since it was recorded (modification time or size changed, and content changed as well), returning False if any of them can't be restored
+    """
+    def restore(self, run, store):
+        for path, recorded in run['outputs'].items():
+            if os.path.isfile(path) and file_state(path) == {'size' : recorded['size'], 'mtime_ns' : recorded['mtime_ns']}:
+                continue
+            if not store:
+                return False
+            if os.path.isfile(path) and manifest.file_hash(path) == recorded['sha1']:
+                recorded.update(file_state(path))
+                continue
+
+            artifact = os.path.join(self.folder, recorded['sha1'])
+            if not os.path.isfile(artifact):
+                return False
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(artifact, path)
+            recorded.update(file_state(path))
+            self.restored.append(path)
+        return True
+
+    """
+        Returns the log of a run replayed: lines about its outputs (i.e. "... created", "... saved in ...") are replaced by the state of each file, restored from the artifacts or already up to date, since nothing has been written by the stage
+    """
+    def replayed(self, run):
+        lines = []
+        for line in run['log'].splitlines(keepends=True):
+            paths = [path for path in run['outputs'] if path in line]
+            if not paths:
+                lines.append(line)
+            for path in paths:
+                lines.append("\"" + path + "\" " + ("restored from the artifact cache" if path in self.restored else "already up to date") + "\n")
+        return "".join(lines)
+
+    # Removes the artifacts not referenced by any run
+    def collect(self):
+        if not os.path.isdir(self.folder):
+            return
+        referenced = set(recorded['sha1'] for runs in self.runs.values() for run in runs for recorded in run['outputs'].values() if 'sha1' in recorded)
+        for artifact in os.listdir(self.folder):
+            if artifact not in referenced:
+                os.remove(os.path.join(self.folder, artifact))
+
+    def save(self):
+        if os.path.dirname(self.index):
+            os.makedirs(os.path.dirname(self.index), exist_ok=True)
+        with open(self.index + ".tmp", "w") as f:
+            json.dump(self.runs, f, indent=4)
+        os.replace(self.index + ".tmp", self.index)
@@ -0,0 +1,432 @@
+"""
+query_server.py contains the local query service of tweet_analyzer.py ("python tweet_analyzer.py serve"), a resident process answering HTTP/JSON queries over the tweets loaded in memory, instead of running the whole analysis again for each question
+
+Tweets are loaded once (tweet_store.TweetStore), together with the per-day aggregates (aggregates.AggregateStore), and every answer is cached: a repeated query is answered in a fraction of a millisecond, a new one in few milliseconds (a pass over the columns of the store, or over the aggregates of each day).
+New or modified RAW and DELTA files are read every few seconds (or on request): if any tweet changed, the new store replaces the old one and the cache is cleared.
+
+Endpoints (GET, parameters in the query string):
+    /status                          number of tweets and days loaded, entries in the cache (never cached)
+    /days                            statistics of each day (or bucket of 'resolution' hours, or rolling window of 'window' hours), with percentiles of sentiment for days
+    /tweets?user=&hashtag=&day=      tweets of a user, with a hashtag (case insensitive) and/or of a day, in chronological order ('limit' and 'offset' page them), with their averages
+    /top?user=&hashtag=&day=&n=10    most shared tweets, with the same filters
+    /graph?day=yyyy-mm-dd            quote subgraph of a day: quotes made that day and the tweets they link
+    /plot?kind=average               PNG plot of 'kind' average, weighted, percentiles or weighted-percentiles (with 'resolution' and 'window' for averages)
+Neutral tweets are excluded from statistics and plots, unless 'neutral=keep' is given. POST /refresh asks the ingestion (main) thread to read new files immediately, and answers once they're read.
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+import traceback
+import datetime as dt
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+import aggregates
+import graph_index
+import tweet_store
+import utils
+
+# Color ASCII used to change color of prints
+OKCYAN = '\033[96m'
+OKGREEN = '\033[92m'
+WARNING = '\033[93m'
+FAIL = '\033[91m' # Red
+ENDC = '\033[0m' # De-select the current color
+
+HOST = "127.0.0.1"
+PORT = 8000
+# Seconds between two checks of new files (0 checks only on request)
+POLL_INTERVAL = 30
+# Answers kept in the cache (least recently used are dropped)
+CACHE_ENTRIES = 256
+# Tweets returned by /tweets, unless a 'limit' is given
+PAGE_SIZE = 100
+
+PLOT_KINDS = ('average', 'weighted', 'percentiles', 'weighted-percentiles')
+
+"""
+    Query service
+
+        'tweets' is the tweet_store.TweetStore queried, replaced by 'refresh' (a function returning the store of tweets and whether it changed, see tweet_analyzer.serve_refresh).
+        'cache' maps (path, parameters) of each query to its answer (content type and body), 'generation' counts the stores served: the cache is cleared whenever the store is replaced.
+        Quote graph and hashtag index of the store are built by the first query needing them. The store is never modified once served (ingestion builds a new one), so queries run concurrently, while plots are drawn one at a time (matplotlib isn't thread safe).
+        New files are read by a single thread (see refresh_loop), which other threads ask for a refresh through 'refresh_requested' ('requests' counts the refreshes asked, 'completed' the last one done, both guarded by the 'refreshed' condition). The aggregates are written by the ingestion, so queries reading them wait for 'refresh_lock', held while new files are read
+"""
+class QueryService:
+    def __init__(self, tweets, refresh=None):
+        self.tweets = tweets
+        self.refresh_function = refresh
+        self.generation = 0
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.graph = None
+        self.hashtag_index = None
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.plot_lock = threading.Lock()
+        self.refresh_requested = threading.Event()
+        self.refreshed = threading.Condition()
+        self.requests = 0
+        self.completed = 0
+        self.refresh_error = None
+
+    """
+        Reads new files (if any), replacing the store and clearing the cache if a tweet changed. Returns True if the store has been replaced
+    """
+    def refresh(self):
+        if self.refresh_function is None:
+            return False
+
+        with self.refresh_lock:
+            tweets, changed = self.refresh_function()
+            if not changed:
+                return False
+
+            with self.lock:
+                self.tweets = tweets
+                self.graph = None
+                self.hashtag_index = None
+                self.generation += 1
+                self.cache.clear()
+        print(OKGREEN + "Serving " + str(len(tweets)) + " tweets (cache cleared)" + ENDC)
+        return True
+
+    """
+        Reads new files every 'poll' seconds (0 only when requested by request_refresh), until 'stopped' (a threading.Event, set by another thread) is set. Files are read only by the thread calling it: the main thread, by serve
+    """
+    def refresh_loop(self, poll, stopped=None):
+        stopped = stopped or threading.Event()
+        while not stopped.is_set():
+            self.refresh_requested.wait(poll or None)
+            if stopped.is_set():
+                break
+            with self.refreshed:
+                self.refresh_requested.clear()
+                request = self.requests
+
+            error = None
+            try:
+                self.refresh()
+            except Exception as e:
+                traceback.print_exc()
+                error = type(e).__name__ + ": " + str(e)
+            with self.refreshed:
+                self.completed = request
+                self.refresh_error = error
+                self.refreshed.notify_all()
+
+    """
+        Asks refresh_loop to read new files and waits until they're read. Returns True if the store has been replaced since the request, raises RuntimeError if reading failed
+    """
+    def request_refresh(self):
+        if self.refresh_function is None:
+            return False
+
+        with self.refreshed:
+            self.requests += 1
+            request = self.requests
+            generation = self.generation
+            self.refresh_requested.set()
+            while self.completed < request:
+                self.refreshed.wait()
+            if self.refresh_error is not None:
+                raise RuntimeError(self.refresh_error)
+        return self.generation > generation
+
+    """
+        Answers the query of 'path' with 'parameters' (a dictionary), returning (content type, body, True if cached). Raises KeyError for unknown paths, ValueError for invalid parameters
+    """
+    def query(self, path, parameters):
+        if path == '/status':
+            return ("application/json", json.dumps(self.status(parameters)).encode(), False)
+
+        key = (path, tuple(sorted(parameters.items())))
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key] + (True,)
+            generation = self.generation
+
+        handler = self.ENDPOINTS[path]
+        answer = handler(self, parameters)
+        if isinstance(answer, bytes):
+            answer = ("image/png", answer)
+        else:
+            answer = ("application/json", json.dumps(answer, default=str).encode())
+
+        with self.lock:
+            self.misses += 1
+            # An answer computed while the store was replaced is returned, but not cached
+            if generation == self.generation:
+                self.cache[key] = answer
+                if len(self.cache) > CACHE_ENTRIES:
+                    self.cache.popitem(last=False)
+        return answer + (False,)
+
+    def status(self, parameters):
+        tweets = self.tweets
+        return {
+            'tweets' : len(tweets),
+            'days' : len(np.unique(tweets.day)),
+            'users' : len(tweets.usernames),
+            'generation' : self.generation,
+            'cached' : len(self.cache),
+            'hits' : self.hits,
+            'misses' : self.misses
+        }
+
+    def days(self, parameters):
+        excludeNeutralTweets = parameters.get('neutral') != 'keep'
+        resolution = integer(parameters, 'resolution')
+        window = integer(parameters, 'window')
+
+        with self.refresh_lock, aggregates.AggregateStore() as store:
+            buckets = bucket_moments(store, excludeNeutralTweets, resolution, window)
+            histograms = store.sentiment_histograms(excludeNeutralTweets) if window is None and resolution in (None, 24) else {}
+        stdAvgs, stdDevs, wgtAvgs, wgtDevs = aggregates.daily_statistics(buckets)
+        stdPercentiles = aggregates.daily_percentiles(histograms)
+        wgtPercentiles = aggregates.daily_percentiles(histograms, weighted=True)
+
+        days = []
+        for bucket, moments in buckets.items():
+            day = {
+                'bucket' : bucket,
+                'tweets' : moments.n,
+                'standard_average' : stdAvgs[bucket],
+                'standard_deviation' : stdDevs[bucket],
+                'weighted_average' : wgtAvgs[bucket],
+                'weighted_deviation' : wgtDevs[bucket]
+            }
+            if bucket in stdPercentiles:
+                day['percentiles'] = dict(zip([str(round(p * 100)) for p in aggregates.PERCENTILES], stdPercentiles[bucket]))
+                day['weighted_percentiles'] = dict(zip([str(round(p * 100)) for p in aggregates.PERCENTILES], wgtPercentiles[bucket]))
+            days.append(day)
+        return days
+
+    def tweets_query(self, parameters):
+        tweets = self.tweets
+        rows = self.filter(tweets, parameters)
+        rows = rows[np.argsort(tweets.created[rows], kind='stable')]
+        limit = integer(parameters, 'limit', PAGE_SIZE, minimum=0)
+        offset = integer(parameters, 'offset', 0, minimum=0)
+
+        considered = rows if parameters.get('neutral') == 'keep' else rows[tweets.sa[rows] != 0.0]
+        sharing = tweets.sharing[considered]
+        return {
+            'count' : len(rows),
+            'standard_average' : float(tweets.sa[considered].mean()) if len(considered) else None,
+            'weighted_average' : float((tweets.sa[considered] * sharing).sum() / sharing.sum()) if len(considered) else None,
+            'tweets' : [self.record(tweets, row) for row in rows[offset:offset+limit]]
+        }
+
+    def top(self, parameters):
+        tweets = self.tweets
+        rows = self.filter(tweets, parameters)
+        rows = rows[np.argsort(-tweets.sharing[rows], kind='stable')]
+        return [self.record(tweets, row) for row in rows[:integer(parameters, 'n', 10)]]
+
+    """
+        Quote subgraph of a day: every quote made by a tweet of the day (as in its gexf file), with the tweets quoting and quoted. Degrees are counted in the day ('quotes_received' counts every day)
+    """
+    def graph_query(self, parameters):
+        if 'day' not in parameters:
+            raise ValueError("missing 'day'")
+        ordinal = dt.date.fromisoformat(parameters['day']).toordinal()
+        graph = self.quote_graph()
+
+        links = np.flatnonzero(graph.days == ordinal)
+        sources = graph.sources[links]
+        targets = graph.targets[links]
+        inDegree = dict(zip(*np.unique(targets, return_counts=True)))
+        outDegree = dict(zip(*np.unique(sources, return_counts=True)))
+
+        nodes = []
+        for node in np.unique(np.concatenate((sources, targets))).tolist():
+            tweet = {
+                'id' : graph.ids[node],
+                'user' : graph.username(node),
+                'text' : graph.full_text(node),
+                'collected' : graph.is_collected(node),
+                'in_degree' : int(inDegree.get(node, 0)),
+                'out_degree' : int(outDegree.get(node, 0)),
+                'quotes_received' : int(graph.in_degree[node])
+            }
+            if graph.is_collected(node):
+                tweet['sentiment'] = float(graph.tweets.sa[node])
+                tweet['sharing'] = int(graph.tweets.sharing[node])
+            nodes.append(tweet)
+
+        return {'day' : parameters['day'], 'nodes' : nodes, 'links' : [{'source' : graph.ids[source], 'target' : graph.ids[target]} for source, target in zip(sources.tolist(), targets.tolist())]}
+
+    def plot(self, parameters):
+        kind = parameters.get('kind', 'average')
+        if kind not in PLOT_KINDS:
+            raise ValueError("'kind' must be one of " + ", ".join(PLOT_KINDS))
+        excludeNeutralTweets = parameters.get('neutral') != 'keep'
+
+        with self.refresh_lock, aggregates.AggregateStore() as store:
+            if kind.endswith('percentiles'):
+                values = aggregates.daily_percentiles(store.sentiment_histograms(excludeNeutralTweets), weighted=kind.startswith('weighted'))
+            else:
+                values = bucket_moments(store, excludeNeutralTweets, integer(parameters, 'resolution'), integer(parameters, 'window'))
+        if not values:
+            raise ValueError("no tweets analyzed")
+
+        dates_text = open("Dates.txt", "r").read() if os.path.isfile("Dates.txt") else ""
+        descriptor, filename = tempfile.mkstemp(suffix=".png")
+        os.close(descriptor)
+        try:
+            with self.plot_lock:
+                if kind.endswith('percentiles'):
+                    utils.percentile_plot(values, -0.8, dates_text, filename)
+                else:
+                    stdAvgs, stdDevs, wgtAvgs, wgtDevs = aggregates.daily_statistics(values)
+                    if kind == 'average':
+                        utils.plot(stdAvgs, stdDevs, -0.8, dates_text, filename)
+                    else:
+                        utils.plot(wgtAvgs, wgtDevs, -1, dates_text, filename)
+            with open(filename, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(filename)
+
+    """
+        Rows of the tweets of a 'user' (exact username), with a 'hashtag' (without '#', case insensitive) and of a 'day' (yyyy-mm-dd), each filter applied only if given
+    """
+    def filter(self, tweets, parameters):
+        mask = np.ones(len(tweets), dtype=np.bool_)
+        if 'user' in parameters:
+            code = tweets.username_index.get(parameters['user'])
+            mask &= tweets.username_codes == (code if code is not None else -1)
+        if 'day' in parameters:
+            mask &= tweets.day == dt.date.fromisoformat(parameters['day']).toordinal()
+        if 'hashtag' in parameters:
+            rows = self.hashtags(tweets).get(parameters['hashtag'].lstrip('#').lower(), [])
+            selected = np.zeros(len(tweets), dtype=np.bool_)
+            selected[np.asarray(rows, dtype=np.int64)] = True
+            mask &= selected
+        return np.flatnonzero(mask)
+
+    # Rows of the tweets of each hashtag (lower case), built once for each store
+    def hashtags(self, tweets):
+        with self.lock:
+            if self.hashtag_index is None or self.hashtag_index[0] is not tweets:
+                index = {}
+                for row, hashtags in enumerate(tweets.hashtags):
+                    for hashtag in set(hashtag.lower() for hashtag in hashtags):
+                        index.setdefault(hashtag, []).append(row)
+                self.hashtag_index = (tweets, index)
+            return self.hashtag_index[1]
+
+    def quote_graph(self):
+        with self.lock:
+            if self.graph is None:
+                self.graph = graph_index.QuoteGraph(self.tweets)
+            return self.graph
+
+    def record(self, tweets, row):
+        record = tweets.record(row)
+        record['created'] = tweet_store.hour_of(int(tweets.created[row])) + dt.timedelta(seconds=int(tweets.created[row]) % 3600)
+        record['hashtags'] = list(tweets.hashtags[row])
+        return record
+
+    ENDPOINTS = {
+        '/status' : status,
+        '/days' : days,
+        '/tweets' : tweets_query,
+        '/top' : top,
+        '/graph' : graph_query,
+        '/plot' : plot
+    }
+
+# Moments of days, buckets of 'resolution' hours or rolling window of 'window' hours (see tweet_analyzer.bucket_statistics)
+def bucket_moments(store, excludeNeutralTweets, resolution=None, window=None):
+    if window is not None:
+        return store.rolling(excludeNeutralTweets, window, resolution or 1)
+    if resolution is not None and resolution != 24:
+        return store.buckets(excludeNeutralTweets, resolution)
+    return store.days(excludeNeutralTweets)
+
+def integer(parameters, name, default=None, minimum=1):
+    if name not in parameters:
+        return default
+    value = int(parameters[name])
+    if value < minimum:
+        raise ValueError("'" + name + "' must be at least " + str(minimum))
+    return value
+
+class RequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        parameters = {name : values[-1] for name, values in parse_qs(url.query).items()}
+        path = url.path.rstrip('/') or '/'
+        if path not in QueryService.ENDPOINTS:
+            return self.answer(404, {'error' : "unknown path " + url.path, 'paths' : list(QueryService.ENDPOINTS)}, start)
+        try:
+            contentType, body, cached = self.server.service.query(path, parameters)
+        except ValueError as e:
+            return self.answer(400, {'error' : str(e)}, start)
+        except Exception as e:
+            return self.failed(e, start)
+        self.send(200, contentType, body, start, "hit" if cached else "miss")
+
+    def do_POST(self):
+        start = time.perf_counter()
+        if urlsplit(self.path).path.rstrip('/') != '/refresh':
+            return self.answer(404, {'error' : "unknown path " + self.path}, start)
+        try:
+            changed = self.server.service.request_refresh()
+        except Exception as e:
+            return self.failed(e, start)
+        self.answer(200, {'changed' : changed, 'generation' : self.server.service.generation}, start)
+
+    def answer(self, code, content, start):
+        self.send(code, "application/json", json.dumps(content).encode(), start)
+
+    # Any other error is a bug: it's printed, and answered as such, instead of leaving the client without an answer
+    def failed(self, error, start):
+        traceback.print_exception(type(error), error, error.__traceback__)
+        self.answer(500, {'error' : type(error).__name__ + ": " + str(error)}, start)
+
+    def send(self, code, contentType, body, start, cache="none"):
+        self.send_response(code)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Cache", cache)
+        self.end_headers()
+        self.wfile.write(body)
+        print(OKCYAN + self.command + " " + self.path + " " + str(code) + " (" + str(round((time.perf_counter() - start) * 1000, 2)) + " ms, cache " + cache + ")" + ENDC)
+
+    # Requests are printed by send, with their time
+    def log_request(self, code='-', size='-'):
+        pass
+
+"""
+    Serves 'service' on 'host':'port' until interrupted (Ctrl+C), checking new files every 'poll' seconds (0 never, new files are read only by POST /refresh)
+
+        Requests are served by a thread each, while new files are read by the main thread only (ingestion may start pools of processes): POST /refresh asks it to read them and waits (see QueryService.refresh_loop)
+"""
+def serve(service, host=HOST, port=PORT, poll=POLL_INTERVAL):
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(OKGREEN + "Serving " + str(len(service.tweets)) + " tweets on http://" + host + ":" + str(server.server_address[1]) + " (Ctrl+C to stop)" + ENDC)
+
+    try:
+        service.refresh_loop(poll)
+    except KeyboardInterrupt:
+        print(WARNING + "Stopping the query service" + ENDC)
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,249 @@
+"""
+rate_limiter.py contains the rate limiter used by tweet_fetcher.py to pace requests to Twitter API
+
+The limiter doesn't depend on tweepy: it works with any function performing a request, and with the headers of its responses, so it can be used (and tested) against any search endpoint, even a local fake one.
+"""
+
+import time
+import threading
+
+# Color ASCII used to change color of prints
+WARNING = '\033[93m'
+ENDC = '\033[0m' # De-select the current color
+
+# Requests allowed to search/tweets endpoint in each window, with user authentication (https://developer.twitter.com/en/docs/twitter-api/v1/rate-limits)
+SEARCH_LIMIT = 180
+# Requests allowed to statuses/lookup endpoint (100 tweets each) in each window
+LOOKUP_LIMIT = 900
+WINDOW = 15 * 60
+
+# Backoff after a "Too Many Requests" (429) response without rate limit headers: BACKOFF_BASE seconds, doubled at each consecutive error (at most a whole window)
+BACKOFF_BASE = 5
+
+# Raised by RateLimiter.acquire once the limiter is stopped
+class Stopped(Exception):
+    pass
+
+"""
+    Token bucket limiting requests (not tweets: each request returns a page of up to 100 tweets)
+
+        Without information from the API, the bucket holds up to 'limit' tokens, refilled at a rate of 'limit' tokens every 'window' seconds, so requests are spread over the window.
+        Every response updates the bucket with its rate limit headers:
+            'x-rate-limit-limit' is the number of requests allowed in the window (capacity of the bucket)
+            'x-rate-limit-remaining' is the number of requests still allowed, which becomes the number of tokens available
+            'x-rate-limit-reset' is the (epoch) time in which the window resets, refilling the bucket completely
+        So requests are made as soon as the quota allows, waiting only when it's exhausted, until its reset.
+
+        A "Too Many Requests" response empties the bucket and waits until the reset (if known), or with an exponential backoff.
+
+        The limiter can be shared by several threads: the bucket is protected by a lock (held while waiting, so every thread waits for the same reset), and responses arriving out of order can only lower the tokens available in the same window.
+
+        Waits last until the reset of the window (up to 15 minutes), so they're made on the 'stopped' event: stop interrupts every wait, and any following acquire raises Stopped (i.e. threads of an interrupted download quit at once).
+
+        'clock', 'wallclock' and 'sleep' can be replaced (i.e. to simulate time), while 'requests', 'waited', 'waits' and 'backoffs' count requests made, seconds spent waiting, number of waits for exhausted quota and number of backoffs after 429 responses
+"""
+class RateLimiter:
+    def __init__(self, limit=SEARCH_LIMIT, window=WINDOW, clock=time.monotonic, wallclock=time.time, sleep=None):
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self.wallclock = wallclock
+        self.stopped = threading.Event()
+        self.sleep = sleep or self.stopped.wait
+
+        self.tokens = float(limit)
+        self.last = clock()
+        # Monotonic time of the reset of the window, known from headers (None if unknown)
+        self.reset_at = None
+        # Epoch time of the reset of the window, as read from the headers
+        self.reset_epoch = None
+        self.failures = 0
+        self.lock = threading.Lock()
+
+        self.requests = 0
+        self.waited = 0.0
+        self.waits = 0
+        self.backoffs = 0
+
+    def refill(self, now):
+        if self.reset_at is not None:
+            # Quota known from the API: tokens come back only when the window resets
+            if now >= self.reset_at:
+                self.tokens = float(self.limit)
+                self.reset_at = None
+        else:
+            self.tokens = min(float(self.limit), self.tokens + (now - self.last) * self.limit / self.window)
+        self.last = now
+
+    def wait(self, seconds):
+        if seconds > 0:
+            self.sleep(seconds)
+            self.waited += seconds
+
+    # Interrupts the waits of every thread: no request is granted any more
+    def stop(self):
+        self.stopped.set()
+
+    """
+        Waits (if needed) until a request can be made, and consumes a token, raising Stopped if the limiter is stopped
+    """
+    def acquire(self):
+        with self.lock:
+            while True:
+                if self.stopped.is_set():
+                    raise Stopped("Rate limiter stopped")
+                now = self.clock()
+                self.refill(now)
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.requests += 1
+                    return
+
+                if self.reset_at is not None:
+                    seconds = self.reset_at - now
+                else:
+                    seconds = (1 - self.tokens) * self.window / self.limit
+                self.waits += 1
+                print(WARNING + "Rate limit reached, waiting " + str(round(seconds)) + " seconds..." + ENDC)
+                self.wait(seconds)
+
+    """
+        Updates the bucket with rate limit headers of the last response (missing headers are ignored)
+    """
+    def update(self, headers):
+        limit = headers.get('x-rate-limit-limit')
+        remaining = headers.get('x-rate-limit-remaining')
+        reset = headers.get('x-rate-limit-reset')
+
+        with self.lock:
+            self.failures = 0
+            if limit is not None:
+                self.limit = int(limit)
+            if remaining is not None and reset is not None:
+                now = self.clock()
+                if int(reset) == self.reset_epoch and self.reset_at is not None:
+                    # Same window: other requests may have been made after this one
+                    self.tokens = min(self.tokens, float(int(remaining)))
+                else:
+                    self.tokens = float(int(remaining))
+                    self.reset_epoch = int(reset)
+                    self.reset_at = now + max(int(reset) - self.wallclock(), 0) + 1
+                self.last = now
+
+    """
+        Handles a "Too Many Requests" response: the bucket is emptied and the next request waits until the reset of the window (from 'headers', if available) or for an exponential backoff
+    """
+    def backoff(self, headers=None):
+        reset = (headers or {}).get('x-rate-limit-reset')
+
+        with self.lock:
+            now = self.clock()
+            self.backoffs += 1
+            self.tokens = 0.0
+            self.last = now
+
+            if reset is not None:
+                self.reset_epoch = int(reset)
+                self.reset_at = now + max(int(reset) - self.wallclock(), 0) + 1
+            else:
+                self.reset_epoch = None
+                self.reset_at = now + min(BACKOFF_BASE * pow(2, self.failures), self.window)
+            self.failures += 1
+
+"""
+    Performs a request through the limiter, returning its result
+
+        'call' performs the request
+        'last_headers' returns the headers of the last response
+        'rate_limit_headers' receives an exception raised by 'call' and returns the headers of its response if it's a rate limit error (429), None otherwise (the exception is raised again)
+
+        After a rate limit error, the request is made again
+"""
+def request(limiter, call, last_headers, rate_limit_headers):
+    while True:
+        limiter.acquire()
+        try:
+            result = call()
+        except StopIteration:
+            raise
+        except Exception as e:
+            headers = rate_limit_headers(e)
+            if headers is None:
+                raise
+            limiter.backoff(headers)
+            continue
+
+        limiter.update(last_headers())
+        return result
+
+"""
+    Generator of pages of results, making a request (see 'request') for each page: 'next_page' returns the next page of results, raising StopIteration when there are no more pages
+"""
+def paginate(limiter, next_page, last_headers, rate_limit_headers):
+    while True:
+        try:
+            page = request(limiter, next_page, last_headers, rate_limit_headers)
+        except StopIteration:
+            return
+        yield page
+
+"""
+    Rate limiter shared by several clients (i.e. the queries of a batch), each one possibly using many threads
+
+        Requests are granted in turn: among the clients waiting for the limiter, the one with fewest requests granted goes first, so that each client gets a fair share of the quota, whatever the number of its threads.
+        A client waiting alone gets every token available (the quota is never left unused), while a new client starts from the share of the clients already waiting, instead of catching up with every request made before it.
+        'granted' counts the requests granted to each client
+"""
+class FairShareLimiter(RateLimiter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.condition = threading.Condition()
+        self.granted = {}
+        self.waiting = {}
+        self.acquiring = False
+
+    def turn(self):
+        return min(self.granted[client] for client, waiting in self.waiting.items() if waiting)
+
+    def acquire(self, client=None):
+        if client is None:
+            return super().acquire()
+
+        with self.condition:
+            if client not in self.granted:
+                self.granted[client] = self.turn() if any(self.waiting.values()) else 0
+            self.waiting[client] = self.waiting.get(client, 0) + 1
+
+            while self.acquiring or self.granted[client] > self.turn():
+                self.condition.wait()
+            self.acquiring = True
+            self.waiting[client] -= 1
+
+        try:
+            super().acquire()
+        finally:
+            with self.condition:
+                self.acquiring = False
+                self.granted[client] += 1
+                self.condition.notify_all()
+
+    """
+        Returns a limiter for requests of 'client', usable in 'paginate'
+    """
+    def client(self, client):
+        return ClientLimiter(self, client)
+
+class ClientLimiter:
+    def __init__(self, limiter, client):
+        self.limiter = limiter
+        self.key = client
+
+    def acquire(self):
+        self.limiter.acquire(self.key)
+
+    def update(self, headers):
+        self.limiter.update(headers)
+
+    def backoff(self, headers=None):
+        self.limiter.backoff(headers)
@@ -0,0 +1,207 @@
+"""
+sentiment.py is the toolbox used by tweet_analyzer.py to compute (and remember) the sentiment of tweets, through vaderSentiment analyzer
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+CACHE_FILE = "Cache/sentiment.sqlite"
+
+# Maximum number of scores kept in the cache: when exceeded, least recently used scores are evicted
+MAX_ENTRIES = 5000000
+
+# Number of new scores kept in memory before being written to the database
+FLUSH_EVERY = 10000
+
+# Number of texts scored by a worker in a single task (smaller batches are scored in the calling process, the pool would only add overhead)
+BATCH_SIZE = 2000
+
+# Analyzer of each worker process, built once by 'init_worker'
+worker_analyzer = None
+
+"""
+    Persistent cache of the sentiment of tweets
+
+        VADER is the dominant cost of reading tweets, and every run of tweet_analyzer.py would score again the same tweets (duplicated tweets included).
+        Scores are stored in a SQLite database, with the couple (id_str, hash of full_text) as key: a tweet is scored again only if its text changes.
+        Only 'compound' score is stored, being the only one used by tweet_analyzer.py.
+
+        Parameters:
+            'hits' and 'misses' count, respectively, scores found in the cache and scores that have to be computed
+
+            'pending' holds new scores not yet written to the database (they are visible to 'get' as well, so duplicates in the same run are scored once)
+
+            'used' holds keys of scores read in this run, whose 'last_used' time is updated when the cache is flushed (used for eviction of least recently used scores)
+
+            'max_entries' is the size cap of the cache, enforced when the cache is closed: the number of scores is kept in the 'size' table, updated by triggers on every insert and delete, so it's never counted again
+"""
+class SentimentCache:
+    def __init__(self, path=CACHE_FILE, max_entries=MAX_ENTRIES):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        # Tables and triggers are created together (in a single transaction), the size starting from 0 with the scores
+        if self.connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'scores'").fetchone()[0] == 0:
+            self.connection.executescript("""
+                BEGIN;
+                CREATE TABLE scores (id_str TEXT NOT NULL, text_hash TEXT NOT NULL, compound REAL NOT NULL, last_used INTEGER NOT NULL, PRIMARY KEY (id_str, text_hash)) WITHOUT ROWID;
+                CREATE INDEX scores_last_used ON scores (last_used);
+                CREATE TABLE size (entries INTEGER NOT NULL);
+                INSERT INTO size VALUES (0);
+                CREATE TRIGGER scores_insert AFTER INSERT ON scores BEGIN UPDATE size SET entries = entries + 1; END;
+                CREATE TRIGGER scores_delete AFTER DELETE ON scores BEGIN UPDATE size SET entries = entries - 1; END;
+                COMMIT;
+            """)
+        self.max_entries = max_entries
+        self.now = int(time.time())
+        self.pending = {}
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(id_str, text):
+        return (id_str, hashlib.sha1(text.encode('utf-8')).hexdigest())
+
+    """
+        Returns the cached compound score of the tweet, or None if the tweet has never been scored (with this text)
+    """
+    def get(self, id_str, text):
+        key = self.key(id_str, text)
+
+        if key in self.pending:
+            self.hits += 1
+            return self.pending[key]
+
+        row = self.connection.execute("SELECT compound FROM scores WHERE id_str = ? AND text_hash = ?", key).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.used.add(key)
+        return row[0]
+
+    def put(self, id_str, text, compound):
+        self.pending[self.key(id_str, text)] = compound
+
+        if len(self.pending) >= FLUSH_EVERY:
+            self.flush()
+
+    """
+        Records scores looked up (or computed) by another process, i.e. by the workers of ingest.py, given their keys
+    """
+    def add_hits(self, keys):
+        self.hits += len(keys)
+        self.used.update(keys)
+
+    def add_scores(self, scores):
+        self.misses += len(scores)
+        for key, compound in scores:
+            self.pending[key] = compound
+
+        if len(self.pending) >= FLUSH_EVERY:
+            self.flush()
+
+    # Scores already stored are updated in place (not replaced, which would add them to the size without removing them)
+    def flush(self):
+        with self.connection:
+            self.connection.executemany("INSERT INTO scores VALUES (?, ?, ?, ?) ON CONFLICT (id_str, text_hash) DO UPDATE SET compound = excluded.compound, last_used = excluded.last_used", [(key[0], key[1], compound, self.now) for key, compound in self.pending.items()])
+            self.connection.executemany("UPDATE scores SET last_used = ? WHERE id_str = ? AND text_hash = ?", [(self.now, key[0], key[1]) for key in self.used])
+        self.pending = {}
+        self.used = set()
+
+    """
+        Evicts least recently used scores exceeding 'max_entries'
+    """
+    def evict(self):
+        size = self.size()
+
+        if size > self.max_entries:
+            with self.connection:
+                self.connection.execute("DELETE FROM scores WHERE (id_str, text_hash) IN (SELECT id_str, text_hash FROM scores ORDER BY last_used ASC LIMIT ?)", (size - self.max_entries,))
+
+    # Number of scores stored (pending ones excluded)
+    def size(self):
+        return self.connection.execute("SELECT entries FROM size").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self.evict()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+"""
+    PARALLEL SCORING
+
+        Texts are split in chunks of 'batch_size' elements, scored by a pool of 'workers' processes (each one with its own analyzer, built once when the process starts).
+        Executor.map returns results in the same order of the chunks, so scores are identical (and in the same order) to the ones of the serial path, whatever the number of workers.
+        'workers' equal to None uses every available core, while 1 (or few texts to score) scores texts in the calling process.
+        score_texts starts a pool for a single list of texts, while a Scorer keeps it for many lists.
+"""
+# vaderSentiment is imported only when a tweet has to be scored (its import costs more than everything else needed by statistics)
+def analyzer():
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+def init_worker():
+    global worker_analyzer
+    worker_analyzer = analyzer()
+
+def score_batch(texts):
+    return [worker_analyzer.polarity_scores(text)['compound'] for text in texts]
+
+"""
+    Scorer of texts, reusing the same analyzer (and pool of workers) for every call of 'score', i.e. for every batch of chunked mode: the pool is started by the first call needing it, and shut down when the scorer is closed
+"""
+class Scorer:
+    def __init__(self, workers=None, batch_size=BATCH_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.vader = None
+        self.executor = None
+
+    def score(self, texts):
+        if not texts:
+            return []
+
+        if self.workers <= 1 or len(texts) <= self.batch_size:
+            if self.vader is None:
+                self.vader = analyzer()
+            return [self.vader.polarity_scores(text)['compound'] for text in texts]
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker)
+        scores = []
+        for batch_scores in self.executor.map(score_batch, [texts[i:i+self.batch_size] for i in range(0, len(texts), self.batch_size)]):
+            scores.extend(batch_scores)
+        return scores
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def score_texts(texts, workers=None, batch_size=BATCH_SIZE):
+    # A fully cached run scores nothing, so it never imports vaderSentiment
+    if not texts:
+        return []
+
+    with Scorer(min(workers or os.cpu_count() or 1, -(-len(texts) // batch_size)), batch_size) as scorer:
+        return scorer.score(texts)
@@ -0,0 +1,87 @@
+"""
+Test of the quote graph of graph_index.py: a node for each tweet (collected or only quoted), degrees in both directions, connected components (compared to a breadth-first search) and spells of the days each tweet appears in
+"""
+
+import random
+import datetime as dt
+
+import graph_index
+import tweet_store
+
+# Mon Feb 15 2021 and the next days, at noon (UTC)
+DAY = 1613390400
+FIRST = dt.date(2021, 2, 15)
+
+def store(tweets):
+    result = tweet_store.TweetStore()
+    for id, created, username, quote in tweets:
+        result.add(id, created, username, "text of " + id, 0, 0, 0.5, (), quote)
+    return result
+
+def example():
+    return store([("1", DAY, "a", None), ("2", DAY, "b", ("1", "a", "text of 1")), ("3", DAY, "c", ("1", "a", "text of 1")),
+                  ("4", DAY, "d", ("99", "q", "only quoted")), ("5", DAY + 2 * 86400, "e", ("4", "d", "text of 4")), ("6", DAY, "f", None)])
+
+def test_nodes_and_degrees():
+    graph = graph_index.QuoteGraph(example())
+    assert len(graph) == 7
+    only = graph.index["99"]
+    assert only == 6 and not graph.is_collected(only) and graph.is_collected(graph.index["5"])
+    assert (graph.username(only), graph.full_text(only)) == ("q", "only quoted")
+    assert (graph.username(graph.index["2"]), graph.full_text(graph.index["2"])) == ("b", "text of 2")
+
+    assert graph.in_degree.tolist() == [2, 0, 0, 1, 0, 0, 1]
+    assert graph.out_degree.tolist() == [0, 1, 1, 1, 1, 0, 0]
+    assert sorted(graph.quoters(graph.index["1"]).tolist()) == [graph.index["2"], graph.index["3"]]
+    assert graph.quoted(graph.index["4"]).tolist() == [only]
+    assert graph.top_quoted(2) == [graph.index["1"], graph.index["4"]]
+    assert graph.top_quoted() == [graph.index["1"], graph.index["4"], only]
+
+def test_components_and_spells():
+    graph = graph_index.QuoteGraph(example())
+    assert graph.component_sizes().tolist() == [3, 3, 1]
+    labels = graph.components()
+    assert labels[graph.index["5"]] == labels[graph.index["99"]] == graph.index["4"]
+
+    spells = graph.spells()
+    # Created on the first day, quoted on the third one
+    assert spells[graph.index["4"]] == [(FIRST, FIRST), (FIRST + dt.timedelta(2), FIRST + dt.timedelta(2))]
+    assert spells[graph.index["1"]] == [(FIRST, FIRST)]
+    assert spells[graph.index["99"]] == [(FIRST, FIRST)]
+
+# A quote replaced by a tweet without it is no longer a link
+def test_quote_removed():
+    tweets = example()
+    tweets.add("2", DAY, "b", "text of 2", 0, 0, 0.5)
+    graph = graph_index.QuoteGraph(tweets)
+    assert graph.in_degree[graph.index["1"]] == 1
+
+def bfs_components(n, links):
+    neighbours = [[] for _ in range(n)]
+    for source, target in links:
+        neighbours[source].append(target)
+        neighbours[target].append(source)
+    labels = [None] * n
+    for node in range(n):
+        if labels[node] is None:
+            labels[node] = node
+            queue = [node]
+            while queue:
+                for other in neighbours[queue.pop()]:
+                    if labels[other] is None:
+                        labels[other] = node
+                        queue.append(other)
+    return labels
+
+# Long chains (quoting in both directions) need several rounds of hooking and pointer jumping
+def test_components_match_bfs():
+    random.seed(1)
+    n = 300
+    quotes = {i : random.choice([None, None, random.randrange(n + 50)]) for i in range(n)}
+    quotes.update({i : i + 1 for i in range(100, 160)})
+    quotes.update({i : i - 1 for i in range(200, 240)})
+    tweets = store([(str(i), DAY + (i % 3) * 86400, "user", None if quotes[i] is None or quotes[i] == i else (str(quotes[i]), "user", "")) for i in range(n)])
+
+    graph = graph_index.QuoteGraph(tweets)
+    assert graph.components().tolist() == bfs_components(len(graph), zip(graph.sources.tolist(), graph.targets.tolist()))
+    assert graph.component_sizes().sum() == len(graph)
@@ -0,0 +1,79 @@
+"""
+Test of the parallel reading of ingest.py: shards of RAW and JSON Lines files (tweet_io.shards) hold whole tweets and cover the file exactly, and tweets parsed by the pool are the same (in the same order) of a serial reading, scored as by the sentiment cache
+"""
+
+import json
+
+import pytest
+
+import ingest
+import sentiment
+import tweet_io
+
+def status(id):
+    return {'id_str' : str(id), 'created_at' : "Sat Feb 20 12:00:00 +0000 2021", 'full_text' : "what a good day {\n} " * (id % 5 + 1), 'user' : {'name' : "user" + str(id)},
+            'retweet_count' : id, 'favorite_count' : 0, 'entities' : {'hashtags' : [{'text' : "tag"}]}, 'is_quote_status' : False}
+
+TWEETS = [status(id) for id in range(60)]
+
+def write(path, tweets=TWEETS):
+    with tweet_io.TweetWriter(path) as writer:
+        for tweet in tweets:
+            writer.write(tweet)
+    return path
+
+@pytest.mark.parametrize("extension", [".json", ".jsonl"])
+@pytest.mark.parametrize("shard_size", [1, 300, 5000, 1 << 20])
+def test_shards_cover_the_file(tmp_path, extension, shard_size):
+    path = write(str(tmp_path / ("(RAW) test" + extension)))
+    shards = tweet_io.shards(path, shard_size)
+
+    assert shards[0][0] == 0
+    assert shards[-1][1] == len(open(path, "rb").read())
+    assert all(end == start for (_, end), (start, _) in zip(shards, shards[1:]))
+    if shard_size == 1:
+        assert len(shards) == len(TWEETS)
+    assert [tweet for start, end in shards for tweet in tweet_io.read_shard(path, start, end)] == TWEETS
+
+def test_files_not_split(tmp_path):
+    assert tweet_io.shards(write(str(tmp_path / "(RAW) test.jsonl.gz")), 100) is None
+    assert tweet_io.shards(write(str(tmp_path / "(RAW) empty.json"), []), 100) == []
+
+    # Without new lines there is no boundary to find
+    path = str(tmp_path / "(RAW) compact.json")
+    with open(path, "w") as f:
+        f.write("".join(json.dumps(tweet) for tweet in TWEETS))
+    assert tweet_io.shards(path, 100) == [(0, len(open(path, "rb").read()))]
+
+def test_plan(tmp_path, monkeypatch):
+    raw = write(str(tmp_path / "(RAW) a.json"))
+    compressed = write(str(tmp_path / "(RAW) b.jsonl.gz"))
+    jsonl = write(str(tmp_path / "(RAW) c.jsonl"))
+
+    # Too few bytes, or a single worker
+    assert ingest.plan([raw, compressed, jsonl], 4, 1000) == {}
+    monkeypatch.setattr(ingest, 'PARALLEL_MIN_SIZE', 1000)
+    assert ingest.plan([raw, compressed, jsonl], 1, 1000) == {}
+
+    planned = ingest.plan([raw, compressed, jsonl], 4, 1000)
+    assert list(planned) == [raw, jsonl]
+    assert planned[raw] == tweet_io.shards(raw, 1000)
+
+def test_parse_shards_match_serial_reading(tmp_path):
+    path = write(str(tmp_path / "(RAW) test.json"))
+    cachePath = str(tmp_path / "sentiment.sqlite")
+    with sentiment.SentimentCache(cachePath) as cache:
+        cache.put(TWEETS[0]['id_str'], TWEETS[0]['full_text'], 0.25)
+
+    tasks = [(path, start, end) for start, end in tweet_io.shards(path, 1000)]
+    assert len(tasks) > 2
+    results = list(ingest.parse_shards(tasks, 2, cachePath))
+    assert len(results) == len(tasks)
+
+    records = [record for records, _, _ in results for record in records]
+    assert [record[:8] for record in records] == [ingest.clean_tweet(tweet) for tweet in TWEETS]
+    # The cached score is used, every other tweet is scored by the workers
+    assert records[0][8] == 0.25
+    assert [record[8] for record in records[1:]] == sentiment.score_texts([tweet['full_text'] for tweet in TWEETS[1:]], workers=1)
+    assert sum(len(hits) for _, hits, _ in results) == 1
+    assert sum(len(scored) for _, _, scored in results) == len(TWEETS) - 1
@@ -0,0 +1,80 @@
+"""
+Test of the snapshot of manifest.py: a segment for each file, replaced when the file is read again, lookups of tweets in the indexes of the segments, and tweets rebuilt from the selected files only (the newest file wins, as in a single run)
+"""
+
+import os
+
+import numpy as np
+
+import manifest
+import tweet_store
+
+# Mon Feb 15 2021 and the next day, at noon (UTC)
+DAY = 1613390400
+NEXT_DAY = DAY + 86400
+
+def store(tweets, mtime):
+    result = tweet_store.TweetStore()
+    for id, created, text, retweet_count in tweets:
+        result.add(id, created, "user", text, retweet_count, 0, 0.5, (), None, mtime)
+    return result
+
+def counts(tweets):
+    return {tweets.ids[row] : int(tweets.retweet_count[row]) for row in range(len(tweets))}
+
+def test_selected_files_only(tmp_path):
+    snapshot = manifest.Snapshot(str(tmp_path))
+    snapshot.put("a", store([("1", DAY, "first", 1), ("2", DAY, "second", 2)], 100.0))
+    snapshot.put("b", store([("2", NEXT_DAY, "second again", 20), ("3", NEXT_DAY, "third", 3)], 200.0))
+    snapshot.put("delta", deltas=[("1", 10, 0), ("3", 30, 0)], mtime=300.0)
+    snapshot.save(["a", "b", "delta"])
+
+    snapshot = manifest.Snapshot(str(tmp_path))
+    assert snapshot.selected == ["a", "b", "delta"]
+    # Tweet 2 is the one of the newest file, counts are refreshed by the delta file
+    assert counts(snapshot.tweets(["a", "b", "delta"])) == {"1" : 10, "2" : 20, "3" : 30}
+    # Files not selected don't count
+    assert counts(snapshot.tweets(["a"])) == {"1" : 1, "2" : 2}
+    assert counts(snapshot.tweets(["a", "delta"])) == {"1" : 10, "2" : 2}
+    only = snapshot.tweets(["b"])
+    assert counts(only) == {"2" : 20, "3" : 3}
+    assert only.day[only.index["2"]] == tweet_store.day_of(NEXT_DAY)
+
+# A tweet is read from the newest file even if files are given out of order
+def test_older_file_never_wins(tmp_path):
+    snapshot = manifest.Snapshot(str(tmp_path))
+    snapshot.put("new", store([("1", DAY, "new", 5)], 200.0))
+    snapshot.put("old", store([("1", DAY, "old", 1)], 100.0))
+    assert counts(snapshot.tweets(["new", "old"])) == {"1" : 5}
+
+# Only the segments holding the tweets looked up are loaded
+def test_lookup_in_indexes(tmp_path):
+    snapshot = manifest.Snapshot(str(tmp_path))
+    snapshot.put("a", store([("10", DAY, "a", 1), ("2", DAY, "b", 2)], 100.0))
+    snapshot.put("b", store([("3", DAY, "c", 3)], 200.0))
+    snapshot.save(["a", "b"])
+
+    snapshot = manifest.Snapshot(str(tmp_path))
+    assert list(snapshot.ids(["a", "b"])) == ["10", "2", "3"]
+    assert list(snapshot.rows(snapshot.segments["a"], np.array(["10", "3", "4"]))) == [0]
+
+    found = snapshot.tweets(["a", "b"], np.array(["3"]))
+    assert counts(found) == {"3" : 3}
+    assert list(snapshot.stores) == [snapshot.segments["b"]]
+
+# A file read again replaces its segment, whose files are removed when the snapshot is saved
+def test_segment_replaced(tmp_path):
+    snapshot = manifest.Snapshot(str(tmp_path))
+    snapshot.put("a", store([("1", DAY, "first", 1)], 100.0))
+    snapshot.save(["a"])
+    old = snapshot.segments["a"]
+
+    snapshot = manifest.Snapshot(str(tmp_path))
+    snapshot.put("a", store([("1", DAY, "first", 4), ("2", DAY, "appended", 2)], 150.0))
+    snapshot.save(["a"])
+    assert not os.path.exists(os.path.join(str(tmp_path), old + ".pickle"))
+    assert not os.path.exists(os.path.join(str(tmp_path), old + ".npz"))
+
+    snapshot = manifest.Snapshot(str(tmp_path))
+    assert counts(snapshot.tweets(["a"])) == {"1" : 4, "2" : 2}
+    assert sorted(name for name in os.listdir(str(tmp_path)) if name.startswith("segment-")) == [snapshot.segments["a"] + ".npz", snapshot.segments["a"] + ".pickle"]
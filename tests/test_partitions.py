@@ -0,0 +1,73 @@
+"""
+Test of the per-day partitions of the chunked mode (partitions.py): items appended by several batches are merged as in tweet_store.TweetStore (the newest file wins, refreshed counts apply only to tweets read from older files), and the manifest of the files spilled
+"""
+
+import os
+import datetime as dt
+
+import aggregates
+import manifest
+import partitions
+import tweet_store
+
+# Mon Feb 15 2021 and the next day, at noon (UTC)
+DAY = 1613390400
+NEXT_DAY = DAY + 86400
+
+def tweet(id, created, text, retweet_count, mtime):
+    return (id, created, "user", text, retweet_count, 0, ("tag",), None, 0.5, mtime)
+
+def spill(writer, items):
+    for item in items:
+        writer.add(tweet_store.day_of(item[1]) if len(item) == 10 else tweet_store.day_of(DAY), item)
+    writer.flush()
+
+def test_batches_are_merged(tmp_path):
+    writer = partitions.PartitionWriter(str(tmp_path))
+    spill(writer, [tweet("1", DAY, "first", 1, 100.0), tweet("2", DAY, "second", 2, 100.0), tweet("3", NEXT_DAY, "third", 3, 100.0)])
+    # A newer file, then a delta file older than it and one newer than the first file
+    spill(writer, [tweet("2", DAY, "second again", 20, 200.0)])
+    spill(writer, [("2", 5, 5, 150.0), ("1", 10, 0, 150.0)])
+
+    days = partitions.days(str(tmp_path))
+    assert [day for day, _ in days] == [dt.date(2021, 2, 15), dt.date(2021, 2, 16)]
+
+    records = partitions.read_day(days[0][1])
+    assert [record['id_str'] for record in records] == ["1", "2"]
+    assert (records[0]['full_text'], records[0]['retweet_count'], records[0]['sharing']) == ("first", 10, 11)
+    assert (records[1]['full_text'], records[1]['retweet_count']) == ("second again", 20)
+    assert [record['id_str'] for record in partitions.read_day(days[1][1])] == ["3"]
+
+def test_manifest_and_clear(tmp_path, monkeypatch):
+    path = str(tmp_path / "manifest.pickle")
+    raw = tmp_path / "(RAW) file.jsonl"
+    raw.write_text("{}\n")
+    spill(partitions.PartitionWriter(str(tmp_path)), [tweet("1", DAY, "first", 1, 100.0)])
+
+    ingested = partitions.load_manifest(path)
+    ingested.record(str(raw), 1)
+    partitions.save_manifest(ingested, path)
+    assert partitions.load_manifest(path).status(str(raw)) == 'unchanged'
+
+    assert partitions.clear(path).entries == {}
+    assert partitions.days(str(tmp_path)) == []
+    assert not os.path.exists(path)
+
+    # Partitions of another version are removed when the manifest is loaded
+    spill(partitions.PartitionWriter(str(tmp_path)), [tweet("1", DAY, "first", 1, 100.0)])
+    partitions.save_manifest(ingested, path)
+    monkeypatch.setattr(manifest, 'SNAPSHOT_VERSION', manifest.SNAPSHOT_VERSION + 1)
+    assert partitions.load_manifest(path).entries == {}
+    assert partitions.days(str(tmp_path)) == []
+
+# Tweets aggregated keep the modification time of their file: an older version is ignored, unless it replaces the newer one
+def test_aggregates_keep_mtime(tmp_path):
+    hour = tweet_store.hour_of(DAY)
+    with aggregates.AggregateStore(str(tmp_path / "aggregates.sqlite")) as store:
+        assert store.update([("1", dt.date(2021, 2, 15), 0.5, 3, (), hour, 200.0)]) == ["1"]
+        assert store.update([("1", dt.date(2021, 2, 15), 0.5, 9, (), hour, 100.0)]) == []
+        assert store.connection.execute("SELECT sharing, mtime FROM tweets").fetchall() == [(3, 200.0)]
+
+        assert store.update([("1", dt.date(2021, 2, 15), 0.5, 9, (), hour, 100.0)], replace=True) == ["1"]
+        assert store.connection.execute("SELECT sharing, mtime FROM tweets").fetchall() == [(9, 100.0)]
+        assert store.days(False)[dt.date(2021, 2, 15)].n == 1
@@ -0,0 +1,69 @@
+"""
+Test of the stages of pipeline.py: a stage is executed only if its inputs changed, its outputs are restored from the artifacts when missing or modified, and outputs not stored (store=False) are only checked
+"""
+
+import os
+
+import pipeline
+
+def write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+class Stage:
+    def __init__(self, path, text):
+        self.path = path
+        self.text = text
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        write(self.path, self.text)
+        print("\"" + self.path + "\" created")
+
+def new_pipeline(tmp_path):
+    return pipeline.Pipeline(str(tmp_path / "Artifacts"), str(tmp_path / "pipeline.json"))
+
+def test_skip_and_restore(tmp_path):
+    path = str(tmp_path / "plot.png")
+    stage = Stage(path, "first")
+    assert new_pipeline(tmp_path).run('plot', {'flag' : False}, stage, [path], replay=True)
+    assert len(os.listdir(str(tmp_path / "Artifacts"))) == 1
+
+    # Same inputs: skipped (the index is reloaded), the log replayed
+    stages = new_pipeline(tmp_path)
+    assert not stages.run('plot', {'flag' : False}, stage, [path], replay=True)
+    assert stage.calls == 1 and stages.skipped == ['plot']
+    assert stages.log == "\"" + path + "\" already up to date\n"
+
+    # Missing or modified outputs are restored
+    os.remove(path)
+    assert not stages.run('plot', {'flag' : False}, stage, [path], replay=True)
+    assert stages.restored == [path] and open(path).read() == "first"
+    assert stages.log == "\"" + path + "\" restored from the artifact cache\n"
+    write(path, "changed")
+    assert not stages.run('plot', {'flag' : False}, stage, [path])
+    assert open(path).read() == "first"
+
+    # Other inputs execute the stage, toggling them back restores the first run
+    stage.text = "second"
+    assert stages.run('plot', {'flag' : True}, stage, [path])
+    assert not stages.run('plot', {'flag' : False}, stage, [path])
+    assert stage.calls == 2 and open(path).read() == "first"
+
+    assert new_pipeline(tmp_path).run('plot', {'flag' : False}, stage, [path]) is False
+    stages = pipeline.Pipeline(str(tmp_path / "Artifacts"), str(tmp_path / "pipeline.json"), force=True)
+    assert stages.run('plot', {'flag' : False}, stage, [path])
+
+def test_outputs_not_stored(tmp_path):
+    path = str(tmp_path / "GEXF_test.gexf")
+    stage = Stage(path, "<gexf/>")
+    stages = new_pipeline(tmp_path)
+    assert stages.run('graph_creation', {}, stage, [str(tmp_path / "GEXF_*.gexf")], store=False)
+    assert not os.path.exists(str(tmp_path / "Artifacts"))
+
+    assert not stages.run('graph_creation', {}, stage, [str(tmp_path / "GEXF_*.gexf")], store=False)
+    # Missing outputs can't be restored, so the stage is executed again
+    os.remove(path)
+    assert stages.run('graph_creation', {}, stage, [str(tmp_path / "GEXF_*.gexf")], store=False)
+    assert stage.calls == 2 and os.path.exists(path)
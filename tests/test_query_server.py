@@ -0,0 +1,132 @@
+"""
+Test of the routes of query_server.py over HTTP: answers and cache, errors (404 unknown paths, 400 invalid parameters, 500 anything else), and refreshes run by the ingestion thread only, while queries of the aggregates wait for them
+"""
+
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import query_server
+import tweet_store
+
+# Mon Feb 15 2021, at noon (UTC)
+DAY = 1613390400
+
+def store(n):
+    tweets = tweet_store.TweetStore()
+    for i in range(n):
+        tweets.add(str(i), DAY + i, "user" + str(i % 2), "text " + str(i), i, 0, 0.5, ("tag",))
+    return tweets
+
+"""
+    Serves 'service' on a free port, returning a function that sends a request and returns (status, headers, body as JSON)
+"""
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    servers = []
+
+    def start(service):
+        httpd = query_server.ThreadingHTTPServer(("127.0.0.1", 0), query_server.RequestHandler)
+        httpd.daemon_threads = True
+        httpd.service = service
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+
+        def request(path, method="GET"):
+            url = "http://127.0.0.1:" + str(httpd.server_address[1]) + path
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, method=method, data=b"" if method == "POST" else None), timeout=10) as response:
+                    return response.status, response.headers, json.loads(response.read())
+            except urllib.error.HTTPError as e:
+                return e.code, e.headers, json.loads(e.read())
+        return request
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+def test_routes(server):
+    request = server(query_server.QueryService(store(5)))
+    status, headers, body = request("/tweets?user=user0")
+    assert status == 200 and headers['X-Cache'] == "miss"
+    assert [tweet['id_str'] for tweet in body['tweets']] == ["0", "2", "4"]
+    assert request("/tweets?user=user0")[1]['X-Cache'] == "hit"
+    assert request("/status/")[2]['tweets'] == 5
+    status, _, body = request("/days")
+    assert status == 200 and body == []
+
+    status, _, body = request("/unknown")
+    assert status == 404 and "/tweets" in body['paths']
+    assert request("/refresh")[0] == 404
+    assert request("/status", method="POST")[0] == 404
+
+    assert request("/top?n=0")[0] == 400
+    assert request("/tweets?day=yesterday")[0] == 400
+    assert request("/graph")[2] == {'error' : "missing 'day'"}
+
+# A bug is answered with an error, not hidden as an unknown path, and the server keeps serving
+def test_unexpected_errors(server, monkeypatch):
+    def broken(service, parameters):
+        return {}['missing']
+    monkeypatch.setitem(query_server.QueryService.ENDPOINTS, '/top', broken)
+    request = server(query_server.QueryService(store(5)))
+    status, _, body = request("/top")
+    assert status == 500 and body['error'].startswith("KeyError")
+    assert request("/status")[0] == 200
+
+def test_refresh_on_the_ingestion_thread(server):
+    started = threading.Event()
+    release = threading.Event()
+    threads = []
+
+    def refresh():
+        threads.append(threading.current_thread())
+        started.set()
+        release.wait(10)
+        return store(7), True
+
+    service = query_server.QueryService(store(5), refresh)
+    request = server(service)
+    stopped = threading.Event()
+    loop = threading.Thread(target=service.refresh_loop, args=(0, stopped), daemon=True)
+    loop.start()
+
+    answers = {}
+    refreshing = threading.Thread(target=lambda: answers.update(refresh=request("/refresh", method="POST")))
+    refreshing.start()
+    assert started.wait(10)
+    # Aggregates are being written: a query reading them waits, the others are answered
+    querying = threading.Thread(target=lambda: answers.update(days=request("/days")))
+    querying.start()
+    assert request("/status")[2]['tweets'] == 5
+    querying.join(0.2)
+    assert querying.is_alive()
+
+    release.set()
+    refreshing.join(10)
+    querying.join(10)
+    assert answers['refresh'][2] == {'changed' : True, 'generation' : 1}
+    assert answers['days'][0] == 200
+    assert threads == [loop]
+    assert request("/status")[2]['tweets'] == 7
+
+    stopped.set()
+    service.refresh_requested.set()
+    loop.join(10)
+    assert not loop.is_alive()
+
+def test_refresh_failed(server):
+    def refresh():
+        raise OSError("disk full")
+
+    service = query_server.QueryService(store(5), refresh)
+    request = server(service)
+    threading.Thread(target=service.refresh_loop, args=(0,), daemon=True).start()
+    status, _, body = request("/refresh", method="POST")
+    assert status == 500 and body['error'] == "RuntimeError: OSError: disk full"
+    assert request("/status")[2]['tweets'] == 5
@@ -0,0 +1,161 @@
+"""
+Test of rate_limiter.py against a fake search endpoint: time is simulated (the limiter's 'clock', 'wallclock' and 'sleep' are replaced), and the endpoint answers with synthetic 'x-rate-limit-*' headers, or with a "Too Many Requests" error once its quota is exhausted
+"""
+
+import time
+import threading
+
+import pytest
+
+import rate_limiter
+
+EPOCH = 1600000000
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def wallclock(self):
+        return EPOCH + self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class TooManyRequests(Exception):
+    def __init__(self, headers):
+        super().__init__("Too Many Requests")
+        self.headers = headers
+
+"""
+    Search endpoint allowing 'limit' requests in each window of 'window' seconds: every response carries the rate limit headers, and requests over the quota fail with TooManyRequests (with the same headers, if 'headers_on_error')
+"""
+class FakeSearch:
+    def __init__(self, clock, pages, limit=3, window=60, headers_on_error=True):
+        self.clock = clock
+        self.pages = list(pages)
+        self.limit = limit
+        self.window = window
+        self.headers_on_error = headers_on_error
+        self.reset = EPOCH + window
+        self.remaining = limit
+        self.headers = {}
+        self.calls = 0
+        self.rejected = 0
+
+    def rate_limit_headers(self):
+        return {'x-rate-limit-limit': str(self.limit), 'x-rate-limit-remaining': str(self.remaining), 'x-rate-limit-reset': str(self.reset)}
+
+    def next_page(self):
+        self.calls += 1
+        if self.clock.wallclock() >= self.reset:
+            self.reset = int(self.clock.wallclock()) + self.window
+            self.remaining = self.limit
+        if self.remaining == 0:
+            self.rejected += 1
+            raise TooManyRequests(self.rate_limit_headers() if self.headers_on_error else {})
+        self.remaining -= 1
+        self.headers = self.rate_limit_headers()
+        if not self.pages:
+            raise StopIteration
+        return self.pages.pop(0)
+
+    def last_headers(self):
+        return self.headers
+
+def rate_limit_headers(e):
+    return e.headers if isinstance(e, TooManyRequests) else None
+
+def limiter(clock, **kwargs):
+    return rate_limiter.RateLimiter(clock=clock.clock, wallclock=clock.wallclock, sleep=clock.sleep, **kwargs)
+
+def paginate(limiter, search):
+    return list(rate_limiter.paginate(limiter, search.next_page, search.last_headers, rate_limit_headers))
+
+# The quota read from the headers is spent at once, then the limiter waits for the reset of the window, without ever being rejected
+def test_waits_for_reset_from_headers():
+    clock = FakeClock()
+    search = FakeSearch(clock, range(7))
+    rl = limiter(clock)
+
+    assert paginate(rl, search) == list(range(7))
+    assert search.rejected == 0
+    assert rl.backoffs == 0
+    # 8 requests (the last one finds no more pages) in windows of 3
+    assert rl.requests == 8
+    assert rl.waits == 2
+    assert rl.limit == 3
+    # Each wait lasts until the reset (one second of margin)
+    assert clock.sleeps == [61, 61]
+    assert rl.waited == 122
+
+# A request rejected with 429 (i.e. quota spent by another client) waits until the reset in its headers, then it's made again: no page is lost or repeated
+def test_retries_after_too_many_requests():
+    clock = FakeClock()
+    search = FakeSearch(clock, range(5))
+    # Quota already spent elsewhere
+    search.remaining = 0
+    clock.now = 20.0
+    rl = limiter(clock)
+
+    assert paginate(rl, search) == list(range(5))
+    assert search.rejected == 1
+    assert rl.backoffs == 1
+    assert clock.sleeps[0] == pytest.approx(41)
+    assert rl.failures == 0
+
+# Without rate limit headers, consecutive 429 responses are retried with an exponential backoff
+def test_exponential_backoff_without_headers():
+    clock = FakeClock()
+    search = FakeSearch(clock, range(2), limit=1, window=1000, headers_on_error=False)
+    search.remaining = 0
+    rl = limiter(clock, limit=10)
+
+    assert paginate(rl, search) == list(range(2))
+    base = rate_limiter.BACKOFF_BASE
+    assert clock.sleeps[:4] == [base, 2 * base, 4 * base, 8 * base]
+    assert search.rejected >= 4
+    assert rl.backoffs == search.rejected
+
+# Errors other than 429 are raised to the caller
+def test_other_errors_are_raised():
+    clock = FakeClock()
+    rl = limiter(clock)
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        rate_limiter.request(rl, fail, dict, rate_limit_headers)
+    assert rl.backoffs == 0
+
+# A thread waiting for the reset of the window (with the real clock) quits as soon as the limiter is stopped, as well as the threads waiting for their turn
+def test_stop_interrupts_waits():
+    rl = rate_limiter.FairShareLimiter(limit=1, window=900)
+    rl.acquire("a")
+    errors = []
+
+    def acquire(client):
+        try:
+            rl.acquire(client)
+        except rate_limiter.Stopped as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=acquire, args=(client,)) for client in ("a", "b", "b")]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    assert all(thread.is_alive() for thread in threads)
+
+    start = time.monotonic()
+    rl.stop()
+    for thread in threads:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in threads)
+    assert time.monotonic() - start < 5
+    assert len(errors) == 3
+    assert rl.requests == 1
@@ -0,0 +1,81 @@
+"""
+Test of the persistent cache of sentiment scores (sentiment.SentimentCache): lookups, persistence across runs, size kept by triggers and eviction of the least recently used scores
+"""
+
+import sqlite3
+
+import sentiment
+
+def rows(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+    finally:
+        connection.close()
+
+def test_scores_are_kept_across_runs(tmp_path):
+    path = str(tmp_path / "sentiment.sqlite")
+    with sentiment.SentimentCache(path) as cache:
+        assert cache.get("1", "a text") is None
+        cache.put("1", "a text", 0.5)
+        # Pending scores are visible before being written
+        assert cache.get("1", "a text") == 0.5
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    with sentiment.SentimentCache(path) as cache:
+        assert cache.get("1", "a text") == 0.5
+        # Same tweet, different text: scored again
+        assert cache.get("1", "another text") is None
+        assert cache.size() == 1
+
+def test_size_counts_inserts_once(tmp_path):
+    path = str(tmp_path / "sentiment.sqlite")
+    with sentiment.SentimentCache(path) as cache:
+        for i in range(10):
+            cache.put(str(i), "text", 0.1)
+        cache.flush()
+        # Scores written again are updated in place
+        for i in range(5):
+            cache.put(str(i), "text", 0.9)
+        cache.flush()
+        assert cache.size() == 10
+        assert cache.get("3", "text") == 0.9
+    assert rows(path) == 10
+
+def test_least_recently_used_scores_are_evicted(tmp_path):
+    path = str(tmp_path / "sentiment.sqlite")
+    with sentiment.SentimentCache(path, max_entries=100) as cache:
+        cache.now = 1000
+        for i in range(6):
+            cache.put(str(i), "text", 0.1)
+
+    # A later run reads the first two scores and adds two more
+    with sentiment.SentimentCache(path, max_entries=6) as cache:
+        cache.now = 2000
+        assert cache.get("0", "text") == 0.1
+        assert cache.get("1", "text") == 0.1
+        cache.put("6", "text", 0.2)
+        cache.put("7", "text", 0.2)
+
+    with sentiment.SentimentCache(path, max_entries=6) as cache:
+        assert cache.size() == 6
+        assert cache.get("0", "text") is not None
+        assert cache.get("7", "text") is not None
+        # The oldest scores never read again are gone
+        assert cache.get("2", "text") is None
+        assert cache.get("3", "text") is None
+    assert rows(path) == 6
+
+# Scores of a pool are the same of the serial ones, and a Scorer keeps its pool for every list of texts
+def test_scorer_reuses_its_pool():
+    texts = ["what a good day", "this is terrible", "ok"] * 10
+    serial = sentiment.score_texts(texts, workers=1)
+    assert sentiment.score_texts([]) == []
+
+    with sentiment.Scorer(workers=2, batch_size=8) as scorer:
+        assert scorer.score(texts) == serial
+        executor = scorer.executor
+        assert scorer.score(texts[::-1]) == serial[::-1]
+        assert scorer.executor is executor
+        assert scorer.score([]) == []
+    assert scorer.executor is None
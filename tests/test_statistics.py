@@ -0,0 +1,148 @@
+"""
+Regression test of the statistics of tweet_analyzer.py: the vectorized functions of utils and the per-day aggregates (aggregates.daily_statistics, compute_cov_corr) have to give the same results of the original implementation, which scanned the dataframe with iterrows (copied below), on a small fixed corpus
+"""
+
+import math
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+import aggregates
+import utils
+
+# (day, sa, retweet_count, favorite_count): days with a single tweet, with neutral tweets, and with a single tweet left once neutral ones are excluded
+CORPUS = [
+    (dt.date(2021, 2, 20), 0.5, 3, 10),
+    (dt.date(2021, 2, 20), -0.25, 0, 1),
+    (dt.date(2021, 2, 20), 0.0, 7, 2),
+    (dt.date(2021, 2, 20), 0.875, 1, 0),
+    (dt.date(2021, 2, 21), -0.6, 12, 40),
+    (dt.date(2021, 2, 22), 0.0, 0, 0),
+    (dt.date(2021, 2, 22), 0.3, 2, 5),
+    (dt.date(2021, 2, 23), 0.1, 0, 0),
+    (dt.date(2021, 2, 23), -0.9, 5, 0),
+    (dt.date(2021, 2, 23), 0.45, 0, 3),
+    (dt.date(2021, 2, 23), 0.0, 1, 1),
+    (dt.date(2021, 2, 24), 0.7, 100, 250)
+]
+
+def corpus():
+    df = pd.DataFrame(CORPUS, columns=['created_at', 'sa', 'retweet_count', 'favorite_count'])
+    df['sharing'] = df['retweet_count'] + df['favorite_count'] + 1
+    return df
+
+"""
+    Original implementation (statistics of tweet_analyzer.py, utils.std_devs and utils.compute_cov_corr before vectorization)
+"""
+def baseline_statistics(df, excludeNeutralTweets):
+    stdAvgs = {}
+    wgtAvgs = {}
+    stdDevs = {}
+    wgtDevs = {}
+    totalTweetsProcessed = 0
+    avgSharing = 0
+
+    for date in df.created_at.unique():
+        stdAvgDay = 0.0
+        wgtAvgDay = 0.0
+        totSharing = 0.0
+        count = 0
+        for index, tweet in df.loc[df['created_at'] == date].iterrows():
+            if not(excludeNeutralTweets) or tweet['sa'] != 0.0:
+                stdAvgDay += tweet['sa']
+                count += 1
+                wgtAvgDay += tweet['sa'] * tweet['sharing']
+                totSharing += tweet['sharing']
+                avgSharing += tweet['sharing']
+        totalTweetsProcessed += count
+        stdAvgs[date] = stdAvgDay / count
+        wgtAvgs[date] = wgtAvgDay / totSharing
+
+    for date in df.created_at.unique():
+        stdDevSADay = 0
+        stdDevWADay = 0
+        count = 0
+        totSharing = 0
+        for index, tweet in df.loc[df['created_at'] == date].iterrows():
+            if not(excludeNeutralTweets) or tweet['sa'] != 0.0:
+                stdDevSADay += pow(tweet['sa'] - stdAvgs[date], 2)
+                sharing = (tweet['favorite_count'] + tweet['retweet_count'] + 1)
+                totSharing += pow(sharing, 2)
+                stdDevWADay += pow(tweet['sa'] * sharing - wgtAvgs[date], 2)
+                count += 1
+        stdDevs[date] = math.sqrt(stdDevSADay/count)
+        wgtDevs[date] = math.sqrt(stdDevWADay/totSharing)
+
+    stdAvgSum = sum(stdAvgs.values()) / len(stdAvgs)
+    avgSharing /= totalTweetsProcessed
+
+    E = 0
+    Dx = 0
+    Dy = 0
+    for index, tweet in df.iterrows():
+        if not(excludeNeutralTweets) or tweet['sa'] != 0.0:
+            x = (tweet['retweet_count'] + tweet['favorite_count'] - avgSharing)
+            y = (tweet['sa'] - stdAvgSum)
+            E += x * y
+            Dx += pow(x,2)
+            Dy += pow(y, 2)
+    covariance = E / totalTweetsProcessed
+    correlation = E / math.sqrt(Dx * Dy)
+
+    return stdAvgs, stdDevs, wgtAvgs, wgtDevs, totalTweetsProcessed, avgSharing, stdAvgSum, covariance, correlation
+
+def assert_days_close(actual, expected):
+    assert list(actual) == list(expected)
+    for day in expected:
+        assert actual[day] == pytest.approx(expected[day], rel=1e-12, abs=1e-12)
+
+@pytest.mark.parametrize("excludeNeutralTweets", [True, False])
+def test_utils_match_baseline(excludeNeutralTweets):
+    df = corpus()
+    stdAvgs, stdDevs, wgtAvgs, wgtDevs, totalTweetsProcessed, avgSharing, stdAvgSum, covariance, correlation = baseline_statistics(df, excludeNeutralTweets)
+
+    actualStdAvgs, actualWgtAvgs = utils.averages(df, excludeNeutralTweets)
+    assert_days_close(actualStdAvgs, stdAvgs)
+    assert_days_close(actualWgtAvgs, wgtAvgs)
+
+    actualStdDevs, actualWgtDevs = utils.std_devs(df, actualStdAvgs, actualWgtAvgs, excludeNeutralTweets)
+    assert_days_close(actualStdDevs, stdDevs)
+    assert_days_close(actualWgtDevs, wgtDevs)
+
+    assert utils.compute_cov_corr(df, avgSharing, stdAvgSum, totalTweetsProcessed, excludeNeutralTweets) == pytest.approx((covariance, correlation), rel=1e-12)
+
+@pytest.mark.parametrize("excludeNeutralTweets", [True, False])
+def test_aggregates_match_baseline(excludeNeutralTweets):
+    df = corpus()
+    stdAvgs, stdDevs, wgtAvgs, wgtDevs, totalTweetsProcessed, avgSharing, stdAvgSum, covariance, correlation = baseline_statistics(df, excludeNeutralTweets)
+
+    days = {}
+    for day, sa, retweet_count, favorite_count in CORPUS:
+        if not excludeNeutralTweets or sa != 0.0:
+            days.setdefault(day, aggregates.Moments()).add(sa, retweet_count + favorite_count + 1)
+
+    actualStdAvgs, actualStdDevs, actualWgtAvgs, actualWgtDevs = aggregates.daily_statistics(days)
+    assert_days_close(actualStdAvgs, stdAvgs)
+    assert_days_close(actualStdDevs, stdDevs)
+    assert_days_close(actualWgtAvgs, wgtAvgs)
+    assert_days_close(actualWgtDevs, wgtDevs)
+
+    assert aggregates.sharing_statistics(days) == pytest.approx((totalTweetsProcessed, avgSharing), rel=1e-12)
+    assert aggregates.compute_cov_corr(days, avgSharing, stdAvgSum, totalTweetsProcessed) == pytest.approx((covariance, correlation), rel=1e-12)
+
+# Moments of a day merged from two halves (i.e. two files, or two runs) are the same of the whole day, and removing a tweet restores the previous ones
+def test_moments_merge_and_remove():
+    whole = aggregates.Moments()
+    first = aggregates.Moments()
+    second = aggregates.Moments()
+    for i, (day, sa, retweet_count, favorite_count) in enumerate(CORPUS):
+        whole.add(sa, retweet_count + favorite_count + 1)
+        (first if i % 2 else second).add(sa, retweet_count + favorite_count + 1)
+    first.merge(second)
+    assert first.to_tuple() == pytest.approx(whole.to_tuple(), rel=1e-9)
+
+    before = whole.to_tuple()
+    whole.add(0.42, 17)
+    whole.remove(0.42, 17)
+    assert whole.to_tuple() == pytest.approx(before, rel=1e-9, abs=1e-12)
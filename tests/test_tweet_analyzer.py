@@ -0,0 +1,70 @@
+"""
+Test of the ingest of tweet_analyzer.py on the files selected: aggregates and tweets are the ones of the selected files only, in memory and in chunked mode, when files already read are deselected or selected again
+"""
+
+import os
+
+import pytest
+
+import aggregates
+import tweet_analyzer
+import tweet_io
+
+def status(id, created_at, retweet_count, text="a good day"):
+    return {'id_str' : id, 'created_at' : created_at, 'user' : {'name' : "user"}, 'full_text' : text, 'retweet_count' : retweet_count, 'favorite_count' : 0, 'entities' : {'hashtags' : []}, 'is_quote_status' : False}
+
+def write(path, tweets, mtime):
+    with tweet_io.TweetWriter(path) as writer:
+        for tweet in tweets:
+            writer.write(tweet)
+    os.utime(path, (mtime, mtime))
+
+FIRST = "Mon Feb 15 10:00:00 +0000 2021"
+SECOND = "Tue Feb 16 10:00:00 +0000 2021"
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(tweet_analyzer, 'ingestWorkers', 1)
+    monkeypatch.setattr(tweet_analyzer, 'sentimentWorkers', 1)
+    # Tweet 3 is read again from the newer file B, with more retweets
+    write("(RAW) A.jsonl", [status("1", FIRST, 0), status("2", FIRST, 0), status("3", SECOND, 1)], 1000)
+    write("(RAW) B.jsonl", [status("3", SECOND, 9), status("4", SECOND, 0, "a bad day")], 2000)
+    return ["(RAW) A.jsonl", "(RAW) B.jsonl"]
+
+def ingest(monkeypatch, files, chunkSize=None):
+    monkeypatch.setattr(tweet_analyzer, 'files', files)
+    monkeypatch.setattr(tweet_analyzer, 'chunkSize', chunkSize)
+    if chunkSize is None:
+        tweet_analyzer.tweets_retrieving(excludeNeutral=False)
+    else:
+        tweet_analyzer.tweets_chunked(excludeNeutral=False)
+
+    with aggregates.AggregateStore() as store:
+        return {str(day) : (m.n, m.mean_sh) for day, m in store.days(False).items()}, store.count()
+
+def mtimes():
+    with aggregates.AggregateStore() as store:
+        return dict(store.connection.execute("SELECT id_str, mtime FROM tweets"))
+
+@pytest.mark.parametrize("chunkSize", [None, 2])
+def test_deselected_file_is_not_counted(corpus, monkeypatch, chunkSize):
+    both = {'2021-02-15' : (2, 1.0), '2021-02-16' : (2, (10 + 1) / 2)}
+    assert ingest(monkeypatch, corpus, chunkSize) == (both, 4)
+    assert mtimes() == {"1" : 1000, "2" : 1000, "3" : 2000, "4" : 2000}
+
+    # Only A: tweet 4 is gone, tweet 3 is back to its version of A
+    assert ingest(monkeypatch, corpus[:1], chunkSize) == ({'2021-02-15' : (2, 1.0), '2021-02-16' : (1, 2.0)}, 3)
+    assert mtimes() == {"1" : 1000, "2" : 1000, "3" : 1000}
+
+    assert ingest(monkeypatch, corpus, chunkSize) == (both, 4)
+    assert ingest(monkeypatch, corpus[1:], chunkSize) == ({'2021-02-16' : (2, (10 + 1) / 2)}, 2)
+
+def test_tweets_of_selected_files(corpus, monkeypatch):
+    ingest(monkeypatch, corpus)
+    ingest(monkeypatch, corpus[:1])
+
+    tweet_analyzer.load_tweets()
+    tweets = tweet_analyzer.tweets
+    assert sorted(tweets.ids) == ["1", "2", "3"]
+    assert tweets.retweet_count[tweets.index["3"]] == 1
@@ -0,0 +1,63 @@
+"""
+Test of tweet_converter.py: tweets are the same in every format (projected ones keep the fields used by tweet_analyzer.py), the converted file keeps the modification time of the original, which is kept (renamed out of tweet_io.RAW_FILE_PATTERN) unless deleted on request
+"""
+
+import os
+import re
+
+import pytest
+
+import tweet_converter
+import tweet_io
+
+RAW = "(RAW) Tweets (test) by 2021-02-20 (2021-02-21 00:00:00.000000) #3.json"
+MTIME = 1613800000
+
+def status(id, quoted=None):
+    tweet = {'id' : id, 'id_str' : str(id), 'created_at' : "Sat Feb 20 12:00:00 +0000 2021", 'full_text' : "testo {con} \"graffe\" e è https://t.co/x", 'lang' : "it", 'user' : {'name' : "utente", 'screen_name' : "u" + str(id)},
+             'retweet_count' : id, 'favorite_count' : 2 * id, 'entities' : {'hashtags' : [{'text' : "tag", 'indices' : [0, 4]}], 'urls' : []}, 'is_quote_status' : quoted is not None}
+    if quoted is not None:
+        tweet['quoted_status'] = quoted
+        tweet['quoted_status_id_str'] = quoted['id_str']
+    return tweet
+
+TWEETS = [status(1), status(2, status(10)), status(3)]
+
+@pytest.fixture
+def raw(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with tweet_io.TweetWriter(RAW) as writer:
+        for tweet in TWEETS:
+            writer.write(tweet)
+    os.utime(RAW, (MTIME, MTIME))
+    return RAW
+
+def converted(fmt):
+    return RAW[:-len(".json")] + tweet_io.FORMATS[fmt]
+
+@pytest.mark.parametrize("fmt", ['jsonl', 'jsonl.gz', 'jsonl.zst'])
+def test_round_trip(raw, fmt):
+    tweet_converter.main(["--format", fmt])
+    assert list(tweet_io.read_tweets(converted(fmt))) == TWEETS
+    assert os.path.getmtime(converted(fmt)) == MTIME
+
+    # The original is kept, out of the files read by tweet_analyzer.py
+    assert not os.path.exists(raw)
+    assert os.path.exists(tweet_converter.ORIGINAL_PREFIX + raw)
+    assert [f for f in os.listdir('.') if re.match(tweet_io.RAW_FILE_PATTERN, f)] == [converted(fmt)]
+
+    # And back to a RAW json file
+    tweet_converter.main(["--format", "raw", "--delete", converted(fmt)])
+    assert list(tweet_io.read_tweets(raw)) == TWEETS
+    assert not os.path.exists(converted(fmt))
+
+def test_projected_parquet(raw):
+    tweet_converter.main(["--format", "parquet"])
+    assert list(tweet_io.read_tweets(converted('parquet'))) == [tweet_io.project_tweet(tweet) for tweet in TWEETS]
+    assert os.path.exists(tweet_converter.ORIGINAL_PREFIX + raw)
+
+@pytest.mark.parametrize("args", [["--project", "--delete"], ["--format", "parquet", "--delete"]])
+def test_delete_refused_for_projected_files(raw, args):
+    with pytest.raises(SystemExit):
+        tweet_converter.main(args)
+    assert os.listdir('.') == [raw]
@@ -0,0 +1,111 @@
+"""
+Test of the checkpoints of tweet_fetcher.py against a fake search endpoint (tweepy.API and tweepy.Cursor are replaced): a download interrupted and resumed writes every tweet once, a day whose quota was met is never requested again, and files and checkpoint are saved after any error
+"""
+
+import os
+import types
+import datetime as dt
+
+import pytest
+
+import tweet_fetcher
+import tweet_io
+
+QUOTA = 3
+
+def status(date, i):
+    id = int(date.strftime("%Y%m%d")) * 100 + i
+    created = dt.datetime.combine(date, dt.time(12))
+    json = {'id' : id, 'id_str' : str(id), 'created_at' : created.strftime('%a %b %d %H:%M:%S +0000 %Y'), 'full_text' : "text", 'user' : {'name' : "user"}, 'retweet_count' : 0, 'favorite_count' : 0, 'is_quote_status' : False, 'entities' : {'hashtags' : []}}
+    return types.SimpleNamespace(id=id, id_str=str(id), created_at=created, user=types.SimpleNamespace(name="user"), full_text="text", favorite_count=0, retweet_count=0, is_quote_status=False, _json=json)
+
+class FakeAPI:
+    def __init__(self, auth):
+        self.last_response = types.SimpleNamespace(headers={})
+
+    def search(self):
+        pass
+
+"""
+    Search of the tweets of a day: pages of two tweets, in descending order of id, from 'max_id'. 'requests' records the day of every request, and 'error' (if given) is raised by every request
+"""
+class FakeSearch:
+    def __init__(self, error=None):
+        self.requests = []
+        self.error = error
+
+    def cursor(self, method, max_id=None, since=None, **kwargs):
+        search = self
+        date = dt.date.fromisoformat(since)
+        ids = [i for i in range(9, -1, -1) if max_id is None or status(date, i).id <= int(max_id)]
+        pages = [[status(date, i) for i in ids[k:k+2]] for k in range(0, len(ids), 2)]
+
+        class Pages:
+            def next(self):
+                search.requests.append(date)
+                if search.error is not None:
+                    raise search.error
+                if not pages:
+                    raise StopIteration
+                return pages.pop(0)
+
+        return types.SimpleNamespace(pages=lambda: Pages())
+
+@pytest.fixture
+def search(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("Logs")
+    search = FakeSearch()
+    monkeypatch.setattr(tweet_fetcher.tweepy, 'API', FakeAPI)
+    monkeypatch.setattr(tweet_fetcher.tweepy, 'Cursor', search.cursor)
+    return search
+
+def new_download(days=2):
+    query = {'keywords' : "k", 'retweets' : False, 'start_date' : dt.date(2021, 2, 20), 'end_date' : dt.date(2021, 2, 19 + days), 'tweets_to_retrieve' : QUOTA, 'output_format' : 'jsonl', 'project' : False}
+    return tweet_fetcher.Download(os.path.join(tweet_fetcher.CHECKPOINTS_FOLDER, "test.checkpoint"), tweet_fetcher.new_checkpoint(query))
+
+def resumed(download):
+    return tweet_fetcher.Download(download.checkpointFile, tweet_fetcher.load_checkpoint(download.checkpointFile), resume=True)
+
+def ids(download):
+    return [tweet['id_str'] for tweet in tweet_io.read_tweets(download.RAWTweetFile)]
+
+# Interrupted after the last page of the first day, before the day was marked as completed
+def test_resume_with_quota_met(search):
+    download = new_download()
+    first = dt.date(2021, 2, 20)
+    download.receive(0, [status(first, 9), status(first, 8), status(first, 7)])
+    # An empty page changes nothing
+    download.write_page(0, [])
+    download.finish()
+    checkpoint = tweet_fetcher.load_checkpoint(download.checkpointFile)
+    assert checkpoint['days']['2021-02-20'] == {'max_id' : str(status(first, 7).id - 1), 'num_tweets' : QUOTA, 'completed' : False}
+
+    download = resumed(download)
+    tweet_fetcher.run([download], None)
+    assert search.requests == [dt.date(2021, 2, 21)] * 2
+    second = dt.date(2021, 2, 21)
+    assert ids(download) == [str(status(first, i).id) for i in (9, 8, 7)] + [str(status(second, i).id) for i in (9, 8, 7)]
+    # Every day is completed, so the checkpoint is removed
+    assert not os.path.exists(download.checkpointFile)
+
+# A resumed day continues from its 'max_id', without writing any tweet twice
+def test_resume_from_max_id(search):
+    download = new_download(days=1)
+    first = dt.date(2021, 2, 20)
+    download.receive(0, [status(first, 9), status(first, 8)])
+    download.finish()
+
+    download = resumed(download)
+    tweet_fetcher.run([download], None)
+    assert ids(download) == [str(status(first, i).id) for i in (9, 8, 7)]
+
+# Any other error is raised, once files are closed and the checkpoint saved
+def test_checkpoint_saved_after_unexpected_error(search):
+    search.error = ValueError("boom")
+    download = new_download()
+
+    with pytest.raises(ValueError):
+        tweet_fetcher.run([download], None)
+    assert download.fr.f.closed and download.f.closed
+    assert not tweet_fetcher.completed(tweet_fetcher.load_checkpoint(download.checkpointFile))
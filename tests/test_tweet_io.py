@@ -0,0 +1,59 @@
+"""
+Test of the readers of tweet_io.py: RAW files (concatenated json objects) are streamed in chunks of any size, whatever their formatting, with the same tweets of every other format
+"""
+
+import json
+
+import pytest
+
+import tweet_io
+
+def status(id):
+    return {'id_str' : str(id), 'full_text' : "testo {" + "x" * id + "} \"}{\" è \\n", 'entities' : {'hashtags' : [{'text' : "tag" + str(id)}]}, 'retweet_count' : id, 'quoted_status' : {'user' : {'name' : "[{"}}}
+
+TWEETS = [status(id) for id in range(1, 30)]
+
+def write_raw(path, tweets, separator="", **kwargs):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(separator.join(json.dumps(tweet, **kwargs) for tweet in tweets))
+
+# Chunks smaller than a tweet, of a size not aligned to anything, and larger than the file
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+@pytest.mark.parametrize("layout", [dict(indent=4, sort_keys=True), dict(separators=(',', ':')), dict(separator="\n\n  \t", ensure_ascii=False)])
+def test_raw_chunks(tmp_path, chunk_size, layout):
+    path = str(tmp_path / "(RAW) test.json")
+    write_raw(path, TWEETS, **layout)
+    assert list(tweet_io.read_raw_tweets(path, chunk_size)) == TWEETS
+
+def test_raw_empty_and_truncated(tmp_path):
+    path = str(tmp_path / "(RAW) test.json")
+    write_raw(path, [], "")
+    assert list(tweet_io.read_raw_tweets(path)) == []
+
+    with open(path, "w") as f:
+        f.write(json.dumps(TWEETS[0], indent=4) + json.dumps(TWEETS[1], indent=4)[:-10])
+    tweets = tweet_io.read_raw_tweets(path, 16)
+    assert next(tweets) == TWEETS[0]
+    with pytest.raises(json.JSONDecodeError):
+        next(tweets)
+
+# Every format written by tweet_io.TweetWriter is read back by read_tweets, detected by its extension
+@pytest.mark.parametrize("fmt", ['raw', 'jsonl', 'jsonl.gz', 'jsonl.zst'])
+def test_every_format(tmp_path, fmt):
+    path = str(tmp_path / ("(RAW) test" + tweet_io.FORMATS[fmt]))
+    assert tweet_io.file_format(path) == fmt
+    with tweet_io.TweetWriter(path) as writer:
+        for tweet in TWEETS[:10]:
+            writer.write(tweet)
+    # A file appended (i.e. by a resumed download) is read as a whole
+    with tweet_io.TweetWriter(path, append=True) as writer:
+        for tweet in TWEETS[10:]:
+            writer.write(tweet)
+    assert list(tweet_io.read_tweets(path)) == TWEETS
+
+def test_deltas(tmp_path):
+    path = str(tmp_path / ("(DELTA) test" + tweet_io.DELTA_EXTENSION))
+    with tweet_io.open_jsonl(path, "w") as f:
+        tweet_io.write_delta(f, "1", 2, 3)
+        tweet_io.write_delta(f, "4", 5, 6)
+    assert list(tweet_io.read_deltas(path)) == [("1", 2, 3), ("4", 5, 6)]
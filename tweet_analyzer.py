@@ -3,25 +3,36 @@ tweet_analyzer.py is a python script used to take data retrieved by tweet_fetche
 - Sentiment analysis of tweets, that will be used as internal attribute of the corresponding node
 - Construction of a graph, which links will be weighted depending on the coherence between the sentiment of respective nodes
 - Average of the sentiment for each day, to make a temporal plot (a file containing events and important date could be provided)
+
+Without arguments, the whole analysis is made interactively (files are chosen by the user). Each stage can be run on its own, without any prompt, by a subcommand (see SUBCOMMANDS section):
+    python tweet_analyzer.py ingest [files...]
+    python tweet_analyzer.py stats|plot|graph|wordcloud|all [files...]
+    python tweet_analyzer.py serve [--port PORT]      (HTTP/JSON queries over the tweets kept in memory)
+
+Heavy dependencies (matplotlib, wordcloud, PIL, lxml, pandas, vaderSentiment) are imported only by the stages using them, so i.e. "stats" starts in a fraction of a second
 """
 
 import os
 import re
-import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from dateutil import parser
+import datetime as dt
+import numpy as np
 
 from prettytable import PrettyTable
-import tweepy
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer as sia
-import lxml.etree as etree
-import pandas as pd
-import math
 import utils
-from wordcloud import WordCloud, STOPWORDS, ImageColorGenerator
-import matplotlib.pyplot as plt 
-import numpy as np
-from PIL import Image
+import tweet_io
+import sentiment
+import aggregates
+import tweet_store
+import graph_index
+import manifest
+import pipeline
+import partitions
+import ingest
+import instrumentation
+import query_server
 
 # Color ASCII used to change color of prints
 HEADER = '\033[95m'
@@ -37,22 +48,39 @@ UNDERLINE = '\033[4m'
 pt = PrettyTable()
 files = []
 excludeNeutralTweets = True
-df = pd.DataFrame()
-hashtags = ""
+# Number of processes used to read large files, to compute sentiment of tweets and to write GEXF files (None uses every available core)
+ingestWorkers = None
+sentimentWorkers = None
+graphWorkers = None
+# Tweets of each batch in chunked mode (None keeps every tweet in memory, see CHUNKED MODE)
+chunkSize = None
+tweets = tweet_store.TweetStore()
+# Instrumentation of each stage, enabled by "--profile" (see main)
+metrics = instrumentation.Metrics()
+METRICS_FILE = os.path.join("Logs", "Metrics of tweet_analyzer (" + str(datetime.now()) + ").json")
+# Pipeline running the stages (see main)
+stages = None
+# Hours of each bucket of statistics and plots (None for days), and hours of the rolling window (None for buckets), see TIME BUCKETS
+resolution = None
+window = None
 
 """
     SELECTING TWEETS FILE
 
-        A regular expression to detect (RAW).*.json files in the current directory is used to retrieve the tweets downloaded with tweet_fetcher.py
+        A regular expression to detect (RAW).* files in the current directory is used to retrieve the tweets downloaded with tweet_fetcher.py, in any of the formats supported by tweet_io.py (.json, .jsonl, .jsonl.gz, .jsonl.zst, .parquet)
+        Files of refreshed engagement counts ((DELTA).* files, written by "tweet_fetcher.py --refresh") are listed as well, in the same chronological order
         
         The list of found files is sorted by creation time, in descending order (os.path.getmtime returns the epoc elapsed from file creation, the greater the value the older is the file, so in descending order newest files are the last). If a tweet is duplicated, the last read overwrite the previous ones, keeping most updated information (i.e. Degree and likes).
 
         Files are shown to the user in a PrettyTable, to allow interactive selection/deselection of which files have to be analyzed inserting corresponding number, or simply pressing Enter to continue.
         State of each file (selected/deselected) is represented by its color (Green/Red)
 """
+def find_files():
+    return [f for f in sorted(os.listdir('.'), key=os.path.getmtime) if os.path.isfile(f) and (re.match(tweet_io.RAW_FILE_PATTERN, f) or re.match(tweet_io.DELTA_FILE_PATTERN, f))]
+
 def select_files():
     global files
-    files = [[f, True] for f in sorted(os.listdir('.'), key=os.path.getmtime) if os.path.isfile(f) and re.match(r"^\(RAW\).*.json$", f)]
+    files = [[f, True] for f in find_files()]
 
     # " ", not "" (or the while statement would be False)
     selector = " " 
@@ -98,77 +126,313 @@ def select_files():
                 quoted_status.user.name (Username of the creator of quoted tweet)
                 quoted_status.full_text (text of quoted tweet)
 
-        Json files are read line by line, using '}{' and '}' as separators. Tweets are rebuilt one by one, cleaned from url and processed by vaderSentiment sentiment analyzer. Date is stored natively in a '%a %b %d %H:%M:%S +0000 %Y' format string (i.e. 'Mon Feb 15 23:55:07 +0000 2021'), which is converted in a datetime object containing only yyyy-mm-dd (.date() invocation).
+        Only files never read before are read: files already read (recorded in the manifest, see manifest.Manifest, with their size, modification time and hash) are skipped, their tweets being already in the snapshot saved by previous runs (see manifest.Snapshot), in a segment for each file. A modified file (i.e. appended by a resumed download) is read again, replacing its segment.
+        Tweets analyzed are the ones of the selected files only, rebuilt from their segments as if the selected files were read by a single run. Only the tweets of the files read are aggregated again (with their version in the selected files, looked up in the indexes of id_str of the segments, so the snapshot is never loaded all together), so adding a file to a large corpus costs only the reading of that file: delete Cache folder to start from scratch.
+
+        Large RAW (and plain JSON Lines) files are split in shards, byte ranges of whole tweets found by a byte scan of the memory mapped file (tweet_io.shards), which are parsed, cleaned and scored by a pool of 'ingestWorkers' processes (see ingest.py), so reading a huge dump scales with the number of cores.
+        Results of the shards are merged in the order of the files (and of the shards in each file), exactly as if the files were read by this process, so a newer tweet still replaces an older one. Files too small to be worth a pool, and compressed or parquet files, are read by this process.
 
-        'Tweet' class from package 'tweet_parser.tweet' has not been used to allow adding 'sa' field to the tweet (possible with the dictionary) and to automatically avoid duplicates thanks to 'id' as dictionary key. If a duplicate tweet with the same id is found, it replaces the previous one. Considering that json files are read in chronological order, newest tweets replace the oldest ones, keeping always updated informations on a tweet. 'Tweets' dictionary is then used to create Pandas Dataframe 'df', for a smarter handling of records.
+        Other files are streamed by tweet_io.read_tweets, which detects their format and yields tweets one at a time (the whole file is never loaded in memory). RAW json files are decoded directly from the file buffer, while JSON Lines and parquet files (even projected to the fields used here) are rebuilt with the same nested structure. Tweets are cleaned from url and processed by vaderSentiment sentiment analyzer. Date is stored natively in a '%a %b %d %H:%M:%S +0000 %Y' format string (i.e. 'Mon Feb 15 23:55:07 +0000 2021'), which is converted in its timestamp (seconds since epoch, UTC) by tweet_store.timestamp, slicing the string at fixed positions (dateutil parser is used only for unexpected formats): the day and the hour of each tweet are derived from it.
+
+        'Tweet' class from package 'tweet_parser.tweet' has not been used to allow adding 'sa' field to the tweet and to automatically avoid duplicates thanks to 'id' as key. Tweets are stored in a columnar tweet_store.TweetStore (typed NumPy arrays for numeric fields, categorical usernames, an index from id to row), much slimmer than a dictionary for each tweet. If a duplicate tweet with the same id is found, it replaces the previous one. Considering that json files are read in chronological order, newest tweets replace the oldest ones, keeping always updated informations on a tweet (a tweet read from a file never replaces the one read from a newer file).
+
+        A delta file (tweet_io.read_deltas) only updates retweet_count and favorite_count of tweets already read: refreshed counts replace the ones read from older files, and are replaced by newer RAW files. Counts of tweets not read (i.e. from files not selected) are ignored.
 
         Sentiment is estimated by the analyzer of vaderSentiment library, and only 'compound' component is stored (combination of pos, neg and neu measurements).
+        Scores are remembered in a persistent cache (sentiment.SentimentCache), so a tweet is scored only the first time it's read (or if its text changes), even across different runs.
+        Tweets of shards are scored by the workers parsing them, which look up the cache too (new scores are written in the cache by this process).
+        Tweets of the other files not found in the cache are scored after all files have been read, in batches distributed to 'sentimentWorkers' processes (sentiment.score_texts), with the same results of a serial scoring.
         Be aware that sentiment analysis is excluded from quoted tweets, because they could be on different topics, interfering with the measurements.
 
         Parameters:
-            'Tweets' is the dictionary containing all tweets, with their ID as key (unique)
+            'tweets' is the store containing all tweets of the selected files, with their ID as key (unique). It's used directly by graph creation, and can be converted in a Pandas Dataframe (tweets.to_dataframe()). It holds every tweet only if every selected file has been read (or the aggregates are rebuilt), otherwise it's loaded from the snapshot only when needed (see load_tweets), as a new store
 
-            'tweet' is a dictionary containg last tweet read from the json file, to be processed before being stored in 'Tweets' main dictionary
+            'snapshot' is the snapshot of the tweets read by previous runs, with the manifest of their files ('ingested')
 
-            'jsonTweet' is the string containing the json definition of the read tweet. Because of the storing of the tweet on multiple lines, it's necessary to read the file line by line to detect boundaries of single tweet ( '}{' and '}' )
+            'read' maps each file read in this run to the store of its tweets, saved as its segment of the snapshot
 
-            'df' is pandas dataframe in which will be stored the tweets retrieved, making the 'Tweets' dictionary useless
+            'changed' is the store of the tweets of the files read, in their version of the selected files, to be aggregated
 
-            'analyzer' is an instance of Vader Sentiment Analyzer, which compute sentiment for the text of each tweet, composed as 'pos', 'neu', 'neg' and 'compound' (the last one is a composition of the first three values). Only 'compount' element is stored
+            'record' is the last tweet read, cleaned by ingest.clean_tweet (with its sentiment, if scored by a worker), to be stored in the store of its file
 
-            'excludeNeutralTweets' is a flag used to decide if discarting neutral tweets (with 'compound' equals to 0.0) or not. This heavily influences sentiment analysis statistics
-"""
-def tweets_retrieving():
-    global excludeNeutralTweets
-    global df
-    global hashtags
+            'sharded' maps each file read in parallel to its shards, whose results ('results') are merged in order
+
+            'toScore' maps (ID, text) of tweets not found in the cache to the stores holding them, to be scored by Vader Sentiment Analyzer, which compute sentiment for the text of each tweet, composed as 'pos', 'neu', 'neg' and 'compound' (the last one is a composition of the first three values). Only 'compount' element is stored
 
-    Tweets = {}
-    tweet = {}
-    jsonTweet = ""
-    analyzer = sia()
-    excludeNeutralTweets = str(input("Do you want to exclude tweets with null sentiment from statistics? [Y/n]: "))
-    excludeNeutralTweets = (excludeNeutralTweets != "n" and excludeNeutralTweets != "N")
+            'cache' is the persistent cache of 'compound' scores, keyed by id and text of the tweet
 
+            'store' is the persistent store of per-day aggregates (aggregates.AggregateStore) of the selected files, including the frequency of hashtags of each day: it's updated with the tweets read (a tweet already aggregated replaces its previous contribution), and with the tweets of the files selected or deselected since the last run (recorded as its sources)
+
+            'excludeNeutralTweets' is a flag used to decide if discarting neutral tweets (with 'compound' equals to 0.0) or not. This heavily influences sentiment analysis statistics. The user is asked for it, unless given as 'excludeNeutral' (i.e. by benchmark.py)
+"""
+def tweets_retrieving(excludeNeutral=None):
+    global excludeNeutralTweets
+    global tweets
+
+    snapshot = manifest.Snapshot()
+    ingested = snapshot.manifest
+    read = {}
+    toScore = {}
+    cache = sentiment.SentimentCache()
+    if excludeNeutral is None:
+        excludeNeutral = ask_exclude_neutral()
+    excludeNeutralTweets = excludeNeutral
+
+    toRead = []
     for file in files:
+        if ingested.status(file) == 'unchanged':
+            print(OKCYAN + "Skipping file " + file + " (already read)" + ENDC)
+            metrics.count('files_skipped')
+        else:
+            toRead.append(file)
+    # Tweets of the previous segments of the files read again, to be aggregated again as well
+    replaced = snapshot.ids(toRead)
+
+    sharded = ingest.plan([file for file in toRead if not re.match(tweet_io.DELTA_FILE_PATTERN, file)], ingestWorkers)
+    # The pool is started only if there are shards to parse
+    results = ingest.parse_shards([(file, start, end) for file, fileShards in sharded.items() for start, end in fileShards], ingestWorkers or os.cpu_count() or 1, cache.path)
+
+    for file in toRead:
         print(WARNING + "Reading file " + file + ENDC)
-        f = open(file, "r")
-        jsonTweet = ""
-
-        for line in f.readlines():
-            if line == "}{\n" or line == "}":
-                jsonTweet += "}"
-                tweet = json.loads(jsonTweet)
-                id = tweet['id_str']
-                Tweets[id] = {}
-                Tweets[id]['id_str'] = id
-                Tweets[id]['full_text'] = ' '.join(word for word in tweet['full_text'].split() if not word.startswith('https:'))
-                Tweets[id]['created_at'] = (parser.parse(tweet['created_at'])).date()
-                Tweets[id]['username'] = tweet['user']['name']
-                Tweets[id]['retweet_count'] = tweet['retweet_count']
-                Tweets[id]['favorite_count'] = tweet['favorite_count']
-                Tweets[id]['sharing'] = tweet['retweet_count'] + tweet['favorite_count'] + 1
-                sa = analyzer.polarity_scores(tweet['full_text'])['compound'] 
-                Tweets[id]['sa'] = sa
-                Tweets[id]['is_quote_status'] = tweet['is_quote_status']
-                for hashtag in tweet['entities']['hashtags']:
-                    hashtags += " " + hashtag['text']
-                
-                # entities.hashtags.text (without'#')
-
-                # if this tweet is a quote, store additional fields
-                if tweet['is_quote_status']:
-                    Tweets[id]['quoted_tweet_id'] = tweet['quoted_status']['id_str']
-                    Tweets[id]['quoted_tweet_username'] = tweet['quoted_status']['user']['name']
-                    Tweets[id]['quoted_tweet_full_text'] = ' '.join(word for word in tweet['quoted_status']['full_text'].split() if not word.startswith('https:'))
-
-                jsonTweet = "{"
+        mtime = os.path.getmtime(file)
+
+        if re.match(tweet_io.DELTA_FILE_PATTERN, file):
+            deltas = list(tweet_io.read_deltas(file))
+            snapshot.put(file, deltas=deltas, mtime=mtime)
+            ingested.record(file, len(deltas))
+            metrics.count('files_read')
+            metrics.count('deltas_read', len(deltas))
+            continue
+
+        if file in sharded:
+            records = sharded_records(results, len(sharded[file]), cache)
+        else:
+            records = ((ingest.clean_tweet(tweet), tweet['full_text']) for tweet in tweet_io.read_tweets(file))
+
+        store = tweet_store.TweetStore()
+        fileScore = {}
+        # 'text' is the original text of the tweet, still to be scored (None if already scored by a worker)
+        for record, text in records:
+            id, created, username, full_text, retweet_count, favorite_count, hashtags, quote = record[:8]
+
+            if text is None:
+                sa = record[8]
+                fileScore.pop(id, None)
             else:
-                jsonTweet += line
-        
-    df = pd.DataFrame.from_dict(Tweets, orient='index')
-    df.sort_values('created_at', ascending = True, inplace = True)
-    print(str(len(df)) + " tweets read")
+                sa = cache.get(id, text)
+                # Only the last version of a tweet in the file has to be scored, a duplicate replaces (or removes, if already cached) the previous one
+                if sa is None:
+                    fileScore[id] = text
+                else:
+                    fileScore.pop(id, None)
+
+            store.add(id, created, username, full_text, retweet_count, favorite_count, sa, hashtags, quote, mtime)
+
+        # The same version of a tweet read from several files is scored once
+        for id, text in fileScore.items():
+            toScore.setdefault((id, text), []).append(store)
+        read[file] = store
+        ingested.record(file, len(store))
+        metrics.count('files_read')
+        metrics.count('tweets_read', len(store))
+    # Every shard has been read: the pool of ingest.parse_shards is shut down before the one scoring sentiment is started
+    results.close()
+
+    print("Computing sentiment of " + str(len(toScore)) + " tweets... ", end="")
+    scores = sentiment.score_texts([text for _, text in toScore], sentimentWorkers)
+    for (id, text), sa in zip(toScore, scores):
+        for store in toScore[(id, text)]:
+            store.set_sa(id, sa)
+        cache.put(id, text, sa)
+    print(OKGREEN + "Done" + ENDC)
+
+    cache.close()
+    print("Sentiment cache: " + str(cache.hits) + " hits, " + str(cache.misses) + " misses")
+    metrics.count('tweets_scored', len(toScore))
+    metrics.count('sentiment_cache_hits', cache.hits)
+    metrics.count('sentiment_cache_misses', cache.misses)
+
+    for file, store in read.items():
+        snapshot.put(file, store)
+    read = None
+
+    print("Updating per-day aggregates... ", end="")
+    with aggregates.AggregateStore() as store:
+        sources = store.sources()
+        # Aggregates deleted (or emptied, see aggregates.AGGREGATES_VERSION), or holding files without a segment (i.e. aggregated in chunked mode), are built again from every tweet of the selected files, which are kept in memory, as when every file has been read
+        if not store.count() or len(toRead) == len(files) or any(file not in snapshot.segments for file in sources):
+            store.clear()
+            tweets = snapshot.tweets(files)
+            changed = tweets
+        # Otherwise only the tweets of the files read, selected or deselected since the last run are updated, with their version in the selected files (tweets no longer in any of them are discarded), and the store is loaded when needed (see load_tweets)
+        else:
+            tweets = tweet_store.TweetStore()
+            affected = np.union1d(replaced, snapshot.ids(sorted(set(toRead) | set(files).symmetric_difference(sources))))
+            changed = snapshot.tweets(files, affected) if len(affected) else tweet_store.TweetStore()
+            store.discard(np.setdiff1d(affected, np.array(changed.ids, dtype=str)))
+        store.update(changed.contributions(), replace=True)
+        store.set_sources(files)
+    print(OKGREEN + "Done" + ENDC)
+
+    # Snapshot and aggregates are left untouched if no file has been read (or selected, or deselected), so stages depending on them aren't executed again (see STAGES)
+    if toRead or files != snapshot.selected:
+        snapshot.save(files)
+    print(str(len(changed)) + " tweets new or changed, from " + str(len(toRead)) + " files read")
+    metrics.count('tweets_changed', len(changed))
+
+"""
+    Generator of the records of the next 'shards' results of ingest.parse_shards (the shards of a file), recording in the cache the scores found and computed by the workers
+"""
+def sharded_records(results, shards, cache):
+    for _ in range(shards):
+        records, hits, scored = next(results)
+        cache.add_hits(hits)
+        cache.add_scores(scored)
+        metrics.count('tweets_scored', len(scored))
+        for record in records:
+            yield record, None
+
+"""
+    CHUNKED MODE
+        Tweets are kept in memory (in 'tweets') only to write the graphs, so corpora larger than memory are read in chunked mode ("--chunked"), in batches of 'chunkSize' tweets:
+        each batch is scored (sentiment cache first), added to the per-day aggregates (already on disk) and appended to the per-day partitions in Cache/Partitions (see partitions.PartitionWriter), then released.
+        Statistics, plots and word cloud are computed from the aggregates as in memory, and the gexf file of each day is written from its partition (see daily_graphs): they're the same of the in-memory mode, while memory stays bounded by a batch (and by the largest day when writing graphs).
+        Refreshed engagement counts (DELTA files) are applied to the aggregates of the tweets already aggregated, and appended to the partitions of their days.
+        The quote index and the dynamic graph of the whole corpus need every tweet at once, so they aren't built in chunked mode.
+        Files already spilled are recorded in their own manifest (Cache/Partitions/manifest.pickle), so only new or modified files are read again, as in memory. Tweets spilled can't be taken back from partitions and aggregates, so deselecting a file spilled reads every selected file again.
+"""
+def tweets_chunked(excludeNeutral=None):
+    global excludeNeutralTweets
+
+    ingested = partitions.load_manifest()
+    cache = sentiment.SentimentCache()
+    if excludeNeutral is None:
+        excludeNeutral = ask_exclude_neutral()
+    excludeNeutralTweets = excludeNeutral
+
+    # A single pool scores the tweets of every batch
+    with aggregates.AggregateStore() as store, sentiment.Scorer(sentimentWorkers) as scorer:
+        # Tweets spilled can't be taken back: if a file spilled isn't selected any more (or the aggregates aren't the ones of the partitions, i.e. built in memory), partitions and aggregates are emptied and every selected file is read again
+        spilled = store.sources()
+        if set(spilled) != set(ingested.entries) or not set(spilled) <= set(files):
+            store.clear()
+            ingested = partitions.clear()
+            spilled = []
+        writer = partitions.PartitionWriter()
+
+        toRead = []
+        for file in files:
+            if ingested.status(file) == 'unchanged':
+                print(OKCYAN + "Skipping file " + file + " (already read)" + ENDC)
+                metrics.count('files_skipped')
+            else:
+                toRead.append(file)
+
+        sharded = ingest.plan([file for file in toRead if not re.match(tweet_io.DELTA_FILE_PATTERN, file)], ingestWorkers)
+        results = ingest.parse_shards([(file, start, end) for file, fileShards in sharded.items() for start, end in fileShards], ingestWorkers or os.cpu_count() or 1, cache.path)
+
+        for file in toRead:
+            print(WARNING + "Reading file " + file + ENDC)
+            mtime = os.path.getmtime(file)
+            read = 0
+            batch = []
+
+            if re.match(tweet_io.DELTA_FILE_PATTERN, file):
+                refreshed = 0
+                for delta in tweet_io.read_deltas(file):
+                    read += 1
+                    batch.append(delta)
+                    if len(batch) >= chunkSize:
+                        refreshed += refresh_batch(batch, mtime, store, writer)
+                        batch = []
+                refreshed += refresh_batch(batch, mtime, store, writer)
+                print("Engagement of " + str(refreshed) + " tweets refreshed")
+                metrics.count('deltas_read', read)
+            else:
+                if file in sharded:
+                    records = sharded_records(results, len(sharded[file]), cache)
+                else:
+                    records = ((ingest.clean_tweet(tweet), tweet['full_text']) for tweet in tweet_io.read_tweets(file))
+
+                for record in records:
+                    read += 1
+                    batch.append(record)
+                    if len(batch) >= chunkSize:
+                        spill_batch(batch, mtime, cache, scorer, store, writer)
+                        batch = []
+                spill_batch(batch, mtime, cache, scorer, store, writer)
+                metrics.count('tweets_read', read)
+
+            # The manifest is saved after each file, when its tweets are already on disk
+            ingested.record(file, read)
+            partitions.save_manifest(ingested)
+            spilled = sorted(set(spilled) | {file})
+            store.set_sources(spilled)
+            metrics.count('files_read')
+        results.close()
+
+    cache.close()
+    print("Sentiment cache: " + str(cache.hits) + " hits, " + str(cache.misses) + " misses")
+    metrics.count('sentiment_cache_hits', cache.hits)
+    metrics.count('sentiment_cache_misses', cache.misses)
+
+"""
+    Scores a batch of (record, text) tuples (see tweets_retrieving) with 'scorer' (sentiment.Scorer), adding them to the aggregates and to the partitions of their days
+"""
+def spill_batch(batch, mtime, cache, scorer, store, writer):
+    items = []
+    toScore = {}
+    for record, text in batch:
+        if text is None:
+            sa = record[8]
+        else:
+            sa = cache.get(record[0], text)
+            if sa is None:
+                toScore[record[0]] = text
+        items.append(record[:8] + (sa, mtime))
+
+    scores = dict(zip(toScore.keys(), scorer.score(list(toScore.values()))))
+    for id, text in toScore.items():
+        cache.put(id, text, scores[id])
+    metrics.count('tweets_scored', len(toScore))
+
+    for i, item in enumerate(items):
+        if item[8] is None:
+            items[i] = item[:8] + (scores[item[0]], mtime)
+
+    # Tweets already aggregated from a newer file are neither aggregated nor spilled again
+    applied = set(store.update((item[0], dt.date.fromordinal(tweet_store.day_of(item[1])), item[8], item[4] + item[5] + 1, item[6], tweet_store.hour_of(item[1]), mtime) for item in items))
+    for item in items:
+        if item[0] in applied:
+            writer.add(tweet_store.day_of(item[1]), item)
+    store.flush()
+    writer.flush()
+
+"""
+    Refreshes engagement counts of a batch of (id_str, retweet_count, favorite_count) tuples of tweets already aggregated (from files not newer than the delta file), returning how many of them have been refreshed
+"""
+def refresh_batch(batch, mtime, store, writer):
+    known = store.contributions(id for id, _, _ in batch)
+    updates = []
+    deltas = []
+    for id, retweet_count, favorite_count in batch:
+        if id in known:
+            day, sa, _, hashtags, hour = known[id]
+            day = dt.date.fromisoformat(day)
+            updates.append((id, day, sa, retweet_count + favorite_count + 1, hashtags.split(' ') if hashtags else (), datetime.strptime(hour, aggregates.HOUR_FORMAT), mtime))
+            deltas.append((day.toordinal(), (id, retweet_count, favorite_count, mtime)))
+
+    applied = set(store.update(updates))
+    for day, delta in deltas:
+        if delta[0] in applied:
+            writer.add(day, delta)
+    store.flush()
+    writer.flush()
+    return len(applied)
+
+def ask_exclude_neutral():
+    answer = str(input("Do you want to exclude tweets with null sentiment from statistics? [Y/n]: "))
+    return (answer != "n" and answer != "N")
 
 """
     STATISTICS
@@ -182,103 +446,211 @@ def tweets_retrieving():
         COVARIANCE AND CORRELATION
             Computed between Sentiment and Sharing, considering only the Standard Average of sentiment (Weighted has an explicit and obvious dependence with Sharing on its own) on all the days considered.
 
-        PLOTTING
-            Means (Standard and Weighted) are plotted, with standard deviation, to produce graphic plots in "Plots/" directory
-"""
-def statistics():
-    stdAvgs = {}
-    stdDevs = {}
-    wgtAvgs = {}
-    wgtDevs = {}
+        Every statistic is computed from the per-day aggregates (aggregates.Moments) kept by aggregates.AggregateStore, in constant time per day, without scanning tweets again (the same statistics can be computed from a dataframe by utils.averages, utils.std_devs and utils.compute_cov_corr).
+        Aggregates include every tweet read by tweet_analyzer.py, in this run and in the previous ones.
+
+        TIME BUCKETS
+            Aggregates are kept for each hour as well, so the table and the plots can be computed on buckets of 'resolution' hours (i.e. 1 or 6, instead of days), or on a rolling window of 'window' hours moved every 'resolution' hours (1 by default), merging hourly Moments (see aggregates.AggregateStore.buckets and rolling).
+            Covariance and correlation are always computed on days (rolling windows overlap, so a tweet would be counted more than once)
 
-    days = 0
-    totalTweetsProcessed = 0
-    avgSharing = 0
+        PERCENTILES
+            Median and percentiles of sentiment of each day (and of all days together), of tweets and weighted by sharing, are read from the histograms of sentiment kept by the aggregates (aggregates.Histogram), approximate within 0.01.
+            They're always computed on days, like covariance and correlation.
 
+        PLOTTING
+            Means (Standard and Weighted) are plotted, with standard deviation, to produce graphic plots in "Plots/" directory (unless 'plots' is False), together with the bands between percentiles of each day
+"""
+def statistics(plots=True):
     print(WARNING + "Neutral tweets have been " + ("discarded" if excludeNeutralTweets else "kept") + ENDC)
 
     print("Computing sentiment analysis statistics... " + ENDC, end="")
-    pt.field_names = ["Date", "Standard Average", "Standard Average Deviation", "Weighted Average", "Weighted Average Deviation"]
-
-    # For each date, the weighted average and standard average are computed
-    for date in df.created_at.unique(): 
-        stdAvgDay = 0.0
-        wgtAvgDay = 0.0
-        totSharing = 0.0
-        count = 0
-        days += 1
-
-        for index, tweet in df.loc[df['created_at'] == date].iterrows():
-            if not(excludeNeutralTweets) or tweet['sa'] != 0.0:
-                stdAvgDay += tweet['sa']
-                count += 1
-
-                
-                wgtAvgDay += tweet['sa'] * tweet['sharing']
-                totSharing += tweet['sharing']
-
-                avgSharing += tweet['sharing']
+    pt.field_names = [bucket_title(), "Standard Average", "Standard Average Deviation", "Weighted Average", "Weighted Average Deviation"]
 
-        # 'count' is used to keep track of tweets processed in each day, then it resets, while 'totalTweetsProcessed' keeps count of all tweets used for statistics
-        totalTweetsProcessed += count
+    # For each date (or bucket of hours), the weighted average and standard average (with their standard deviations) are computed
+    days, buckets, (stdAvgs, stdDevs, wgtAvgs, wgtDevs) = bucket_statistics()
+    if not buckets:
+        print(FAIL + "No tweets analyzed" + ("" if not days else " with their hour (read files again)") + ENDC)
+        return
 
-        stdAvgDay /= count
-        stdAvgs[date] = stdAvgDay
-
-        wgtAvgDay /= (totSharing)
-        wgtAvgs[date] = wgtAvgDay
+    # 'totalTweetsProcessed' keeps count of all tweets used for statistics
+    totalTweetsProcessed, avgSharing = aggregates.sharing_statistics(days)
     print(OKGREEN + "Done" + ENDC)
-        
-    print("Computing sentiment analysis standard deviation... " + ENDC, end="")
-    # For each date, the standard deviation is computed for standard and weighted average
-    for date in df.created_at.unique(): 
-        stdDevSADay, stdDevWADay = utils.std_devs(df, date, stdAvgs, wgtAvgs, excludeNeutralTweets)
-
-        stdDevs[date] = stdDevSADay
-        wgtDevs[date] = stdDevWADay
 
+    for date in stdAvgs.keys():
         pt.add_row([date, round(stdAvgs[date], 3), round(stdDevs[date], 3), round(wgtAvgs[date], 3), round(wgtDevs[date], 3)])
         
-    # Standard Average of averages/deviations (computed on days considered)
-    stdAvgSum = sum(stdAvgs.values()) / days
-    wgtAvgSum = sum(wgtAvgs.values()) / days
-    stdDevsSum = sum(stdDevs.values()) / days
-    wgtAvgSum = sum(wgtDevs.values()) / days
+    # Standard Average of averages/deviations (computed on days, or buckets, considered)
+    stdAvgSum = sum(stdAvgs.values()) / len(buckets)
+    wgtAvgSum = sum(wgtAvgs.values()) / len(buckets)
+    stdDevsSum = sum(stdDevs.values()) / len(buckets)
+    wgtAvgSum = sum(wgtDevs.values()) / len(buckets)
     pt.add_row(['average', round(stdAvgSum, 3), round(stdDevsSum, 3), round(wgtAvgSum, 3), round(wgtAvgSum, 3)])
-    print(OKGREEN + "Done" + ENDC)
     print(pt)
     pt.clear()
 
     print("Computing Covariance and Correlation between Sentiment and Degree... ", end="")
     pt.field_names = ["Average Sharing", "Covariance", "Correlation"]
-    avgSharing /= totalTweetsProcessed
-    covariance, correlation = utils.compute_cov_corr(df, avgSharing, stdAvgSum, totalTweetsProcessed, excludeNeutralTweets)
+    if buckets is not days:
+        stdAvgSum = sum(m.mean_sa for m in days.values()) / len(days)
+    covariance, correlation = aggregates.compute_cov_corr(days, avgSharing, stdAvgSum, totalTweetsProcessed)
     pt.add_row([round(avgSharing, 3), round(covariance, 3), round(correlation, 3)])
     print(OKGREEN + "Done" + ENDC)
     print(pt)
     pt.clear()
-    
+
+    print("Computing percentiles of sentiment... ", end="")
+    histograms, stdPercentiles, wgtPercentiles = percentile_statistics()
+    pt.field_names = ["Date", "10th Percentile", "25th Percentile", "Median", "75th Percentile", "90th Percentile", "Weighted Median"]
+    for date in stdPercentiles.keys():
+        pt.add_row([date] + [round(value, 3) for value in stdPercentiles[date]] + [round(wgtPercentiles[date][2], 3)])
+
+    # Histograms of the days are merged (exactly) for the percentiles of all days together
+    total = aggregates.Histogram()
+    for histogram in histograms.values():
+        total.merge(histogram)
+    if histograms:
+        pt.add_row(['all days'] + [round(value, 3) for value in total.quantiles(aggregates.PERCENTILES)] + [round(total.quantiles([0.5], weighted=True)[0], 3)])
+    print(OKGREEN + "Done" + ENDC)
+    print(pt)
+    pt.clear()
+
+    if plots:
+        plot(stdAvgs, stdDevs, wgtAvgs, wgtDevs)
+        percentile_plot(stdPercentiles, wgtPercentiles)
+
+"""
+    Returns the Moments of each day, the Moments of each bucket (the same days, unless 'resolution' or 'window' are given, see TIME BUCKETS) and the statistics of the buckets
+"""
+def bucket_statistics():
+    with aggregates.AggregateStore() as store:
+        days = store.days(excludeNeutralTweets)
+        if window is not None:
+            buckets = store.rolling(excludeNeutralTweets, window, resolution or 1)
+        elif resolution is not None and resolution != 24:
+            buckets = store.buckets(excludeNeutralTweets, resolution)
+        else:
+            buckets = days
+    return days, buckets, aggregates.daily_statistics(buckets)
+
+"""
+    Returns the histogram of sentiment of each day and the percentiles of each day, of tweets and weighted by sharing (see PERCENTILES)
+"""
+def percentile_statistics():
+    with aggregates.AggregateStore() as store:
+        histograms = store.sentiment_histograms(excludeNeutralTweets)
+    return histograms, aggregates.daily_percentiles(histograms), aggregates.daily_percentiles(histograms, weighted=True)
+
+def bucket_title():
+    if window is not None:
+        return "Last hour of " + str(window) + "h window"
+    if resolution is not None and resolution != 24:
+        return "Start of " + str(resolution) + "h bucket"
+    return "Date"
+
+# Files of the two plots (named after the buckets, if not days)
+def plot_files():
+    suffix = ""
+    if window is not None:
+        suffix = ", " + str(window) + "h rolling window"
+    elif resolution is not None and resolution != 24:
+        suffix = ", " + str(resolution) + "h buckets"
+    return ["Plots/Temporal variation of public sentiment (Standard Average" + suffix + ").png", "Plots/Temporal variation of public sentiment (Weighted Average" + suffix + ").png"]
+
+PERCENTILE_PLOT_FILES = ["Plots/Percentiles of public sentiment (Standard).png", "Plots/Percentiles of public sentiment (Weighted).png"]
+
+def plot(stdAvgs, stdDevs, wgtAvgs, wgtDevs):
     dates_text = ""
     for line in open("Dates.txt", "r").readlines():
         dates_text += line
 
-    utils.plot(df, stdAvgs, stdDevs, -0.8, dates_text, "Plots/Temporal variation of public sentiment (Standard Average).png")
+    utils.plot(stdAvgs, stdDevs, -0.8, dates_text, plot_files()[0])
     
-    utils.plot(df, wgtAvgs, wgtDevs, -1, dates_text, "Plots/Temporal variation of public sentiment (Weighted Average).png")
+    utils.plot(wgtAvgs, wgtDevs, -1, dates_text, plot_files()[1])
+
+def percentile_plot(stdPercentiles, wgtPercentiles):
+    dates_text = ""
+    for line in open("Dates.txt", "r").readlines():
+        dates_text += line
+
+    utils.percentile_plot(stdPercentiles, -0.8, dates_text, PERCENTILE_PLOT_FILES[0])
+
+    utils.percentile_plot(wgtPercentiles, -0.8, dates_text, PERCENTILE_PLOT_FILES[1])
 
 """
     GRAPH CREATION
-        Invokes repeadetly "gexf_parser" from utils module
+        Tweets are partitioned by day in a single pass (tweets.rows_by_day), then "gexf_parser" from utils module writes the file of each day.
+        Days are independent, so they are written by a pool of 'graphWorkers' processes: at most two days per worker are pending at the same time, so only the records of those days are held in memory
+
+        Then the quote graph of the whole corpus is indexed once (graph_index.QuoteGraph), with a single node for each tweet: it gives the real number of quotes received/made by each tweet, connected components and most quoted tweets, and it's saved as a single dynamic gexf file (GEXF/GEXF_dynamic.gexf), whose nodes have spells for the days they appear in
 """
 def graph_creation():
-    # For each date, a new graph is initialized 
-    for date in df.created_at.unique():
-        utils.gexf_parser(df, date)
+    daily_graphs()
+    if chunkSize is not None:
+        print(WARNING + "Quote index and dynamic graph need every tweet in memory, so they aren't built in chunked mode" + ENDC)
+        return
+
+    graph = graph_index.QuoteGraph(tweets)
+    sizes = graph.component_sizes()
+    metrics.set('graph_nodes', len(graph))
+    metrics.set('graph_quotes', len(graph.sources))
+    print("Quote graph: " + str(len(graph)) + " tweets, " + str(len(graph.sources)) + " quotes, " + str(int((sizes > 1).sum())) + " connected components with quotes (largest of " + str(int(sizes[0]) if len(sizes) else 0) + " tweets)")
+
+    pt.field_names = ["ID", "Username", "Quotes received", "Tweet text"]
+    pt.align["Tweet text"] = "l"
+    for node in graph.top_quoted(10):
+        pt.add_row([graph.ids[node], graph.username(node), graph.in_degree[node], graph.full_text(node)[:80]])
+    print(pt)
+    pt.clear()
+
+    utils.dynamic_gexf_parser(graph)
+
+def daily_graphs():
+    # In chunked mode each day is read from its partition by the process writing its graph
+    if chunkSize is None:
+        days = tweets.rows_by_day()
+        jobs = ((utils.gexf_parser, (list(tweets.records(rows)), date)) for date, rows in days.items())
+    else:
+        days = partitions.days()
+        jobs = ((partitions.gexf_parser, (path, date)) for date, path in days)
+    workers = min(graphWorkers or os.cpu_count() or 1, len(days))
+    metrics.count('daily_graphs', len(days))
+
+    if workers <= 1:
+        for function, args in jobs:
+            function(*args)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for function, args in jobs:
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(executor.submit(function, *args))
+
+        for future in pending:
+            future.result()
+
+"""
+    WORD CLOUD
+        Hashtags are counted for each day while tweets are read (aggregates.AggregateStore keeps a frequency counter per day), so the cloud is rendered from the merged frequencies of the days between 'start' and 'end' (datetime.date, both included, every day by default) without touching tweets again
+"""
+def wordCloud(start=None, end=None, filename="Plots/Wordcloud.png"):
+    from wordcloud import WordCloud, ImageColorGenerator
+    import matplotlib.pyplot as plt
+    from PIL import Image
 
-def wordCloud():
     print(WARNING + "Creating Word Cloud... ", end="")
+    with aggregates.AggregateStore() as store:
+        frequencies = store.hashtag_frequencies(start, end)
+
+    if not frequencies:
+        print(FAIL + "No hashtags found" + ENDC)
+        return
+
     mask = np.array(Image.open("Flag_of_Italy.png"))
-    wordcloud = WordCloud(background_color="black", mode="RGBA", max_words=1000, mask=mask).generate(hashtags)
+    wordcloud = WordCloud(background_color="black", mode="RGBA", max_words=1000, mask=mask).generate_from_frequencies(frequencies)
 
     # create coloring from image
     image_colors = ImageColorGenerator(mask)
@@ -286,14 +658,208 @@ def wordCloud():
     plt.imshow(wordcloud.recolor(color_func=image_colors), interpolation="bilinear")
     plt.axis("off")
 
-    plt.savefig("Plots/Wordcloud.png", format="png")
-    print(OKGREEN + " Saved in \"Plots/Wordcloud.png\"" + ENDC)
+    plt.savefig(filename, format="png")
+    plt.close()
+    print(OKGREEN + " Saved in \"" + filename + "\"" + ENDC)
     
 
-if __name__ == "__main__":
-    select_files()
-    tweets_retrieving()
-    statistics()
+"""
+    STAGES
+        Stages are run through a pipeline.Pipeline, each one declaring its inputs: a stage is executed only if its inputs changed since its last run, otherwise its outputs (plots, gexf files) are restored from Cache/Artifacts, and the tables it printed are printed again
+            tweets_retrieving   files selected (size and modification time)
+            statistics, plot    exclusion of neutral tweets, state of the aggregates (and Dates.txt)
+            graph_creation      state of the snapshot of tweets
+            wordCloud           state of the aggregates, mask image, days of the cloud
+        Snapshot and aggregates change only when tweets_retrieving reads new or modified files, so i.e. toggling the exclusion of neutral tweets executes statistics and plots only. "--force" executes every stage
+
+    SUBCOMMANDS
+        Each stage can be run on its own, without any prompt:
+            ingest      reads the given files (every RAW and DELTA file in the current directory, if none is given), updating the snapshot of the tweets and the per-day aggregates in Cache folder
+            stats       prints the statistics of every tweet analyzed (from the aggregates, nothing else is imported)
+            plot        plots the temporal variation of the sentiment
+            graph       writes the gexf files of the tweets analyzed (loaded from the snapshot)
+            wordcloud   renders the word cloud of hashtags, of every day or between "--start" and "--end"
+            all         every stage, as the interactive analysis does
+            serve       answers queries over HTTP/JSON, keeping the tweets in memory (see QUERY SERVICE)
+        Files given to any subcommand other than "ingest" are read first (only if new or changed, see tweets_retrieving), in chronological order, then the stage is run on every tweet analyzed.
+        "--keep-neutral" keeps neutral tweets in the statistics (they're discarded by default)
+
+    PROFILING
+        "--profile" measures each stage (elapsed time, peak memory of the process, see instrumentation.Metrics) with counters of files and tweets read, sentiment cache and graph size, saved as JSON (or CSV, if the file ends with ".csv") in "--metrics" file.
+        "--cprofile" dumps cProfile stats of each stage in the given folder as well (Logs/Profiles by default). Files selection and questions to the user are outside of the measured stages
+"""
+def load_tweets():
+    global tweets
+    snapshot = manifest.Snapshot()
+    tweets = snapshot.tweets(snapshot.selected)
+
+def run_stage(name, function, inputs, outputs=(), store=True, replay=False):
+    with metrics.stage(name):
+        if stages.run(name, inputs, function, outputs, store, replay):
+            metrics.count('stages_executed')
+        else:
+            print(OKCYAN + "Stage " + name + " is up to date, outputs restored" + ENDC)
+            print(stages.log, end="")
+            metrics.count('stages_skipped')
+
+# In chunked mode, the manifest of the partitions takes the place of the snapshot
+def snapshot_file():
+    return manifest.SNAPSHOT_FILE if chunkSize is None else partitions.MANIFEST_FILE
+
+def corpus_state():
+    return {'snapshot' : pipeline.file_input(snapshot_file(), content=False), 'aggregates' : pipeline.file_input(aggregates.AGGREGATES_FILE, content=False)}
+
+def ingest_stage():
+    retrieving = tweets_retrieving if chunkSize is None else tweets_chunked
+    run_stage('tweets_retrieving', lambda: retrieving(excludeNeutralTweets), {'files' : [[file, pipeline.file_input(file, content=False)] for file in files], 'chunked' : chunkSize is not None}, [snapshot_file(), aggregates.AGGREGATES_FILE], store=False)
+
+def statistics_stage():
+    run_stage('statistics', lambda: statistics(False), dict(corpus_state(), excludeNeutral=excludeNeutralTweets, resolution=resolution, window=window), replay=True)
+
+def plot_stage():
+    run_stage('plot', plots, dict(corpus_state(), excludeNeutral=excludeNeutralTweets, resolution=resolution, window=window, dates=pipeline.file_input("Dates.txt")), plot_files() + PERCENTILE_PLOT_FILES)
+
+# GEXF files are as large as the graph of quotes: they're only checked, not copied in the artifacts
+def graph_stage():
+    run_stage('graph_creation', graphs, {'snapshot' : corpus_state()['snapshot'], 'chunked' : chunkSize is not None}, ["GEXF/GEXF_*.gexf"], store=False, replay=True)
+
+def wordcloud_stage(start=None, end=None):
+    run_stage('wordCloud', lambda: wordCloud(start, end), {'aggregates' : corpus_state()['aggregates'], 'mask' : pipeline.file_input("Flag_of_Italy.png"), 'start' : start, 'end' : end}, ["Plots/Wordcloud.png"])
+
+def plots():
+    _, buckets, bucketStatistics = bucket_statistics()
+    if buckets:
+        plot(*bucketStatistics)
+        percentile_plot(*percentile_statistics()[1:])
+    else:
+        print(FAIL + "No tweets analyzed" + ENDC)
+
+# Graphs of the tweets read by tweets_retrieving, or of the snapshot (if skipped)
+def graphs():
+    if chunkSize is None and not len(tweets):
+        load_tweets()
     graph_creation()
-    wordCloud()
-    exit()
\ No newline at end of file
+
+"""
+    QUERY SERVICE
+        "serve" keeps the tweets in memory and answers queries over HTTP/JSON (per-day statistics, tweets of a user or hashtag, most shared tweets, quote subgraph of a day, plots), caching every answer (see query_server.py).
+        Every RAW and DELTA file in the current directory is read when the service starts, then checked every "--poll" seconds (or on POST /refresh): new or modified files are read as by "ingest", and if the snapshot changed the new tweets are served and the cached answers discarded.
+        Tweets are needed in memory, so the service isn't available in chunked mode
+"""
+# Files (with size and modification time) read by the last check of the query service
+servedFiles = None
+
+def serve_refresh():
+    global files
+    global servedFiles
+
+    state = [[file, pipeline.file_input(file, content=False)] for file in find_files()]
+    if state == servedFiles:
+        return tweets, False
+    servedFiles = state
+    files = [file for file, _ in state]
+
+    snapshot = pipeline.file_input(manifest.SNAPSHOT_FILE, content=False)
+    ingest_stage()
+    if not len(tweets):
+        load_tweets()
+    return tweets, pipeline.file_input(manifest.SNAPSHOT_FILE, content=False) != snapshot
+
+def serve(host, port, poll):
+    if chunkSize is not None:
+        print(FAIL + "The query service needs every tweet in memory, so it can't run in chunked mode" + ENDC)
+        return
+
+    service = query_server.QueryService(serve_refresh()[0], serve_refresh)
+    query_server.serve(service, host, port, poll)
+
+# Number of hours of "--resolution" and "--window" (at least 1)
+def hours(value):
+    value = int(value)
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be at least 1 hour, not " + str(value))
+    return value
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyzes sentiment and quote graph of tweets retrieved by tweet_fetcher.py (interactively, if no subcommand is given)")
+    parser.add_argument("--force", action="store_true", help="execute every stage, even if its inputs didn't change")
+    parser.add_argument("--chunked", nargs="?", type=int, const=partitions.CHUNK_SIZE, metavar="SIZE", help="read tweets in batches of SIZE (" + str(partitions.CHUNK_SIZE) + " by default), spilling them to disk, for corpora larger than memory")
+    parser.add_argument("--profile", action="store_true", help="measure time and memory of each stage, saving them in the metrics file")
+    parser.add_argument("--metrics", default=METRICS_FILE, metavar="FILE", help="JSON (or .csv) file of metrics (a new file in Logs folder by default)")
+    parser.add_argument("--cprofile", nargs="?", const=instrumentation.PROFILES_FOLDER, metavar="FOLDER", help="dump cProfile stats of each stage in FOLDER (" + instrumentation.PROFILES_FOLDER + " by default), implies --profile")
+
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands = {
+        'ingest' : "read tweets of the given files (every RAW and DELTA file, if none is given)",
+        'stats' : "print statistics of every tweet analyzed",
+        'plot' : "plot the temporal variation of the sentiment",
+        'graph' : "write gexf files of every tweet analyzed",
+        'wordcloud' : "render the word cloud of hashtags",
+        'all' : "run every stage, without any prompt",
+        'serve' : "answer queries over HTTP/JSON, keeping tweets in memory"
+    }
+    for command, description in commands.items():
+        subparser = subparsers.add_parser(command, help=description, description=description)
+        subparser.add_argument("files", nargs="*", help="files to read first" if command != 'ingest' else "files to read")
+        if command in ('stats', 'plot', 'all'):
+            subparser.add_argument("--keep-neutral", action="store_true", help="keep tweets with null sentiment in the statistics")
+            subparser.add_argument("--resolution", type=hours, metavar="HOURS", help="statistics of buckets of HOURS hours instead of days (or step of the rolling window, 1 hour by default)")
+            subparser.add_argument("--window", type=hours, metavar="HOURS", help="statistics of a rolling window of HOURS hours")
+        if command in ('wordcloud', 'all'):
+            subparser.add_argument("--start", type=datetime.fromisoformat, help="first day of the word cloud (yyyy-mm-dd)")
+            subparser.add_argument("--end", type=datetime.fromisoformat, help="last day of the word cloud (yyyy-mm-dd)")
+        if command == 'serve':
+            subparser.add_argument("--host", default=query_server.HOST, help="address to listen on (" + query_server.HOST + " by default)")
+            subparser.add_argument("--port", type=int, default=query_server.PORT, help="port to listen on (" + str(query_server.PORT) + " by default)")
+            subparser.add_argument("--poll", type=int, default=query_server.POLL_INTERVAL, metavar="SECONDS", help="seconds between two checks of new files (" + str(query_server.POLL_INTERVAL) + " by default, 0 to check only on POST /refresh)")
+    args = parser.parse_args()
+
+    metrics.enabled = args.profile or args.cprofile is not None
+    metrics.profiles = args.cprofile
+
+    global files
+    global excludeNeutralTweets
+    global stages
+    global chunkSize
+    global resolution
+    global window
+    stages = pipeline.Pipeline(force=args.force)
+    chunkSize = args.chunked
+    resolution = getattr(args, 'resolution', None)
+    window = getattr(args, 'window', None)
+    if args.command is None:
+        select_files()
+        excludeNeutralTweets = ask_exclude_neutral()
+        ingest_stage()
+        statistics_stage()
+        plot_stage()
+        graph_stage()
+        wordcloud_stage()
+    else:
+        excludeNeutralTweets = not getattr(args, 'keep_neutral', False)
+        files = sorted(args.files, key=os.path.getmtime) if args.files else []
+        if args.command in ('ingest', 'all') and not files:
+            files = find_files()
+        if files:
+            ingest_stage()
+
+        start = getattr(args, 'start', None) and args.start.date()
+        end = getattr(args, 'end', None) and args.end.date()
+        if args.command in ('stats', 'all'):
+            statistics_stage()
+        if args.command in ('plot', 'all'):
+            plot_stage()
+        if args.command in ('graph', 'all'):
+            graph_stage()
+        if args.command in ('wordcloud', 'all'):
+            wordcloud_stage(start, end)
+        if args.command == 'serve':
+            serve(args.host, args.port, args.poll)
+
+    if metrics.enabled:
+        metrics.save(args.metrics)
+        print(OKGREEN + "Metrics saved in \"" + args.metrics + "\"" + ENDC)
+
+if __name__ == "__main__":
+    main()
+    exit()
@@ -0,0 +1,77 @@
+"""
+tweet_converter.py is a python script used to migrate files downloaded by tweet_fetcher.py to another of the formats supported by tweet_io.py (see tweet_io.FORMATS), i.e. to convert old RAW dumps to compact JSON Lines or parquet files.
+
+The converted file keeps the same name, with the extension of the new format, and the same modification time, so that tweet_analyzer.py keeps reading files in the same (chronological) order.
+The original file is kept, renamed with the ORIGINAL_PREFIX (i.e. "(ORIGINAL) (RAW) Tweets ... .json"), which tweet_analyzer.py doesn't read (it would read both files, and every tweet twice). It's removed only if "--delete" is given, which is refused with "--project", since a projected file lacks every field not used by tweet_analyzer.py.
+
+Usage:
+    python tweet_converter.py --format jsonl.gz [--project | --delete] [files...]
+
+If no file is specified, every RAW file in the current directory is converted.
+"""
+
+import os
+import re
+import argparse
+
+import tweet_io
+
+# Color ASCII used to change color of prints
+OKGREEN = '\033[92m'
+WARNING = '\033[93m'
+ENDC = '\033[0m' # De-select the current color
+
+# Prefix of the original files kept after conversion, not matching tweet_io.RAW_FILE_PATTERN
+ORIGINAL_PREFIX = "(ORIGINAL) "
+
+"""
+    Converts a single file, returning the name of the new file
+"""
+def convert(filename, fmt, project):
+    extension = tweet_io.FORMATS[tweet_io.file_format(filename)]
+    converted = filename[:-len(extension)] + tweet_io.FORMATS[fmt]
+
+    if converted == filename:
+        print(WARNING + filename + " is already in " + fmt + " format" + ENDC)
+        return filename
+
+    print("Converting " + filename + "... ", end="")
+    count = 0
+    with tweet_io.TweetWriter(converted, project) as writer:
+        for tweet in tweet_io.read_tweets(filename):
+            writer.write(tweet)
+            count += 1
+
+    stat = os.stat(filename)
+    os.utime(converted, (stat.st_atime, stat.st_mtime))
+    print(OKGREEN + str(count) + " tweets written in " + converted + " (" + str(round(os.path.getsize(converted) / stat.st_size * 100, 1)) + "% of the original size)" + ENDC)
+
+    return converted
+
+def main(args=None):
+    argparser = argparse.ArgumentParser(description="Convert files downloaded by tweet_fetcher.py to another format")
+    argparser.add_argument("--format", choices=tweet_io.FORMATS.keys(), default='jsonl.gz', help="format of the converted files (jsonl.gz by default)")
+    argparser.add_argument("--project", action="store_true", help="keep only the fields used by tweet_analyzer.py (always done for parquet)")
+    argparser.add_argument("--delete", action="store_true", help="delete the original files (they're kept by default, renamed with the \"" + ORIGINAL_PREFIX.strip() + "\" prefix), not allowed with --project")
+    argparser.add_argument("files", nargs="*", help="files to convert (every RAW file in the current directory by default)")
+    args = argparser.parse_args(args)
+
+    # Fields dropped by the projection (or by parquet schema) would be lost for good
+    if args.delete and (args.project or args.format == 'parquet'):
+        argparser.error("--delete can't be used with --project (or parquet format): the original files are the only copy of the fields dropped")
+
+    files = args.files or [f for f in sorted(os.listdir('.'), key=os.path.getmtime) if os.path.isfile(f) and re.match(tweet_io.RAW_FILE_PATTERN, f)]
+
+    for filename in files:
+        converted = convert(filename, args.format, args.project)
+        if converted == filename:
+            continue
+        if args.delete:
+            os.remove(filename)
+        else:
+            kept = os.path.join(os.path.dirname(filename), ORIGINAL_PREFIX + os.path.basename(filename))
+            os.replace(filename, kept)
+            print("Original file kept as " + kept)
+
+if __name__ == "__main__":
+    main()
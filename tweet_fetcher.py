@@ -3,64 +3,88 @@ tweet_fectcher.py is a python script used to retrieve tweets with user-defined k
 
 Using specific credentials (CREDENTIALS RETRIEVING section), a connection is established (AUTHENTICATION section), in order to allow the user to define his own query (QUERY DEFINITION section).
 The script uses internal parameters (INITIALIZING PARAMETERS section) to handle data retrieved (PROCESSING QUERY)
+
+An interrupted download can be continued with "--resume", reading the query and the progress of each day from its checkpoint (CHECKPOINTS section)
+Many queries can be retrieved in a single run, without any prompt, with "--config" (BATCH MODE section)
+Engagement counts of tweets already retrieved can be refreshed with "--refresh" (ENGAGEMENT REFRESH section)
 """
 
 import tweepy
 import datetime as dt
 import re
-import time
 import os
 import sys
 import traceback
-from prettytable import PrettyTable
+import argparse
 import json
+import glob
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from prettytable import PrettyTable
+import tweet_io
+import rate_limiter
+import instrumentation
+
+CREDENTIALS_FILE = "Keys of Twitter application.txt"
+CHECKPOINTS_FOLDER = "Checkpoints"
+
+# Number of days fetched concurrently (by default)
+FETCH_WORKERS = 4
+
+day = dt.timedelta(days=1)
+
+# Instrumentation of the run, enabled by "--profile" (see PROFILING section)
+metrics = instrumentation.Metrics()
+METRICS_FILE = os.path.join("Logs", "Metrics of tweet_fetcher (" + str(dt.datetime.now()) + ").json")
 
-""" 
+"""
 CREDENTIALS RETRIEVING
 
 Credentials are stored in a text file named "Keys of Twitter application.txt", that
 is read line-by-line, storing keys read in respective variables
 """
+def read_credentials(filename=CREDENTIALS_FILE):
+    Credentials = {}
 
-Credentials = {}
+    print("Opening credential text file... ", end="")
+    with open(filename, "r") as f:
+        for line in f:
 
-print("Opening credential text file... ", end="")
-with open("Keys of Twitter application.txt", "r") as f:
-    for line in f:
+            if line.startswith("API key:"):
+                Credentials["CONSUMER_KEY"] = line.split(": ")[1].replace("\n", "")
 
-        if line.startswith("API key:"):
-            Credentials["CONSUMER_KEY"] = line.split(": ")[1].replace("\n", "")
+            if line.startswith("API key secret:"):
+                Credentials["CONSUMER_SECRET"] = line.split(": ")[1].replace("\n", "")
 
-        if line.startswith("API key secret:"):
-            Credentials["CONSUMER_SECRET"] = line.split(": ")[1].replace("\n", "")
+            if line.startswith("Access token: "):
+                Credentials["ACCESS_TOKEN"] = line.split(": ")[1].replace("\n", "")
 
-        if line.startswith("Access token: "):
-            Credentials["ACCESS_TOKEN"] = line.split(": ")[1].replace("\n", "")
+            if line.startswith("Access token secret: "):
+                Credentials["ACCESS_TOKEN_SECRET"] = line.split(": ")[1].replace("\n", "")
 
-        if line.startswith("Access token secret: "):
-            Credentials["ACCESS_TOKEN_SECRET"] = line.split(": ")[1].replace("\n", "")
+    print("Credentials retrieved")
+    for key, value in Credentials.items():
+        print(key + ": " + value)
 
-print("Credentials retrieved")
-for key, value in Credentials.items():
-    print(key + ": " + value)
+    print("")
+    return Credentials
 
-print("")
-
-""" 
-AUTHENTICATION 
-
-Using retrieved credentials, authentication is made
 """
+AUTHENTICATION
 
-print("Authenticating... ", end="")
-# Consumer Key and Secret
-auth = tweepy.OAuthHandler(Credentials["CONSUMER_KEY"], Credentials["CONSUMER_SECRET"])
-# Access Token and Secret
-auth.set_access_token(Credentials["ACCESS_TOKEN"], Credentials["ACCESS_TOKEN_SECRET"])
-api = tweepy.API(auth, wait_on_rate_limit=True, wait_on_rate_limit_notify = True)
-print("Authenticated")
+Using retrieved credentials, authentication is made (once per run: the same handler is used by every query, and by every thread)
+"""
+def authenticate(Credentials):
+    print("Authenticating... ", end="")
+    # Consumer Key and Secret
+    auth = tweepy.OAuthHandler(Credentials["CONSUMER_KEY"], Credentials["CONSUMER_SECRET"])
+    # Access Token and Secret
+    auth.set_access_token(Credentials["ACCESS_TOKEN"], Credentials["ACCESS_TOKEN_SECRET"])
+    print("Authenticated")
 
-print("")
+    print("")
+    return auth
 
 """
 QUERY DEFINITION
@@ -72,80 +96,397 @@ Retweets can be filtered by the API (suggested, because retweets have reduced ut
 
 Start date of retrieving (by default, 8 days before)
 
-https://docs.tweepy.org/en/v3.10.0/api.html#tweepy-api-twitter-api-wrapper 
-(api.search(), 'until' parameter)
-"""
-
-keywords = input("Insert the keywords of interest: ")
+Format of the file containing the tweets (see tweet_io.FORMATS): 'raw' pretty-printed json (by default), JSON Lines (plain, gzip or zstandard compressed) or parquet.
+Tweets can be projected to the fields used by tweet_analyzer.py, dropping the nested user object and the other unused fields, for a much slimmer storage
 
-retweets = True
-if input("Do you want to retrieve retweets?[y/N]: ") != ("y" or "Y"):
-    retweets = False
-    keywords += " -filter:retweets"
-
-
-day = dt.timedelta(days=1)
-default_start_date = dt.date.today()-(day*8)
-start_date = input("Insert the data you want to start searching by (yyyy-mm-dd)[" + str(default_start_date) + " by default]: ")
+A query is a dictionary with keys 'keywords', 'retweets', 'start_date', 'end_date', 'tweets_to_retrieve', 'output_format' and 'project'
 
-if start_date == "":
-    start_date = default_start_date
-else:
-    start_date = start_date.split('-')
-    start_date = dt.date(int(start_date[0]), int(start_date[1]), int(start_date[2]))
+https://docs.tweepy.org/en/v3.10.0/api.html#tweepy-api-twitter-api-wrapper
+(api.search(), 'until' parameter)
+"""
+def define_query():
+    keywords = input("Insert the keywords of interest: ")
+
+    retweets = True
+    if input("Do you want to retrieve retweets?[y/N]: ") != ("y" or "Y"):
+        retweets = False
+        keywords += " -filter:retweets"
+
+    default_start_date = dt.date.today()-(day*8)
+    start_date = input("Insert the data you want to start searching by (yyyy-mm-dd)[" + str(default_start_date) + " by default]: ")
+
+    if start_date == "":
+        start_date = default_start_date
+    else:
+        start_date = start_date.split('-')
+        start_date = dt.date(int(start_date[0]), int(start_date[1]), int(start_date[2]))
+
+    end_date = dt.date.today()
+
+    try:
+        tweets_to_retrieve = int(input("How many Tweets do you want to retrieve PER DAY?[1000 by default]: "))
+    except:
+        tweets_to_retrieve = 1000
+
+    if tweets_to_retrieve <= 0:
+        tweets_to_retrieve = 1000
+
+    output_format = input("Which format do you want to save tweets in? [" + "/".join(tweet_io.FORMATS.keys()) + "](raw by default): ")
+    if output_format not in tweet_io.FORMATS:
+        output_format = 'raw'
+
+    # Parquet files are always projected
+    project = (output_format == 'parquet' or input("Do you want to keep only the fields used by tweet_analyzer.py?[y/N]: ") in ("y", "Y"))
+
+    return {
+        'keywords' : keywords,
+        'retweets' : retweets,
+        'start_date' : start_date,
+        'end_date' : end_date,
+        'tweets_to_retrieve' : tweets_to_retrieve,
+        'output_format' : output_format,
+        'project' : project
+    }
+
+def print_queries(queries):
+    qt = PrettyTable()
+    qt.field_names = ["Keywords", "Start", "End", "Retweets?", "# Tweets to retrieve per day", "# Total Tweets", "Format", "Projected?"]
+    for query in queries:
+        total_days = (query['end_date'] + day - query['start_date']).days
+        qt.add_row([str(query['keywords']), str(query['start_date']), str(query['end_date']), str(query['retweets']), str(query['tweets_to_retrieve']), str(query['tweets_to_retrieve'] * total_days), query['output_format'], str(query['project'])])
+    print(qt)
 
-end_date = dt.date.today()
-total_days = (end_date + day - start_date).days
+"""
+BATCH MODE
+
+"--config" reads a list of queries from a YAML (.yaml/.yml, requires 'PyYAML' package) or JSON file, and retrieves all of them in the same run, without any prompt:
+
+    workers: 8                  # days fetched concurrently (optional, overridden by "--workers")
+    defaults:                   # values used by every query (optional)
+        tweets_per_day: 1000
+        format: jsonl.gz
+    queries:
+        - name: draghi          # names the checkpoint of the query (keywords by default)
+          keywords: Mario Draghi
+          retweets: false       # false by default
+          start_date: 2021-02-20
+          end_date: 2021-02-27  # today by default
+          tweets_per_day: 500   # 1000 by default
+          format: parquet       # raw by default
+          project: true         # false by default
+
+A file containing only the list of queries is accepted as well.
+Every query is written in its own files, while the credentials are read (and the authentication made) only once, and a single rate_limiter.FairShareLimiter
+grants requests to the queries in turn, so each query gets a fair share of the quota.
+The checkpoint of a query is named after the query itself, and it's kept even when the query is completed, so running the same batch again resumes
+every query not completed yet, skipping the others (delete its checkpoint to retrieve a query again).
+"""
+def load_config(filename):
+    with open(filename, "r") as c:
+        if filename.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("'PyYAML' package is required to read .yaml files (pip install pyyaml)")
+            config = yaml.safe_load(c)
+        else:
+            config = json.load(c)
+
+    if isinstance(config, list):
+        config = {'queries' : config}
+
+    defaults = config.get('defaults') or {}
+    queries = [batch_query(dict(defaults, **entry)) for entry in config['queries']]
+
+    return queries, config.get('workers')
+
+def date_of(value):
+    if isinstance(value, dt.date):
+        return value
+    return dt.date.fromisoformat(str(value))
+
+def batch_query(entry):
+    keywords = entry['keywords']
+    retweets = bool(entry.get('retweets', False))
+    if not retweets:
+        keywords += " -filter:retweets"
+
+    output_format = entry.get('format', 'raw')
+    if output_format not in tweet_io.FORMATS:
+        raise ValueError("Unknown format " + str(output_format) + " of query " + str(entry['keywords']))
+
+    return {
+        'name' : str(entry.get('name', entry['keywords'])),
+        'keywords' : keywords,
+        'retweets' : retweets,
+        'start_date' : date_of(entry.get('start_date', dt.date.today()-(day*8))),
+        'end_date' : date_of(entry.get('end_date', dt.date.today())),
+        'tweets_to_retrieve' : int(entry.get('tweets_per_day', 1000)),
+        'output_format' : output_format,
+        'project' : output_format == 'parquet' or bool(entry.get('project', False))
+    }
 
-try:
-    tweets_to_retrieve = int(input("How many Tweets do you want to retrieve PER DAY?[1000 by default]: "))
-except:
-    tweets_to_retrieve = 1000
+"""
+CHECKPOINTS
+
+While tweets are retrieved, a checkpoint (json file in Checkpoints folder, named after the RAW file) records the query and, for each day:
+    - 'max_id', the id below which tweets of the day still have to be retrieved (as string, None if no tweet has been retrieved yet)
+    - 'num_tweets', the number of tweets of the day already written
+    - 'completed', true if every tweet of the day has been retrieved
+    - 'raw_size' and 'log_size' are the sizes of the RAW file and of the log file when the checkpoint was saved
+
+The checkpoint is saved (replacing the previous one atomically) only after the tweets it accounts for have been written, so a resumed download first truncates
+both files to the recorded sizes, dropping anything written after the checkpoint, and then continues each day from its 'max_id': no tweet is downloaded twice.
+The checkpoint is deleted once every day is completed (except in batch mode).
+Parquet files can't be appended, nor read before being closed: a resumed download writes a new "part" file, and its checkpoint is saved only when the file is closed
+(after a Twitter error or an interruption from keyboard), so a killed download of a parquet file restarts from the previous checkpoint.
+"""
+def save_checkpoint(filename, checkpoint):
+    with open(filename + ".tmp", "w") as c:
+        json.dump(checkpoint, c, indent = 4)
+    os.replace(filename + ".tmp", filename)
+
+def load_checkpoint(filename):
+    with open(filename, "r") as c:
+        return json.load(c)
+
+def completed(checkpoint):
+    return all(dayProgress['completed'] for dayProgress in checkpoint['days'].values())
+
+def latest_checkpoint():
+    checkpoints = [checkpointFile for checkpointFile in glob.glob(os.path.join(CHECKPOINTS_FOLDER, "*.checkpoint")) if not completed(load_checkpoint(checkpointFile))]
+    if not checkpoints:
+        sys.exit("No checkpoint to resume in " + CHECKPOINTS_FOLDER + " folder")
+    return max(checkpoints, key=os.path.getmtime)
+
+def new_checkpoint(query):
+    keywords = query['keywords']
+    start_date = query['start_date']
+    tweets_to_retrieve = query['tweets_to_retrieve']
+    total_days = (query['end_date'] + day - start_date).days
+
+    return {
+        'keywords' : keywords,
+        'retweets' : query['retweets'],
+        'start_date' : str(start_date),
+        'end_date' : str(query['end_date']),
+        'tweets_to_retrieve' : tweets_to_retrieve,
+        'output_format' : query['output_format'],
+        'project' : query['project'],
+        'RAWTweetFile' : "(RAW) Tweets (" + keywords + ") by " + str(start_date) +" (" + str(dt.datetime.now()) + ") #" + str(tweets_to_retrieve) + tweet_io.FORMATS[query['output_format']],
+        'TweetFile' : "Logs/Tweets (" + keywords + ") by " + str(start_date) +" (" + str(dt.datetime.now()) + ") #" + str(tweets_to_retrieve) +".txt",
+        'days' : {str(start_date + day * i) : {'max_id' : None, 'num_tweets' : 0, 'completed' : False} for i in range(total_days)}
+    }
+
+def checkpoint_query(checkpoint):
+    return {
+        'keywords' : checkpoint['keywords'],
+        'retweets' : checkpoint['retweets'],
+        'start_date' : dt.date.fromisoformat(checkpoint['start_date']),
+        'end_date' : dt.date.fromisoformat(checkpoint['end_date']),
+        'tweets_to_retrieve' : checkpoint['tweets_to_retrieve'],
+        'output_format' : checkpoint['output_format'],
+        'project' : checkpoint['project']
+    }
 
-if tweets_to_retrieve <= 0:
-    tweets_to_retrieve = 1000
+"""
+    Parquet files are written under a temporary name (starting with "(TMP)", so not matching tweet_io.RAW_FILE_PATTERN, and overwritten by the next attempt if the download is killed), renamed when closed.
+    A resumed download writes a new "part" file, named after the RAW file of the checkpoint (which never changes), so parts of many resumes don't nest their names
+"""
+def temporary_file(RAWTweetFile):
+    return "(TMP) " + RAWTweetFile
 
-qt = PrettyTable()
-qt.field_names = ["Keywords", "Start", "Retweets?", "# Tweets to retrieve per day", "# Total Tweets"]
-qt.add_row([str(keywords), str(start_date), str(retweets), str(tweets_to_retrieve), str(tweets_to_retrieve * total_days)])
-print(qt)
+def part_file(RAWTweetFile):
+    return RAWTweetFile[:-len(".parquet")] + " (part " + str(dt.datetime.now()) + ").parquet"
 
 """
 INITIALIZING PARAMETERS
 
-'pt' is the PrettyTable used to store data (to print in text file)
-'RAWTweetFile' is the file that will contain the gross representation of tweets retrieved
-'TweetFile' contains the PrettyTable representation, for a clearer view for manual analysis
-'num_tweets' is the tweets retrieved counter is initialized
-'seconds_to_wait' specify how many seconds awaiting at each "chunk" (100 tweets) to avoit rate limit exceeding 
-(cooldown is about 20 minutes). This is done because of the connection expiring for too long inactivity.
+A Download holds the state of the retrieving of a query:
+'RAWTweetFile' is the file that will contain the gross representation of tweets retrieved, written by a tweet_io.TweetWriter in the chosen format
+(a resumed download appends to it, except for parquet files, which can't be appended: remaining tweets are written in a new "part" file, see part_file)
+'TweetFile' contains a row for each tweet, for a clearer view for manual analysis (both files are written, and flushed, as tweets arrive)
+'checkpoint' is the state of the download, saved in 'checkpointFile' (see CHECKPOINTS section), and 'progress' its state of each day
+'buffered' holds pages of days following the one being written ('current'), 'num_tweets' and 'completed' the number of tweets and the completion of each day
+'stop' tells the threads fetching its days to quit after an error, while 'keep' keeps the checkpoint once the download is completed
 """
-pt = PrettyTable()
-pt.field_names = ["ID", "Date(YYYY-MM-DD)", "Username", "Tweet text", "Favourites Count", "Retweets Count", "Quotes Tweet"]
-pt.align = "l"
-
-RAWTweetFile = "(RAW) Tweets (" + keywords + ") by " + str(start_date) +" (" + str(dt.datetime.now()) + ") #" + str(tweets_to_retrieve) +".json"
-TweetFile = "Logs/Tweets (" + keywords + ") by " + str(start_date) +" (" + str(dt.datetime.now()) + ") #" + str(tweets_to_retrieve) +".txt"
-
-fr = open(RAWTweetFile, "w+")
-f = open(TweetFile, "w+")
-
-# seconds to wait for each tweet to don't exceed rate limit (300 tweets every 15 minutes, 1 tweet every 3 seconds).
-# if tweets to retrieve in total are less than 300, there is no need to slow download
-seconds_to_wait = 0
-if (tweets_to_retrieve) * total_days > 300:
-    seconds_to_wait = 3
-
-print("Pause per tweet is of " + str(seconds_to_wait) + " seconds")
+class Download:
+    fields = ["ID", "Date(YYYY-MM-DD)", "Username", "Tweet text", "Favourites Count", "Retweets Count", "Quotes Tweet"]
+
+    def __init__(self, checkpointFile, checkpoint, resume=False, keep=False):
+        self.checkpointFile = checkpointFile
+        self.keep = keep
+        self.checkpoint = checkpoint
+        self.query = checkpoint_query(checkpoint)
+        self.output_format = checkpoint['output_format']
+        self.TweetFile = checkpoint['TweetFile']
+
+        if resume:
+            # Anything written after the checkpoint was saved is dropped
+            with open(self.TweetFile, "r+b") as f:
+                f.truncate(checkpoint['log_size'])
+            if self.output_format == 'parquet':
+                self.RAWTweetFile = part_file(checkpoint['RAWTweetFile'])
+                self.fr = tweet_io.TweetWriter(temporary_file(checkpoint['RAWTweetFile']), checkpoint['project'])
+            else:
+                self.RAWTweetFile = checkpoint['RAWTweetFile']
+                with open(self.RAWTweetFile, "r+b") as f:
+                    f.truncate(checkpoint['raw_size'])
+                self.fr = tweet_io.TweetWriter(self.RAWTweetFile, checkpoint['project'], append=True)
+            self.f = open(self.TweetFile, "a")
+        else:
+            self.RAWTweetFile = checkpoint['RAWTweetFile']
+            self.fr = tweet_io.TweetWriter(temporary_file(self.RAWTweetFile) if self.output_format == 'parquet' else self.RAWTweetFile, checkpoint['project'])
+            self.f = open(self.TweetFile, "w+")
+            self.f.write(" | ".join(self.fields) + "\n")
+
+        self.progress = checkpoint['days']
+        # A day whose tweets were all written before the interruption is completed without requesting it again
+        for dayProgress in self.progress.values():
+            if dayProgress['num_tweets'] >= self.query['tweets_to_retrieve']:
+                dayProgress['completed'] = True
+        self.days = [dt.date.fromisoformat(date) for date in self.progress]
+        self.total_days = len(self.days)
+        self.buffered = [[] for _ in self.days]
+        self.num_tweets = [self.progress[str(date)]['num_tweets'] for date in self.days]
+        self.completed = [self.progress[str(date)]['completed'] for date in self.days]
+        self.current = 0
+        self.failed = False
+        self.stop = threading.Event()
+
+        os.makedirs(CHECKPOINTS_FOLDER, exist_ok=True)
+        self.advance()
+        self.commit()
+        save_checkpoint(self.checkpointFile, self.checkpoint)
+
+    @property
+    def done(self):
+        return self.failed or self.current == self.total_days
+
+    """
+        Makes the tweets written so far durable (see tweet_io.TweetWriter.checkpoint), then saves the checkpoint accounting for them
+    """
+    def commit(self):
+        self.fr.checkpoint()
+        self.f.flush()
+        self.checkpoint['log_size'] = self.f.tell()
+
+        # A parquet file is readable only once closed, so its checkpoint is saved only then (a killed download is resumed from the previous checkpoint)
+        if self.output_format != 'parquet':
+            self.checkpoint['raw_size'] = os.path.getsize(self.RAWTweetFile)
+            save_checkpoint(self.checkpointFile, self.checkpoint)
+
+    def write_tweet(self, tweet):
+        # For convenience, ID is retrieved by id_str field, which is the string format of tweet ID
+        id = tweet.id_str
+
+        # date is extracted, keeping only yyyy-mm-dd informations (first 10 characters)
+        date = str(tweet.created_at)[:10]
+
+        user_name = str(tweet.user.name)
+
+        # full text of the tweet is (from inside to outside):
+        # deprived of "\n" to keep all text on a single line (replace builtin function call)
+        # deprived of urls(re.sub external function call)
+        full_text = re.sub(r"http\S+", "", tweet.full_text.replace("\n", ""))
+
+        favourites_count = str(tweet.favorite_count)
+
+        retweets_count = str(tweet.retweet_count)
+
+        quoted = ""
+        if tweet.is_quote_status == True:
+            quoted = tweet.quoted_status_id_str + " | " + tweet.quoted_status.user.name + " | " + tweet.quoted_status.full_text
+
+        #fr.write(str(tweet) + "\n")
+        self.fr.write(tweet._json)
+
+        self.f.write(" | ".join([id, date, user_name, full_text, favourites_count, retweets_count, quoted]) + "\n")
+
+    def write_page(self, index, page):
+        # An empty page moves nothing forward ('max_id' included)
+        if not page:
+            return
+
+        for tweet in page:
+            self.write_tweet(tweet)
+
+        dayProgress = self.progress[str(self.days[index])]
+        dayProgress['max_id'] = str(min(tweet.id for tweet in page) - 1)
+        dayProgress['num_tweets'] += len(page)
+        self.commit()
+
+    def complete(self, index):
+        self.progress[str(self.days[index])]['completed'] = True
+        self.commit()
+        print("Got " + str(self.num_tweets[index]) + " tweets of " + str(self.days[index]) + " (" + self.query['keywords'] + ")")
+
+    # Moves to the first day not completed, writing pages buffered for it
+    def advance(self):
+        while self.current < self.total_days and self.completed[self.current]:
+            self.current += 1
+            if self.current < self.total_days:
+                for page in self.buffered[self.current]:
+                    self.write_page(self.current, page)
+                self.buffered[self.current] = []
+                if self.completed[self.current] and not self.progress[str(self.days[self.current])]['completed']:
+                    self.complete(self.current)
+
+    """
+        Receives a page of tweets of the day 'index' (None when the day is completed)
+    """
+    def receive(self, index, page):
+        if self.failed:
+            return
+
+        if page is None:
+            self.completed[index] = True
+            if index == self.current:
+                self.complete(index)
+        else:
+            self.num_tweets[index] += len(page)
+            if index == self.current:
+                self.write_page(index, page)
+            else:
+                self.buffered[index].append(page)
+
+        self.advance()
+
+    """
+        Stops the download after an error: tweets already written are kept, while pages buffered for the following days are dropped, since writing them before the current day is completed would break the order of days in the file.
+        The checkpoint of those days still has the 'max_id' of their last page written, so a resumed download fetches the dropped pages again
+    """
+    def fail(self):
+        print("Error occurred, saving and quitting \"" + self.query['keywords'] + "\"...")
+        self.stop.set()
+        self.buffered = [[] for _ in self.days]
+        self.failed = True
+
+    def finish(self):
+        self.fr.close()
+        self.f.close()
+        # A parquet file is complete only once closed, so only then it gets a name read by tweet_analyzer.py
+        if self.output_format == 'parquet':
+            os.replace(temporary_file(self.checkpoint['RAWTweetFile']), self.RAWTweetFile)
+
+        if not completed(self.checkpoint):
+            save_checkpoint(self.checkpointFile, self.checkpoint)
+            print("Download interrupted, checkpoint saved in \"" + self.checkpointFile + "\"")
+        elif self.keep:
+            save_checkpoint(self.checkpointFile, self.checkpoint)
+        else:
+            os.remove(self.checkpointFile)
+
+        print("Tweets saved in \"" + self.TweetFile +"\" and \"" + self.RAWTweetFile + "\"")
 
 """
 PROCESSING QUERY
 
 Tweets are stored in two format:
 
-- Raw tweets, stored in the RAW file named consequently 
+- Raw tweets, stored in the RAW file named consequently (in the chosen format)
 
-- Tweets stored in a pretty table, to allow manual analysis, in a format containing:
+- Tweets stored in a text file (a row per tweet, with fields separated by " | "), to allow manual analysis, in a format containing:
     - id_str of the tweet
     - created_at "yyyy-mm-dd", with of 10 characters length (standard date record of a tweet contains hh:mm:ss in addition, not requested for this project)
     - user name of who created the tweet
@@ -155,77 +496,263 @@ Tweets are stored in two format:
 
     Only tweets written in italian are considered (lang="it")
     tweet_mode parameter specifies the type of Status object returned, which is "extended", to allow retrieving full text of tweet
+    count parameter asks for pages of 100 tweets (the maximum), so that the fewest requests are made
+
+Days are fetched concurrently by 'workers' threads, each with its own Cursor (and its own API object, so that it reads the headers
+of its own responses), while a single limiter shares the rate quota among them: time is bound by the quota, not by the latency of requests.
+Requests are paced by the limiter (see rate_limiter.RateLimiter): each request returns a page of up to 100 tweets, and requests are made as soon
+as the quota (read from the rate limit headers of every response) allows, waiting only when it's exhausted.
+Pages are sent to the main thread as they arrive, where they are written right away if they belong to the earliest day not yet completed,
+otherwise they're kept until every previous day is completed, so tweets of each day are written in the same order of a serial fetch.
+
+The checkpoint is saved after every page written, and when a day is completed. A resumed download skips completed days (and days whose tweets were
+all written, even if interrupted before being marked as completed), and continues the others from their 'max_id', retrieving only the tweets still missing.
 """
 
+# Headers of the response of a rate limit error ("Too Many Requests"), None for any other error
+def rate_limit_headers(e):
+    response = getattr(e, 'response', None)
+    if isinstance(e, tweepy.RateLimitError) or (response is not None and response.status_code == 429):
+        return response.headers if response is not None else {}
+    return None
 
-print("Retrieving, please wait...")
-try:
-    while start_date <= end_date:
-        print("Getting tweets of : " + str(start_date))
-        tweets = tweepy.Cursor(api.search, 
-                            q=keywords,
+"""
+    Fetches tweets of a day of a download, sending (download, index of the day, page) to 'pageQueue', then (download, index, None) when the day is completed, or (download, index, exception) after an error
+"""
+def fetch_day(auth, limiter, download, index, pageQueue):
+    try:
+        if download.stop.is_set():
+            return
+
+        date = download.days[index]
+        query = download.query
+        print("Getting tweets of : " + str(date) + " (" + query['keywords'] + ")")
+        dayApi = tweepy.API(auth)
+        dayProgress = download.progress[str(date)]
+        pages = tweepy.Cursor(dayApi.search,
+                            max_id=dayProgress['max_id'],
+                            q=query['keywords'],
                             lang="it",
-                            since=str(start_date),
-                            until=str(start_date+day),
+                            since=str(date),
+                            until=str(date+day),
                             tweet_mode="extended",
+                            count=100,
                             #include_rts = retweets,
-                            monitor_rate_limit=True, 
-                            wait_on_rate_limit=True,
-                            wait_on_rate_limit_notify = True,
                             retry_count = 5, #retry 5 times
                             retry_delay = 60, #seconds to wait for retry
-                            retry_errors=set([401, 404, 429, 500, 503])
-        ).items(tweets_to_retrieve)
-
-        start_date += day # date goes forward of 1 day
-        num_tweets = 0
-
-        for tweet in tweets:
-            num_tweets+=1
+                            retry_errors=set([500, 502, 503, 504])
+        ).pages()
 
-            # For convenience, ID is retrieved by id_str field, which is the string format of tweet ID
-            id = tweet.id_str
+        num_tweets = dayProgress['num_tweets']
+        tweets_to_retrieve = query['tweets_to_retrieve']
 
-            # date is extracted, keeping only yyyy-mm-dd informations (first 10 characters)
-            date = str(tweet.created_at)[:10]
+        # Each page costs a request to the API, so the limiter is applied to pages (a rate limit error requests the same page again)
+        for page in rate_limiter.paginate(limiter, pages.next, lambda: dayApi.last_response.headers, rate_limit_headers):
+            if download.stop.is_set():
+                return
 
-            user_name = str(tweet.user.name)
+            page = page[:tweets_to_retrieve - num_tweets]
+            num_tweets += len(page)
+            pageQueue.put((download, index, page))
 
-            # full text of the tweet is (from inside to outside):
-            # deprived of "\n" to keep all text on a single line (replace builtin function call)
-            # deprived of urls(re.sub external function call)
-            full_text = re.sub(r"http\S+", "", tweet.full_text.replace("\n", ""))
+            # Stop before requesting another page
+            if num_tweets == tweets_to_retrieve:
+                break
 
-            favourites_count = str(tweet.favorite_count)
+        pageQueue.put((download, index, None))
+    except Exception as e:
+        pageQueue.put((download, index, e))
 
-            retweets_count = str(tweet.retweet_count)
-
-            quoted = ""
-            if tweet.is_quote_status == True:
-                quoted = tweet.quoted_status_id_str + " | " + tweet.quoted_status.user.name + " | " + tweet.quoted_status.full_text
-
-            #fr.write(str(tweet) + "\n")
-            json.dump(tweet._json, fr, sort_keys = True, indent = 4)
-
-            pt.add_row([id, date, user_name, full_text, favourites_count, retweets_count, quoted])
-
-            time.sleep(seconds_to_wait)
-
-        time.sleep(seconds_to_wait)
-        print("Got " + str(num_tweets) + " tweets for this day")
+"""
+    Retrieves every download, with a pool of 'workers' threads
 
-except tweepy.error.TweepError:
-    traceback.print_exc() 
-    print("Error occurred, saving and quitting...")
+        Days of different downloads are interleaved (first days of every download, then second days, and so on), and the limiter grants requests to downloads in turn.
+        A Twitter error stops only the download it belongs to, while an interruption from keyboard stops every download (all of them can be resumed)
+"""
+def run(downloads, auth, workers=FETCH_WORKERS):
+    limiter = rate_limiter.FairShareLimiter()
+    pageQueue = queue.Queue()
+
+    print("Retrieving, please wait...")
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for index in range(max(download.total_days for download in downloads)):
+            for download in downloads:
+                if index < download.total_days and not download.completed[index]:
+                    executor.submit(fetch_day, auth, limiter.client(download), download, index, pageQueue)
+
+        while not all(download.done for download in downloads):
+            download, index, page = pageQueue.get()
+
+            if isinstance(page, tweepy.error.TweepError):
+                traceback.print_exception(type(page), page, page.__traceback__)
+                download.fail()
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                download.receive(index, page)
+                if page is not None:
+                    metrics.count('pages')
+                    metrics.count('tweets', len(page))
+
+    except KeyboardInterrupt:
+        traceback.print_exc()
+        for download in downloads:
+            if not download.done:
+                download.fail()
+
+    # Files are closed and checkpoints saved after any other error as well, which is raised again
+    finally:
+        for download in downloads:
+            download.stop.set()
+        # Threads waiting for the reset of the window quit at once
+        limiter.stop()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+        for download in downloads:
+            download.finish()
+
+    print(str(limiter.requests) + " requests made, " + str(round(limiter.waited)) + " seconds waited for rate limit")
+    limiter_metrics(limiter)
+    return limiter
 
-f.write(pt.get_string())
-f.close()
+"""
+ENGAGEMENT REFRESH
 
-fr.close()
+"--refresh" reads the id_str of every tweet in the given RAW files (every RAW file in the current directory, if none is given), and retrieves them again through
+statuses/lookup endpoint, in batches of 100 tweets per request (LOOKUP_BATCH), with a far higher rate limit than search endpoint (rate_limiter.LOOKUP_LIMIT), and without its 7-day limit.
+Only retweet_count and favorite_count are kept, and written in a compact delta file ('DeltaFile', see tweet_io.read_deltas), which tweet_analyzer.py merges
+with RAW files: refreshed counts replace the older ones, updating the 'sharing' weight of the tweets.
+Batches are requested by 'workers' threads (each with its own API object), and written in the same order of the ids. Deleted (or protected) tweets aren't returned, so their counts aren't refreshed.
+"""
+LOOKUP_BATCH = 100
+
+def refresh(files, auth, workers=FETCH_WORKERS):
+    if not files:
+        files = [f for f in sorted(os.listdir('.'), key=os.path.getmtime) if os.path.isfile(f) and re.match(tweet_io.RAW_FILE_PATTERN, f)]
+
+    ids = {}
+    for file in files:
+        print("Reading ids of " + file)
+        for tweet in tweet_io.read_tweets(file):
+            ids[tweet['id_str']] = None
+    ids = list(ids)
+    batches = [ids[i:i+LOOKUP_BATCH] for i in range(0, len(ids), LOOKUP_BATCH)]
+
+    limiter = rate_limiter.RateLimiter(limit=rate_limiter.LOOKUP_LIMIT)
+    local = threading.local()
+
+    def lookup(batch):
+        if not hasattr(local, 'api'):
+            local.api = tweepy.API(auth)
+        return rate_limiter.request(limiter, lambda: local.api.statuses_lookup(batch, include_entities=False, trim_user=True), lambda: local.api.last_response.headers, rate_limit_headers)
+
+    DeltaFile = "(DELTA) Engagement of " + str(len(ids)) + " tweets (" + str(dt.datetime.now()) + ")" + tweet_io.DELTA_EXTENSION
+    print("Refreshing engagement of " + str(len(ids)) + " tweets, please wait...")
+
+    refreshed = 0
+    with tweet_io.open_jsonl(DeltaFile, "w") as d, ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for statuses in executor.map(lookup, batches):
+                for status in statuses:
+                    tweet_io.write_delta(d, status.id_str, status.retweet_count, status.favorite_count)
+                refreshed += len(statuses)
+                metrics.count('tweets', len(statuses))
+        except (tweepy.error.TweepError, KeyboardInterrupt):
+            traceback.print_exc()
+            print("Error occurred, saving and quitting...")
+            limiter.stop()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    print(str(limiter.requests) + " requests made, " + str(round(limiter.waited)) + " seconds waited for rate limit")
+    limiter_metrics(limiter)
+    print("Engagement of " + str(refreshed) + " of " + str(len(ids)) + " tweets saved in \"" + DeltaFile + "\"")
 
-print("Tweets saved in \"" + TweetFile +"\" and \"" + RAWTweetFile + "\"")
+"""
+PROFILING
 
-# Notify sound (requires 'sox' package on Linux)
-duration = 2  # seconds
-freq = 440  # Hz
-os.system('play -nq -t alsa synth {} sine {}'.format(duration, freq))
\ No newline at end of file
+"--profile" measures the download (or the refresh) with instrumentation.Metrics: elapsed time and peak memory of the process, requests made,
+pages and tweets received, tweets per second, seconds slept waiting for the rate limit, number of waits (quota exhausted) and of backoffs (after "Too Many Requests" errors).
+Metrics are saved as JSON (or CSV, if the file ends with ".csv") in "--metrics" file, while "--cprofile" dumps cProfile stats of the download as well (Logs/Profiles by default)
+"""
+def limiter_metrics(limiter):
+    metrics.set('requests', limiter.requests)
+    metrics.set('sleep_seconds', round(limiter.waited, 3))
+    metrics.set('rate_limit_waits', limiter.waits)
+    metrics.set('backoffs', limiter.backoffs)
+
+def save_metrics(filename, stage):
+    seconds = metrics.seconds(stage)
+    if seconds:
+        metrics.set('tweets_per_second', round(metrics.counters.get('tweets', 0) / seconds, 1))
+    metrics.save(filename)
+    print("Metrics saved in \"" + filename + "\"")
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieves tweets with user-defined keywords")
+    parser.add_argument("--resume", nargs="?", const="", metavar="CHECKPOINT", help="continue an interrupted download from its checkpoint (the most recent one, if not specified)")
+    parser.add_argument("--config", metavar="FILE", help="retrieve every query of a YAML/JSON file, without any prompt (see BATCH MODE)")
+    parser.add_argument("--refresh", nargs="*", metavar="FILE", help="refresh retweet and favorite counts of the tweets of RAW files (every one, if none is specified), see ENGAGEMENT REFRESH")
+    parser.add_argument("--workers", type=int, help="number of days (or batches of tweets) fetched concurrently (" + str(FETCH_WORKERS) + " by default)")
+    parser.add_argument("--profile", action="store_true", help="measure requests, tweets per second and rate limit waits, saving them in the metrics file (see PROFILING)")
+    parser.add_argument("--metrics", default=METRICS_FILE, metavar="FILE", help="JSON (or .csv) file of metrics (a new file in Logs folder by default)")
+    parser.add_argument("--cprofile", nargs="?", const=instrumentation.PROFILES_FOLDER, metavar="FOLDER", help="dump cProfile stats in FOLDER (" + instrumentation.PROFILES_FOLDER + " by default), implies --profile")
+    args = parser.parse_args()
+    metrics.enabled = args.profile or args.cprofile is not None
+    metrics.profiles = args.cprofile
+
+    Credentials = read_credentials()
+    auth = authenticate(Credentials)
+    workers = args.workers
+
+    downloads = []
+    if args.refresh is not None:
+        with metrics.stage('refresh'):
+            refresh(args.refresh, auth, workers or FETCH_WORKERS)
+        if metrics.enabled:
+            save_metrics(args.metrics, 'refresh')
+        return
+    elif args.config is not None:
+        queries, configWorkers = load_config(args.config)
+        workers = workers or configWorkers
+        print_queries(queries)
+
+        for query in queries:
+            checkpointFile = os.path.join(CHECKPOINTS_FOLDER, "(batch) " + re.sub(r"[\\/:]", "_", query['name']) + ".checkpoint")
+            if not os.path.exists(checkpointFile):
+                downloads.append(Download(checkpointFile, new_checkpoint(query), keep=True))
+                continue
+
+            checkpoint = load_checkpoint(checkpointFile)
+            if completed(checkpoint):
+                print("\"" + query['name'] + "\" already completed (\"" + checkpointFile + "\")")
+            else:
+                print("Resuming \"" + query['name'] + "\" from \"" + checkpointFile + "\"")
+                downloads.append(Download(checkpointFile, checkpoint, resume=True, keep=True))
+
+        if not downloads:
+            sys.exit("Every query is already completed")
+    elif args.resume is not None:
+        checkpointFile = args.resume or latest_checkpoint()
+        print("Resuming from \"" + checkpointFile + "\"")
+        checkpoint = load_checkpoint(checkpointFile)
+        print_queries([checkpoint_query(checkpoint)])
+        downloads.append(Download(checkpointFile, checkpoint, resume=True))
+    else:
+        query = define_query()
+        print_queries([query])
+        checkpoint = new_checkpoint(query)
+        downloads.append(Download(os.path.join(CHECKPOINTS_FOLDER, checkpoint['RAWTweetFile'] + ".checkpoint"), checkpoint))
+
+    with metrics.stage('download'):
+        run(downloads, auth, workers or FETCH_WORKERS)
+    if metrics.enabled:
+        save_metrics(args.metrics, 'download')
+
+    # Notify sound (requires 'sox' package on Linux)
+    duration = 2  # seconds
+    freq = 440  # Hz
+    os.system('play -nq -t alsa synth {} sine {}'.format(duration, freq))
+
+if __name__ == "__main__":
+    main()
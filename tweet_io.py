@@ -0,0 +1,390 @@
+"""
+tweet_io.py is the toolbox used to read (and write) the files containing the tweets downloaded by tweet_fetcher.py, shared by tweet_fetcher.py and tweet_analyzer.py
+"""
+
+import io
+import os
+import re
+import json
+import gzip
+import mmap
+
+# Size (in characters) of each read from a RAW file: only one chunk and the tweet currently decoded are kept in memory
+CHUNK_SIZE = 1 << 20
+
+WHITESPACE = re.compile(r"\s*")
+
+# Output formats, with the extension used for the files written by tweet_fetcher.py:
+#   'raw'       pretty-printed json objects, one after the other (original format)
+#   'jsonl'     one compact json object per line (JSON Lines)
+#   'jsonl.gz'  JSON Lines compressed with gzip
+#   'jsonl.zst' JSON Lines compressed with zstandard (requires 'zstandard' package)
+#   'parquet'   columnar format, always projected (requires 'pyarrow' package)
+FORMATS = {
+    'raw' : '.json',
+    'jsonl' : '.jsonl',
+    'jsonl.gz' : '.jsonl.gz',
+    'jsonl.zst' : '.jsonl.zst',
+    'parquet' : '.parquet'
+}
+
+# Regular expression matching every file written by tweet_fetcher.py, whatever its format
+RAW_FILE_PATTERN = r"^\(RAW\).*\.(json|jsonl|jsonl\.gz|jsonl\.zst|parquet)$"
+
+# Regular expression matching files of refreshed engagement counts (written by "tweet_fetcher.py --refresh"), and their extension
+DELTA_FILE_PATTERN = r"^\(DELTA\).*\.jsonl\.gz$"
+DELTA_EXTENSION = '.jsonl.gz'
+
+# Number of tweets buffered before writing a row group of a parquet file
+PARQUET_ROW_GROUP = 10000
+
+"""
+    Generator reading a RAW file, yielding one tweet (as a dictionary) at a time
+
+        tweet_fetcher.py writes tweets one after the other with json.dump, without any separator, so the file is a sequence of concatenated json objects.
+        The file is read in chunks of 'chunk_size' characters, and each object is decoded directly from the buffer with JSONDecoder.raw_decode, which returns the index where the decoded object ends.
+        If an object is truncated by the end of the buffer, another chunk is appended and the decoding is retried, so formatting of the file (indentation, new lines) is irrelevant.
+        Memory used is bounded by the chunk size plus the size of a single tweet, regardless of the size of the file.
+"""
+def read_raw_tweets(filename, chunk_size=CHUNK_SIZE):
+    decoder = json.JSONDecoder()
+
+    with open(filename, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+
+            if pos < len(buffer):
+                try:
+                    tweet, pos = decoder.raw_decode(buffer, pos)
+                    yield tweet
+                    continue
+                except json.JSONDecodeError:
+                    # A truncated tweet at the end of the file is a real error
+                    if eof:
+                        raise
+            elif eof:
+                return
+
+            # Already decoded text is dropped only when the buffer is refilled, to avoid copying it after every tweet
+            chunk = f.read(chunk_size)
+            eof = (chunk == "")
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+"""
+SHARDS
+
+    RAW and plain JSON Lines files can be split in byte ranges ("shards"), each one holding whole tweets, to be read by different processes.
+    The file is memory mapped, and the boundaries of tweets are found by a byte scan near every multiple of 'shard_size':
+        - tweet_fetcher.py writes RAW tweets with json.dump(indent=4), so the closing brace of a tweet is the only one at the start of a line (nested objects are indented),
+          and the next tweet starts with the following "{" (a new line can't appear inside a JSON string, where it's escaped): "\n}" followed by "{" is always a boundary
+        - a JSON Lines file has a tweet per line
+    A RAW file without new lines (not written by tweet_fetcher.py) has no boundary to find, so it's a single shard. Compressed and parquet files can't be split: 'shards' returns None
+"""
+def shards(filename, shard_size):
+    fmt = file_format(filename)
+    if fmt not in ('raw', 'jsonl'):
+        return None
+
+    size = os.path.getsize(filename)
+    if size == 0:
+        return []
+
+    bounds = [0]
+    with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        while bounds[-1] + shard_size < size:
+            start = next_boundary(m, bounds[-1] + shard_size, fmt)
+            if start is None:
+                break
+            bounds.append(start)
+    bounds.append(size)
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def next_boundary(m, pos, fmt):
+    if fmt == 'jsonl':
+        pos = m.find(b"\n", pos)
+        return None if pos == -1 or pos + 1 == len(m) else pos + 1
+
+    while True:
+        pos = m.find(b"\n}", pos)
+        if pos == -1:
+            return None
+        start = pos + 2
+        while start < len(m) and m[start] in b" \t\r\n":
+            start += 1
+        if start == len(m):
+            return None
+        if m[start] == ord("{"):
+            return start
+        pos += 2
+
+"""
+    Generator reading the tweets of a shard (the byte range [start, end) of a RAW or JSON Lines file, see 'shards')
+"""
+def read_shard(filename, start, end):
+    with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        text = m[start:end].decode("utf-8")
+
+    if file_format(filename) == 'jsonl':
+        for line in text.splitlines():
+            if line.strip():
+                yield json.loads(line)
+        return
+
+    decoder = json.JSONDecoder()
+    pos = WHITESPACE.match(text, 0).end()
+    while pos < len(text):
+        tweet, pos = decoder.raw_decode(text, pos)
+        yield tweet
+        pos = WHITESPACE.match(text, pos).end()
+
+"""
+    Returns the format of a file written by tweet_fetcher.py, deduced from its extension (longest extensions are checked first, '.jsonl.gz' before '.json')
+"""
+def file_format(filename):
+    for fmt, extension in sorted(FORMATS.items(), key=lambda item: len(item[1]), reverse=True):
+        if filename.endswith(extension):
+            return fmt
+
+    raise ValueError("Unknown format of file " + filename)
+
+"""
+    Keeps only the fields of a tweet used by tweet_analyzer.py, preserving their nesting so that projected and full tweets are read in the same way:
+        id_str
+        created_at
+        full_text
+        user.name
+        retweet_count
+        favorite_count
+        is_quote_status
+        entities.hashtags.text
+        quoted_status.id_str, quoted_status.user.name, quoted_status.full_text (only if the tweet is a quote)
+"""
+def project_tweet(tweet):
+    projected = {
+        'id_str' : tweet['id_str'],
+        'created_at' : tweet['created_at'],
+        'full_text' : tweet['full_text'],
+        'user' : {'name' : tweet['user']['name']},
+        'retweet_count' : tweet['retweet_count'],
+        'favorite_count' : tweet['favorite_count'],
+        'is_quote_status' : tweet['is_quote_status'],
+        'entities' : {'hashtags' : [{'text' : hashtag['text']} for hashtag in tweet['entities']['hashtags']]}
+    }
+
+    if 'quoted_status' in tweet:
+        projected['quoted_status'] = {
+            'id_str' : tweet['quoted_status']['id_str'],
+            'user' : {'name' : tweet['quoted_status']['user']['name']},
+            'full_text' : tweet['quoted_status']['full_text']
+        }
+
+    return projected
+
+"""
+    Conversion between a projected tweet and a flat row (and vice versa), used for columnar formats
+"""
+def tweet_to_row(tweet):
+    quoted = tweet.get('quoted_status')
+    return {
+        'id_str' : tweet['id_str'],
+        'created_at' : tweet['created_at'],
+        'full_text' : tweet['full_text'],
+        'username' : tweet['user']['name'],
+        'retweet_count' : tweet['retweet_count'],
+        'favorite_count' : tweet['favorite_count'],
+        'is_quote_status' : tweet['is_quote_status'],
+        'hashtags' : [hashtag['text'] for hashtag in tweet['entities']['hashtags']],
+        'quoted_tweet_id' : quoted['id_str'] if quoted else None,
+        'quoted_tweet_username' : quoted['user']['name'] if quoted else None,
+        'quoted_tweet_full_text' : quoted['full_text'] if quoted else None
+    }
+
+def row_to_tweet(row):
+    tweet = {
+        'id_str' : row['id_str'],
+        'created_at' : row['created_at'],
+        'full_text' : row['full_text'],
+        'user' : {'name' : row['username']},
+        'retweet_count' : row['retweet_count'],
+        'favorite_count' : row['favorite_count'],
+        'is_quote_status' : row['is_quote_status'],
+        'entities' : {'hashtags' : [{'text' : hashtag} for hashtag in row['hashtags']]}
+    }
+
+    if row['quoted_tweet_id'] is not None:
+        tweet['quoted_status'] = {
+            'id_str' : row['quoted_tweet_id'],
+            'user' : {'name' : row['quoted_tweet_username']},
+            'full_text' : row['quoted_tweet_full_text']
+        }
+
+    return tweet
+
+"""
+    Opens a (possibly compressed) JSON Lines file in text mode, for reading ('r'), writing ('w') or appending ('a')
+
+        Appending to a compressed file starts a new gzip member (or zstandard frame): concatenated members (frames) are read as a single stream
+"""
+def open_jsonl(filename, mode):
+    fmt = file_format(filename)
+
+    if fmt == 'jsonl.gz':
+        return gzip.open(filename, mode + "t", encoding="utf-8")
+
+    if fmt == 'jsonl.zst':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("'zstandard' package is required to handle .jsonl.zst files (pip install zstandard)")
+
+        if mode == "r":
+            stream = zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"), read_across_frames=True, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(open(filename, mode + "b"), closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+
+    return open(filename, mode, encoding="utf-8")
+
+def parquet_module():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("'pyarrow' package is required to handle .parquet files (pip install pyarrow)")
+
+    return pyarrow
+
+def parquet_schema(pa):
+    return pa.schema([
+        ('id_str', pa.string()),
+        ('created_at', pa.string()),
+        ('full_text', pa.string()),
+        ('username', pa.string()),
+        ('retweet_count', pa.int64()),
+        ('favorite_count', pa.int64()),
+        ('is_quote_status', pa.bool_()),
+        ('hashtags', pa.list_(pa.string())),
+        ('quoted_tweet_id', pa.string()),
+        ('quoted_tweet_username', pa.string()),
+        ('quoted_tweet_full_text', pa.string())
+    ])
+
+"""
+    Generators reading JSON Lines (plain or compressed) and parquet files, yielding tweets in the same nested structure of RAW files
+"""
+def read_jsonl_tweets(filename):
+    with open_jsonl(filename, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def read_parquet_tweets(filename):
+    pa = parquet_module()
+
+    for batch in pa.parquet.ParquetFile(filename).iter_batches(batch_size=PARQUET_ROW_GROUP):
+        for row in batch.to_pylist():
+            yield row_to_tweet(row)
+
+"""
+    Reads a file written by tweet_fetcher.py in any of the supported formats, detected by its extension
+"""
+def read_tweets(filename):
+    fmt = file_format(filename)
+
+    if fmt == 'raw':
+        return read_raw_tweets(filename)
+    if fmt == 'parquet':
+        return read_parquet_tweets(filename)
+    return read_jsonl_tweets(filename)
+
+"""
+    Engagement deltas: compact JSON Lines files (gzip compressed) with a [id_str, retweet_count, favorite_count] array per line, holding counts refreshed after tweets were retrieved
+"""
+def read_deltas(filename):
+    with open_jsonl(filename, "r") as f:
+        for line in f:
+            if line.strip():
+                id_str, retweet_count, favorite_count = json.loads(line)
+                yield id_str, retweet_count, favorite_count
+
+def write_delta(f, id_str, retweet_count, favorite_count):
+    f.write(json.dumps([id_str, retweet_count, favorite_count], separators=(',', ':')) + "\n")
+
+"""
+    Writer of tweets in one of the supported formats
+
+        'filename' has to end with the extension of the chosen format (see FORMATS)
+        'project' keeps only the fields used by tweet_analyzer.py (see project_tweet). Parquet files are always projected, because a columnar format requires a fixed schema
+        'append' adds tweets to an existing file (not possible for parquet files, whose metadata are written at the end)
+        'write' receives the json dictionary of a status (tweet._json), while 'close' flushes and closes the file
+"""
+class TweetWriter:
+    def __init__(self, filename, project=False, append=False):
+        self.filename = filename
+        self.format = file_format(filename)
+        self.project = project or self.format == 'parquet'
+        self.rows = []
+
+        if self.format == 'parquet':
+            if append:
+                raise ValueError("Parquet files can't be appended: " + filename)
+            self.pa = parquet_module()
+            self.schema = parquet_schema(self.pa)
+            self.writer = self.pa.parquet.ParquetWriter(filename, self.schema, compression='zstd')
+        elif self.format == 'raw':
+            self.f = open(filename, "a" if append else "w+")
+        else:
+            self.f = open_jsonl(filename, "a" if append else "w")
+
+    def write(self, tweet):
+        if self.project:
+            tweet = project_tweet(tweet)
+
+        if self.format == 'parquet':
+            self.rows.append(tweet_to_row(tweet))
+            if len(self.rows) >= PARQUET_ROW_GROUP:
+                self.flush()
+        elif self.format == 'raw':
+            json.dump(tweet, self.f, sort_keys = True, indent = 4)
+        else:
+            self.f.write(json.dumps(tweet, ensure_ascii=False, separators=(',', ':')) + "\n")
+
+    def flush(self):
+        if self.format == 'parquet':
+            if self.rows:
+                self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema))
+                self.rows = []
+        else:
+            self.f.flush()
+
+    """
+        Makes every tweet written so far readable, even if the process is killed later: plain files are flushed, while compressed files are closed and reopened in append mode,
+        so that the current gzip member (zstandard frame) is completed (a truncated one couldn't be read). Parquet files are left as they are, being readable only once closed
+    """
+    def checkpoint(self):
+        if self.format == 'parquet':
+            return
+
+        self.flush()
+        if self.format in ('jsonl.gz', 'jsonl.zst'):
+            self.f.close()
+            self.f = open_jsonl(self.filename, "a")
+
+    def close(self):
+        if self.format == 'parquet':
+            self.flush()
+            self.writer.close()
+        else:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,251 @@
+"""
+tweet_store.py contains the columnar store used by tweet_analyzer.py to keep tweets in memory
+
+Instead of a dictionary for each tweet (with a dozen of string keys) later converted in a Pandas Dataframe, every attribute is stored in its own column:
+    - numeric attributes (retweet_count, favorite_count, sentiment, day) in typed NumPy arrays, grown by doubling their capacity
+    - usernames as codes of a categorical column (each distinct name is stored once)
+    - texts (and tuples of hashtags) in plain lists, and quoted tweets only for tweets which are quotes
+    - an index from id_str to row, used to detect duplicates
+
+The store can be pickled (i.e. saved as a segment of the snapshot by manifest.py), keeping only the used part of its arrays.
+"""
+
+import datetime as dt
+import numpy as np
+
+MONTHS = {'Jan' : 1, 'Feb' : 2, 'Mar' : 3, 'Apr' : 4, 'May' : 5, 'Jun' : 6, 'Jul' : 7, 'Aug' : 8, 'Sep' : 9, 'Oct' : 10, 'Nov' : 11, 'Dec' : 12}
+
+"""
+    Returns the ordinal (datetime.date.toordinal) of the day of a 'created_at' field
+
+        Twitter always uses the '%a %b %d %H:%M:%S +0000 %Y' format (i.e. 'Mon Feb 15 23:55:07 +0000 2021'), so fields are sliced at fixed positions. Any other format falls back to dateutil parser
+"""
+def day_ordinal(created_at):
+    if len(created_at) == 30 and created_at[19:26] == ' +0000 ' and created_at[4:7] in MONTHS:
+        return dt.date(int(created_at[26:30]), MONTHS[created_at[4:7]], int(created_at[8:10])).toordinal()
+
+    from dateutil import parser
+    return parser.parse(created_at).date().toordinal()
+
+# Ordinal of the day of timestamp 0 (1970-01-01)
+EPOCH_ORDINAL = dt.date(1970, 1, 1).toordinal()
+
+"""
+    Returns the timestamp (seconds since epoch, UTC) of a 'created_at' field, sliced at fixed positions as in day_ordinal (or parsed by dateutil, for any other format)
+"""
+def timestamp(created_at):
+    if len(created_at) == 30 and created_at[19:26] == ' +0000 ' and created_at[4:7] in MONTHS:
+        return (day_ordinal(created_at) - EPOCH_ORDINAL) * 86400 + int(created_at[11:13]) * 3600 + int(created_at[14:16]) * 60 + int(created_at[17:19])
+
+    import calendar
+    from dateutil import parser
+    return calendar.timegm(parser.parse(created_at).utctimetuple())
+
+# Ordinal of the day of a timestamp
+def day_of(created):
+    return created // 86400 + EPOCH_ORDINAL
+
+# Start of the hour of a timestamp, as datetime.datetime (UTC, naive)
+def hour_of(created):
+    return dt.datetime(1970, 1, 1) + dt.timedelta(seconds=int(created - created % 3600))
+
+"""
+    Columnar store of tweets
+
+        Adding a tweet whose id_str is already stored overwrites its row, so the last tweet read replaces the previous ones, keeping the position of the first one (as a dictionary would do).
+
+        Parameters:
+            'index' maps id_str to the row of the tweet
+            'usernames' is the list of distinct usernames, whose position is the code stored in 'username_codes' ('username_index' maps a name to its code)
+            'quoted' maps the row of a quote to (quoted_tweet_id, quoted_tweet_username, quoted_tweet_full_text)
+            'mtime' column holds the modification time of the file each tweet was read from, so that a tweet is replaced only by a newer one
+            'created' column holds the full timestamp of each tweet (seconds since epoch, UTC), 'day' the ordinal of its day
+"""
+class TweetStore:
+    COLUMNS = {
+        'day' : np.int32,
+        'retweet_count' : np.int64,
+        'favorite_count' : np.int64,
+        'sa' : np.float64,
+        'is_quote_status' : np.bool_,
+        'username_codes' : np.int32,
+        'mtime' : np.float64,
+        'created' : np.int64
+    }
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.index = {}
+        self.ids = []
+        self.full_texts = []
+        self.hashtags = []
+        self.usernames = []
+        self.username_index = {}
+        self.quoted = {}
+        self.arrays = {column : np.zeros(capacity, dtype=dtype) for column, dtype in self.COLUMNS.items()}
+
+    def __len__(self):
+        return self.size
+
+    def __getattr__(self, column):
+        if column in self.COLUMNS:
+            return self.arrays[column][:self.size]
+        raise AttributeError(column)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['arrays'] = {column : array[:self.size].copy() for column, array in self.arrays.items()}
+        return state
+
+    @property
+    def sharing(self):
+        return self.retweet_count + self.favorite_count + 1
+
+    def username_code(self, username):
+        code = self.username_index.get(username)
+        if code is None:
+            code = len(self.usernames)
+            self.username_index[username] = code
+            self.usernames.append(username)
+        return code
+
+    """
+        Stores a tweet (overwriting a previous one with the same id_str) and returns its row. 'created' is its timestamp (see timestamp), 'hashtags' is a tuple of hashtag texts (without '#'), 'quote' is None, or a (quoted_tweet_id, quoted_tweet_username, quoted_tweet_full_text) tuple, 'mtime' the modification time of the file the tweet was read from
+    """
+    def add(self, id_str, created, username, full_text, retweet_count, favorite_count, sa, hashtags=(), quote=None, mtime=0.0):
+        row = self.index.get(id_str)
+
+        if row is None:
+            row = self.size
+            if row == len(self.arrays['day']):
+                for column, array in self.arrays.items():
+                    self.arrays[column] = np.concatenate((array, np.zeros(max(len(array), 1), dtype=array.dtype)))
+            self.size += 1
+            self.index[id_str] = row
+            self.ids.append(id_str)
+            self.full_texts.append(full_text)
+            self.hashtags.append(hashtags)
+        else:
+            self.full_texts[row] = full_text
+            self.hashtags[row] = hashtags
+
+        self.arrays['created'][row] = created
+        self.arrays['day'][row] = day_of(created)
+        self.arrays['username_codes'][row] = self.username_code(username)
+        self.arrays['retweet_count'][row] = retweet_count
+        self.arrays['favorite_count'][row] = favorite_count
+        self.arrays['sa'][row] = np.nan if sa is None else sa
+        self.arrays['is_quote_status'][row] = quote is not None
+        self.arrays['mtime'][row] = mtime
+
+        if quote is not None:
+            self.quoted[row] = quote
+        else:
+            self.quoted.pop(row, None)
+
+        return row
+
+    """
+        Returns the arguments of 'add' storing again the tweet of 'row' (i.e. in another store)
+    """
+    def values(self, row):
+        return (self.ids[row], int(self.arrays['created'][row]), self.usernames[self.arrays['username_codes'][row]], self.full_texts[row], int(self.arrays['retweet_count'][row]), int(self.arrays['favorite_count'][row]),
+                float(self.arrays['sa'][row]), self.hashtags[row], self.quoted.get(row), float(self.arrays['mtime'][row]))
+
+    """
+        Adds every tweet of 'other' (or of its given rows, in their order), as if they had been read after the tweets already stored: a stored tweet is overwritten unless it was read from a newer file
+    """
+    def extend(self, other, rows=None):
+        for row in (range(len(other)) if rows is None else rows):
+            stored = self.index.get(other.ids[row])
+            if stored is None or self.arrays['mtime'][stored] <= other.arrays['mtime'][row]:
+                self.add(*other.values(row))
+
+    def set_sa(self, id_str, sa):
+        self.arrays['sa'][self.index[id_str]] = sa
+
+    """
+        Updates retweet_count and favorite_count of a stored tweet (i.e. refreshed by "tweet_fetcher.py --refresh"), read from a file modified at 'mtime', returning False if the tweet isn't stored (or it was read from a newer file)
+    """
+    def set_engagement(self, id_str, retweet_count, favorite_count, mtime=0.0):
+        row = self.index.get(id_str)
+        if row is None or self.arrays['mtime'][row] > mtime:
+            return False
+
+        self.arrays['retweet_count'][row] = retweet_count
+        self.arrays['favorite_count'][row] = favorite_count
+        self.arrays['mtime'][row] = mtime
+        return True
+
+    """
+        Rows of tweets sorted by day (stable, so tweets of the same day keep the order in which they were read)
+    """
+    def sorted_rows(self):
+        return np.argsort(self.day, kind='stable')
+
+    """
+        Returns a dictionary with the (sorted) rows of each day, as datetime.date, in chronological order
+    """
+    def rows_by_day(self):
+        rows = self.sorted_rows()
+        days = self.day[rows]
+        starts = np.flatnonzero(np.diff(days)) + 1
+        return {dt.date.fromordinal(int(days[group[0]])) : rows[group] for group in np.split(np.arange(len(rows)), starts) if len(group) > 0}
+
+    """
+        Returns the tweet of a row as a dictionary, with the same fields of the records used by utils module
+    """
+    def record(self, row):
+        record = {
+            'id_str' : self.ids[row],
+            'full_text' : self.full_texts[row],
+            'created_at' : dt.date.fromordinal(int(self.arrays['day'][row])),
+            'username' : self.usernames[self.arrays['username_codes'][row]],
+            'retweet_count' : int(self.arrays['retweet_count'][row]),
+            'favorite_count' : int(self.arrays['favorite_count'][row]),
+            'sharing' : int(self.arrays['retweet_count'][row] + self.arrays['favorite_count'][row] + 1),
+            'sa' : float(self.arrays['sa'][row]),
+            'is_quote_status' : bool(self.arrays['is_quote_status'][row])
+        }
+
+        if row in self.quoted:
+            record['quoted_tweet_id'], record['quoted_tweet_username'], record['quoted_tweet_full_text'] = self.quoted[row]
+
+        return record
+
+    def records(self, rows=None):
+        for row in (self.sorted_rows() if rows is None else rows):
+            yield self.record(row)
+
+    """
+        Tuples (id_str, day, sa, sharing, hashtags, hour, mtime) of every tweet (or of the given rows), as requested by aggregates.AggregateStore.update
+    """
+    def contributions(self, rows=None):
+        sharing = self.sharing
+        for row in (range(self.size) if rows is None else rows):
+            yield self.ids[row], dt.date.fromordinal(int(self.arrays['day'][row])), float(self.arrays['sa'][row]), int(sharing[row]), self.hashtags[row], hour_of(int(self.arrays['created'][row])), float(self.arrays['mtime'][row])
+
+    """
+        Builds a Pandas Dataframe with the same columns of the original dictionary-based one, sorted by day (used by utils.averages, utils.std_devs and utils.compute_cov_corr)
+    """
+    def to_dataframe(self):
+        import pandas as pd
+
+        rows = self.sorted_rows()
+        df = pd.DataFrame({
+            'id_str' : [self.ids[row] for row in rows],
+            'full_text' : [self.full_texts[row] for row in rows],
+            'created_at' : [dt.date.fromordinal(int(day)) for day in self.day[rows]],
+            'username' : pd.Categorical.from_codes(self.username_codes[rows], self.usernames) if self.usernames else [],
+            'retweet_count' : self.retweet_count[rows],
+            'favorite_count' : self.favorite_count[rows],
+            'sharing' : self.sharing[rows],
+            'sa' : self.sa[rows],
+            'is_quote_status' : self.is_quote_status[rows]
+        }, index=[self.ids[row] for row in rows])
+
+        if self.quoted:
+            for position, name in enumerate(['quoted_tweet_id', 'quoted_tweet_username', 'quoted_tweet_full_text']):
+                df[name] = [self.quoted[row][position] if row in self.quoted else np.nan for row in rows]
+
+        return df
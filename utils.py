@@ -1,6 +1,10 @@
 import math
-import matplotlib.pyplot as plt
-import lxml.etree as etree
+import datetime as dt
+from collections import Counter
+import numpy as np
+from contextlib import contextmanager
+
+# matplotlib and lxml are imported only by the functions using them (plots and gexf files), so that importing this module costs nothing to the stages that don't need them
 
 # Color ASCII used to change color of prints
 HEADER = '\033[95m'
@@ -13,64 +17,79 @@ ENDC = '\033[0m' # De-select the current color
 BOLD = '\033[1m'
 UNDERLINE = '\033[4m'
 
+"""
+    Selects tweets considered by statistics: if 'excludeNeutralTweets' is True, tweets with null sentiment ('sa' equal to 0.0) are discarded
+"""
+def considered_tweets(df, excludeNeutralTweets):
+    if excludeNeutralTweets:
+        return df.loc[df['sa'] != 0.0]
+    return df
+
+"""
+    Computes standard and weighted average of sentiment for each date, in a single groupby pass over considered tweets (dates without considered tweets are skipped).
+    Weighted average uses 'sharing' (retweet_count + favorite_count + 1) as weight of each tweet.
+    Averages are returned as dictionaries with dates as keys, in chronological order.
+"""
+def averages(df, excludeNeutralTweets):
+    tweets = considered_tweets(df, excludeNeutralTweets)
+    days = tweets.groupby('created_at', sort=True)
+
+    stdAvgs = days['sa'].mean()
+    wgtAvgs = (tweets['sa'] * tweets['sharing']).groupby(tweets['created_at']).sum() / days['sharing'].sum()
+
+    return stdAvgs.to_dict(), wgtAvgs.to_dict()
+
 """
     Utility to compute covariance and correlation between standard average of sentiment and average sharing (retweets + likes)
 """
 def compute_cov_corr(df, avgSharing, stdAvgSum, totalTweetsProcessed, excludeNeutralTweets):
+    tweets = considered_tweets(df, excludeNeutralTweets)
+
+    x = (tweets['retweet_count'] + tweets['favorite_count'] - avgSharing).to_numpy(dtype=float)
+    y = (tweets['sa'] - stdAvgSum).to_numpy(dtype=float)
+    E = np.dot(x, y)
+    Dx = np.dot(x, x)
+    Dy = np.dot(y, y)
 
-    E = 0
-    Dx = 0
-    Dy = 0
-
-    for index, tweet in df.iterrows():
-        if not(excludeNeutralTweets) or tweet['sa'] != 0.0:
-            x = (tweet['retweet_count'] + tweet['favorite_count'] - avgSharing)
-            y = (tweet['sa'] - stdAvgSum)
-            E += x * y
-            Dx += pow(x,2)
-            Dy += pow(y, 2)
-    
     covariance = E / totalTweetsProcessed
     correlation = E / math.sqrt(Dx * Dy)
 
     return covariance, correlation
 
 """
-    Routine to find standard deviation between given average (standard or weighted)
+    Routine to find standard deviation between given averages (standard or weighted), for each date at once.
+    Deviations are returned as dictionaries with the same keys of 'stdAvgs' and 'wgtAvgs'.
 """
-def std_devs(df, date, stdAvgs, wgtAvgs, excludeNeutralTweets):
-    stdDevSADay = 0
-    stdDevWADay = 0
-    count = 0
-    totSharing = 0
-
-    for index, tweet in df.loc[df['created_at'] == date].iterrows():
-        if not(excludeNeutralTweets) or tweet['sa'] != 0.0:
-            stdDevSADay += pow(tweet['sa'] - stdAvgs[date], 2)
+def std_devs(df, stdAvgs, wgtAvgs, excludeNeutralTweets):
+    tweets = considered_tweets(df, excludeNeutralTweets)
+    dates = tweets['created_at']
+    sharing = tweets['favorite_count'] + tweets['retweet_count'] + 1
 
-            sharing = (tweet['favorite_count'] + tweet['retweet_count'] + 1)
-            totSharing += pow(sharing, 2)
-            stdDevWADay += pow(tweet['sa'] * sharing - wgtAvgs[date], 2)
+    stdDevSA = (tweets['sa'] - dates.map(stdAvgs)).pow(2).groupby(dates).mean().pow(0.5)
+    stdDevWA = ((tweets['sa'] * sharing - dates.map(wgtAvgs)).pow(2).groupby(dates).sum() / sharing.pow(2).groupby(dates).sum()).pow(0.5)
 
-            count += 1
-
-    stdDevSADay = math.sqrt(stdDevSADay/count)
-    stdDevWADay = math.sqrt(stdDevWADay/totSharing)
-    
-    return stdDevSADay, stdDevWADay
+    return stdDevSA.to_dict(), stdDevWA.to_dict()
 
 """
     Function to plot a mean vector, with relative standard deviation, with additional parameters regarding position of a text description on dates and filename of plot
+    Keys of the vector are days, or hours (buckets and rolling windows): the width of the plot grows with the number of points up to MAX_PLOT_POINTS, beyond which only one label every few points is shown
 """
-def plot(df, avgs, devs, posTextY, dates_text, filename):
+MAX_PLOT_POINTS = 40
+
+def plot(avgs, devs, posTextY, dates_text, filename):
+    import matplotlib.pyplot as plt
+
     print(WARNING + "Plotting... ", end="")
-    plt.figure(figsize=(len(avgs.keys())+10, 10.0))
+    plt.figure(figsize=(min(len(avgs), MAX_PLOT_POINTS)+10, 10.0))
     plt.ylabel("Average sentiment")
     plt.xlabel("Dates")
     plt.grid(True)
     plt.subplots_adjust(left=0.05, bottom=0.3, top=0.9, wspace=0, hspace=0)
     plt.tick_params(axis='x', which='major', labelsize=12)
-    plt.xticks(range(len(avgs)), df.created_at.unique(), rotation=0)
+    labelStep = -(-len(avgs) // MAX_PLOT_POINTS)
+    hourly = isinstance(next(iter(avgs)), dt.datetime)
+    labels = [key.strftime("%Y-%m-%d %H:%M") if hourly else key for key in avgs.keys()]
+    plt.xticks(range(0, len(avgs), labelStep), labels[::labelStep], rotation=45 if hourly or labelStep > 1 else 0)
     plt.title("Temporal variation of public sentiment")
     topStdAvg = []
     botStdAvg = []
@@ -89,61 +108,157 @@ def plot(df, avgs, devs, posTextY, dates_text, filename):
     print(OKGREEN + "Plot saved in \"" + filename + "\"" + ENDC)
 
 """
-    Parses collected tweets as nodes in gexf format, which links are quotes of other tweets. For each day, a specific graph is created, static and directed. Attributes of a node are:
+    Function to plot the median of each day, with the bands between its 25th and 75th and its 10th and 90th percentiles (values of 'percentiles' are aggregates.PERCENTILES of each day, as returned by aggregates.daily_percentiles)
+"""
+def percentile_plot(percentiles, posTextY, dates_text, filename):
+    import matplotlib.pyplot as plt
+
+    print(WARNING + "Plotting... ", end="")
+    plt.figure(figsize=(min(len(percentiles), MAX_PLOT_POINTS)+10, 10.0))
+    plt.ylabel("Sentiment")
+    plt.xlabel("Dates")
+    plt.grid(True)
+    plt.subplots_adjust(left=0.05, bottom=0.3, top=0.9, wspace=0, hspace=0)
+    plt.tick_params(axis='x', which='major', labelsize=12)
+    labelStep = -(-len(percentiles) // MAX_PLOT_POINTS)
+    plt.xticks(range(0, len(percentiles), labelStep), list(percentiles.keys())[::labelStep], rotation=45 if labelStep > 1 else 0)
+    plt.title("Percentiles of public sentiment")
+
+    p10, p25, median, p75, p90 = [list(values) for values in zip(*percentiles.values())]
+    x = range(len(percentiles))
+    plt.fill_between(x, p10, p90, color='b', alpha=0.15, label = "10th - 90th Percentile")
+    plt.fill_between(x, p25, p75, color='b', alpha=0.3, label = "25th - 75th Percentile")
+    plt.plot(median, "b-", label = "Median", lw = 3)
+    plt.legend(loc='upper right', bbox_to_anchor=(1.115, 1), fontsize = 13)
+    plt.text(-1, posTextY, dates_text, horizontalalignment='left', verticalalignment='center', bbox=dict(facecolor='red', alpha=0.3), fontsize = 16)
+    plt.savefig(filename)
+    plt.close()
+    print(OKGREEN + "Plot saved in \"" + filename + "\"" + ENDC)
+
+"""
+    Context manager writing the root elements of a gexf file (written incrementally by 'xf', an etree.xmlfile) and the declaration of the attributes of nodes. Nodes and edges have to be written inside it
+"""
+GEXF_ATTRIBUTES = [('id', 'string'), ('user', 'string'), ('text', 'string'), ('sentiment', 'float'), ('in_degree', 'integer'), ('out_degree', 'integer'), ('sharing', 'integer')]
+
+@contextmanager
+def gexf_graph(xf, mode, timeformat, attributes=GEXF_ATTRIBUTES):
+    import lxml.etree as etree
+
+    # Wrapping qualified XML names (providen from XMLSchema-instance)
+    attr_qname = etree.QName("http://www.w3.org/2001/XMLSchema-instance", "schemaLocation")
+    with xf.element('gexf', {'version' : '1.3', attr_qname : 'http://www.gexf.net/1.3draft  http://www.gexf.net/1.3draft/gexf.xsd'}, nsmap={None : 'http://graphml.graphdrawing.org/xmlns/graphml', 'xsi' : 'http://www.w3.org/2001/XMLSchema-instance'}):
+        with xf.element('graph', defaultedgetype = 'directed', mode = mode, timeformat = timeformat):
+            element = etree.Element('attributes', {'class' : 'node', 'mode' : 'static'})
+            for id, type in attributes:
+                etree.SubElement(element, 'attribute', {'id' : id, 'title' : id, 'type' : type})
+            xf.write(element)
+
+            yield
+
+"""
+    Parses collected tweets (records of the given date) as nodes in gexf format, which links are quotes of other tweets. For each day, a specific graph is created, static and directed. Attributes of a node are:
             'id_str'
             'full_text'
             'created_at'
             'username'
-            'retweet_count'
             'sa'
+            'in_degree' (number of tweets of the day quoting it)
+            'out_degree'
+            'sharing' (retweet_count + favorite_count)
 
-        If a tweet retrieved is a quote ('is_quote_status' == True) then another node is created (and linked) containing:
+        If a tweet retrieved is a quote ('is_quote_status' == True) it's linked to the quoted one. If the quoted tweet has not been collected in the same day, another node is created (once, even if quoted many times) containing:
             'quoted_tweet_id'
             'quoted_tweet_username'
             'quoted_tweet_full_text'
+            'in_degree'
+
+        The file is written incrementally (etree.xmlfile), one node at a time, so neither the whole XML tree nor its string serialization are kept in memory.
 """
-def gexf_parser(df, date):
-    # Wrapping qualified XML names (providen from XMLSchema-instance)
-    attr_qname = etree.QName("http://www.w3.org/2001/XMLSchema-instance", "schemaLocation")
-    gexf = etree.Element('gexf', {attr_qname : 'http://www.gexf.net/1.3draft  http://www.gexf.net/1.3draft/gexf.xsd'}, nsmap={None : 'http://graphml.graphdrawing.org/xmlns/graphml'}, version = '1.3')
-
-    graph = etree.SubElement(gexf, 'graph', defaultedgetype = 'directed', mode =  'static', timeformat='datetime')
-    attributes = etree.SubElement(graph, 'attributes', {'class' : 'node', 'mode' : 'static'})
-    etree.SubElement(attributes, 'attribute', {'id':'id', 'title':'id', 'type' : 'string'})
-    etree.SubElement(attributes, 'attribute', {'id':'user', 'title':'user', 'type' : 'string'})
-    etree.SubElement(attributes, 'attribute', {'id':'text', 'title':'text', 'type' : 'string'})
-    etree.SubElement(attributes, 'attribute', {'id':'sentiment', 'title':'sentiment', 'type' : 'float'})
-    etree.SubElement(attributes, 'attribute', {'id':'in_degree', 'title':'in_degree', 'type' : 'integer'})
-    etree.SubElement(attributes, 'attribute', {'id':'out_degree', 'title':'out_degree', 'type' : 'integer'})
-    etree.SubElement(attributes, 'attribute', {'id':'sharing', 'title':'sharing', 'type' : 'integer'})
-
-    nodes = etree.SubElement(graph, 'nodes')
-    edges = etree.SubElement(graph, 'edges')
+def gexf_parser(tweets, date):
+    import lxml.etree as etree
+
     filename = "GEXF/GEXF_" + str(date) + ".gexf"
-    print(WARNING + "Creating gexf file for " + str(date) + "... " + ENDC, end="")
-
-    for tweet in df.loc[df['created_at'] == date].to_dict(orient='records'):
-        node = etree.SubElement(nodes, 'node', id = tweet['id_str'], Label = tweet['id_str'])
-        attvalues = etree.SubElement(node, 'attvalues')
-
-        etree.SubElement(attvalues, 'attvalue', {'for' : 'user', 'value' : tweet['username']})
-        etree.SubElement(attvalues, 'attvalue', {'for' : 'text', 'value' : tweet['full_text']})
-        etree.SubElement(attvalues, 'attvalue', {'for' : 'sentiment', 'value' : str(tweet['sa'])})
-        etree.SubElement(attvalues, 'attvalue', {'for' : 'in_degree', 'value' : str(tweet['retweet_count'])})
-        sharing = tweet['retweet_count'] + tweet['favorite_count']
-        etree.SubElement(attvalues, 'attvalue', {'for' : 'sharing', 'value' : str(sharing)})
-
-        if tweet['is_quote_status']:
-            etree.SubElement(attvalues, 'attvalue', {'for' : 'out_degree', 'value' : '1'})
-            etree.SubElement(edges, 'edge', {'id' : tweet['id_str'], 'source' : tweet['id_str'], 'target' : tweet['quoted_tweet_id']})
-            node = etree.SubElement(nodes, 'node', id = tweet['quoted_tweet_id'], Label = tweet['quoted_tweet_id'])
-            attvalues = etree.SubElement(node, 'attvalues')
-            etree.SubElement(attvalues, 'attvalue', {'for' : 'user', 'value' : tweet['quoted_tweet_username']})
-            etree.SubElement(attvalues, 'attvalue', {'for' : 'text', 'value' : tweet['quoted_tweet_full_text']})
-        else:
-            etree.SubElement(attvalues, 'attvalue', {'for' : 'out_degree', 'value' : '0'})
-
-    
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(etree.tostring(gexf, encoding='utf8', method='xml').decode('utf-8'))
-        print(OKGREEN + filename + " created" + ENDC)
\ No newline at end of file
+    tweets = list(tweets)
+    collected = set(tweet['id_str'] for tweet in tweets)
+    inDegree = Counter(tweet['quoted_tweet_id'] for tweet in tweets if tweet['is_quote_status'])
+    # Quoted tweets not collected in this day, written after collected ones (a single node for each of them)
+    quoted = {}
+
+    with etree.xmlfile(filename, encoding='utf-8') as xf:
+        with gexf_graph(xf, 'static', 'datetime'):
+            with xf.element('nodes'):
+                for tweet in tweets:
+                    node = etree.Element('node', id = tweet['id_str'], Label = tweet['id_str'])
+                    attvalues = etree.SubElement(node, 'attvalues')
+
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'user', 'value' : tweet['username']})
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'text', 'value' : tweet['full_text']})
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'sentiment', 'value' : str(tweet['sa'])})
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'in_degree', 'value' : str(inDegree[tweet['id_str']])})
+                    sharing = tweet['retweet_count'] + tweet['favorite_count']
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'sharing', 'value' : str(sharing)})
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'out_degree', 'value' : '1' if tweet['is_quote_status'] else '0'})
+                    xf.write(node)
+
+                    if tweet['is_quote_status'] and tweet['quoted_tweet_id'] not in collected:
+                        quoted[tweet['quoted_tweet_id']] = (tweet['quoted_tweet_username'], tweet['quoted_tweet_full_text'])
+
+                for id, (username, full_text) in quoted.items():
+                    node = etree.Element('node', id = id, Label = id)
+                    attvalues = etree.SubElement(node, 'attvalues')
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'user', 'value' : username})
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'text', 'value' : full_text})
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'in_degree', 'value' : str(inDegree[id])})
+                    xf.write(node)
+
+            with xf.element('edges'):
+                for tweet in tweets:
+                    if tweet['is_quote_status']:
+                        xf.write(etree.Element('edge', {'id' : tweet['id_str'], 'source' : tweet['id_str'], 'target' : tweet['quoted_tweet_id']}))
+
+    print(WARNING + "Creating gexf file for " + str(date) + "... " + OKGREEN + filename + " created" + ENDC)
+    return filename
+
+"""
+    Writes the whole quote graph (graph_index.QuoteGraph) as a single dynamic gexf file, in which every tweet is a single node, with its spells (the ranges of days in which it has been created or quoted), so Gephi timeline can show links across days.
+    In addition to the attributes of daily graphs, each node has the 'component' (label of its connected component) and in/out degree are computed on the whole corpus
+"""
+def dynamic_gexf_parser(graph, filename="GEXF/GEXF_dynamic.gexf"):
+    import lxml.etree as etree
+
+    tweets = graph.tweets
+    spells = graph.spells()
+    components = graph.components()
+    sharing = tweets.retweet_count + tweets.favorite_count
+
+    with etree.xmlfile(filename, encoding='utf-8') as xf:
+        with gexf_graph(xf, 'dynamic', 'date', GEXF_ATTRIBUTES + [('component', 'integer')]):
+            with xf.element('nodes'):
+                for node in range(len(graph)):
+                    id = graph.ids[node]
+                    element = etree.Element('node', id = id, Label = id)
+                    attvalues = etree.SubElement(element, 'attvalues')
+
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'user', 'value' : graph.username(node)})
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'text', 'value' : graph.full_text(node)})
+                    if graph.is_collected(node):
+                        etree.SubElement(attvalues, 'attvalue', {'for' : 'sentiment', 'value' : str(tweets.sa[node])})
+                        etree.SubElement(attvalues, 'attvalue', {'for' : 'sharing', 'value' : str(sharing[node])})
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'in_degree', 'value' : str(graph.in_degree[node])})
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'out_degree', 'value' : str(graph.out_degree[node])})
+                    etree.SubElement(attvalues, 'attvalue', {'for' : 'component', 'value' : str(components[node])})
+
+                    spellsElement = etree.SubElement(element, 'spells')
+                    for start, end in spells[node]:
+                        etree.SubElement(spellsElement, 'spell', start = str(start), end = str(end))
+                    xf.write(element)
+
+            with xf.element('edges'):
+                for source, target, day in zip(graph.sources.tolist(), graph.targets.tolist(), graph.days.tolist()):
+                    element = etree.Element('edge', {'id' : graph.ids[source], 'source' : graph.ids[source], 'target' : graph.ids[target]})
+                    spellsElement = etree.SubElement(element, 'spells')
+                    etree.SubElement(spellsElement, 'spell', start = str(dt.date.fromordinal(day)), end = str(dt.date.fromordinal(day)))
+                    xf.write(element)
+
+    print(OKGREEN + "Dynamic graph saved in \"" + filename + "\"" + ENDC)
+    return filename